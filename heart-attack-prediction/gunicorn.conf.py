@@ -0,0 +1,97 @@
+# Gunicorn configuration for the production API
+
+"""
+Production launcher: several Uvicorn workers managed by Gunicorn
+Run from heart-attack-prediction/: gunicorn -c gunicorn.conf.py
+
+- API_BACKEND picks the app (mongodb/main.py or mySQL/main.py)
+- the app and the prediction model are loaded once in the master process
+  and shared with the workers it forks
+- every worker opens its own database client / connection pool
+- workers are recycled after MAX_REQUESTS requests (plus jitter) and given
+  GRACEFUL_TIMEOUT seconds to finish in-flight requests on restart
+- Prometheus metrics of all workers are merged through PROMETHEUS_MULTIPROC_DIR,
+  so every /metrics scrape covers the whole server
+- without RESPONSE_CACHE_URL every worker has its own response cache, and a
+  write only clears the cache of the worker that handled it. Cached values
+  carry the ETag they were loaded under, so the other workers reload as soon
+  as the version counters move; set RESPONSE_CACHE_URL=redis://... to share
+  one cache (and one database query per miss) across all workers
+
+All settings come from environment variables (see render.yaml).
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIRS = {"mongodb": "mongodb", "mysql": "mySQL"}
+
+API_BACKEND = os.getenv("API_BACKEND", "mongodb")
+if API_BACKEND not in APP_DIRS:
+    raise ValueError(f"API_BACKEND must be one of {sorted(APP_DIRS)}, got {API_BACKEND!r}")
+
+# Shared metrics directory; must be set (and emptied: files of a previous run
+# would be summed in) before the app imports prometheus_client
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), f"heart-api-metrics-{os.getpid()}")
+)
+shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+os.makedirs(PROMETHEUS_MULTIPROC_DIR)
+
+# The apps use flat imports (from database import ...), so run from their directory
+chdir = os.path.join(BASE_DIR, APP_DIRS[API_BACKEND])
+wsgi_app = "main:app"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# Scoring is CPU-bound, so one worker per core by default
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+
+# Recycle workers now and then (bounded memory growth), spread out by jitter
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Import the app (and load the model, see when_ready) before forking
+preload_app = os.getenv("PRELOAD_MODEL", "true").lower() in ("1", "true", "yes")
+
+accesslog = "-" if os.getenv("ACCESS_LOG", "false").lower() in ("1", "true", "yes") else None
+errorlog = "-"
+
+
+def when_ready(server):
+    """Load the model in the master so forked workers start warm and share its memory"""
+    if workers > 1 and not os.getenv("RESPONSE_CACHE_URL"):
+        server.log.info(f"{workers} workers with per-process response caches "
+                        "(set RESPONSE_CACHE_URL to share one)")
+    if not preload_app:
+        return
+    # main.py put ../predict on sys.path when it was preloaded
+    from model_service import get_model_service
+    try:
+        service = get_model_service()
+        server.log.info(f"Prediction model preloaded (version {service.version})")
+    except Exception as e:
+        server.log.warning(f"Could not preload prediction model: {e}")
+
+
+def post_fork(server, worker):
+    """Per-worker resources: never reuse a database client created before the fork"""
+    import database
+    database.reset_after_fork()
+    server.log.info(f"Worker {worker.pid} ready ({API_BACKEND})")
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited (its counters stay in the totals)"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
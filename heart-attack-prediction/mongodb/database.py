@@ -1,7 +1,8 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from pymongo.server_api import ServerApi
 from pymongo.errors import ConnectionFailure
 import os
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 # Load environment variables from .env file (only loads if file exists)
@@ -80,7 +81,7 @@ def get_collection(collection_name):
     Returns a specific collection from the database
     
     Parameters:
-    - collection_name: Name of the collection (patients, medical_records, heart_attack_tests)
+    - collection_name: Name of the collection (patients, medical_records, heart_attack_tests, predictions)
     
     Returns:
     - MongoDB collection object
@@ -89,12 +90,97 @@ def get_collection(collection_name):
     if db is None:
         raise Exception("Database connection not available")
     
-    valid_collections = ["patients", "medical_records", "heart_attack_tests"]
+    valid_collections = ["patients", "medical_records", "heart_attack_tests", "predictions"]
     if collection_name not in valid_collections:
         raise ValueError(f"Invalid collection name. Must be one of: {valid_collections}")
     
     return db[collection_name]
 
+# Indexes the API relies on: {collection: [index keys or (index keys, options), ...]}
+API_INDEXES = {
+    "heart_attack_tests": [
+        [("test_date", 1), ("test_id", 1)],   # /api/latest-entry and /api/entries sorts
+        [("test_id", 1)],
+        [("record_id", 1)],
+    ],
+    "medical_records": [
+        [("record_id", 1)],    # $lookup from heart_attack_tests
+        [("patient_id", 1)],
+    ],
+    "patients": [
+        [("patient_id", 1)],   # $lookup from medical_records
+    ],
+    "predictions": [
+        ([("test_id", 1), ("model_version", 1)], {"unique": True}),  # upserts
+        [("patient_id", 1), ("predicted_at", -1)],   # /api/predictions?patient_id=&since=
+        [("predicted_at", -1)],                      # /api/predictions?since=
+    ],
+}
+
+
+def ensure_indexes(db=None):
+    """
+    Creates the indexes the API relies on if they don't exist yet.
+    Safe to run on every startup: an index with the same keys (e.g. the unique
+    ones created by load_data.py) is left untouched.
+    """
+    db = db if db is not None else get_database()
+    if db is None:
+        return
+
+    for collection_name, indexes in API_INDEXES.items():
+        coll = db[collection_name]
+        try:
+            existing = [info["key"] for info in coll.index_information().values()]
+            for index in indexes:
+                # An index is either a key list or (key list, create_index options)
+                keys, options = index if isinstance(index, tuple) else (index, {})
+                if any([tuple(k) for k in key] == [tuple(k) for k in keys] for key in existing):
+                    continue
+                name = coll.create_index(keys, **options)
+                print(f"Created index {collection_name}.{name}")
+        except Exception as e:
+            print(f"Could not ensure indexes on {collection_name}: {e}")
+
+
+# Version counters of the collections, one document per collection:
+# {"_id": "patients", "version": 12, "modified_at": datetime}
+VERSIONS_COLLECTION = "collection_versions"
+
+
+def collection_versions(*names, db=None):
+    """
+    Returns [(name, version, modified_at), ...] for the given collections.
+    Used to build ETags: a collection that was never bumped has version 0,
+    and the version is None when it can't be read.
+    """
+    db = db if db is not None else get_database()
+    try:
+        found = {doc["_id"]: doc for doc in db[VERSIONS_COLLECTION].find({"_id": {"$in": list(names)}})}
+    except Exception:
+        # Unknown versions: the response goes out without an ETag
+        return [(name, None, None) for name in names]
+    return [
+        (name, found.get(name, {}).get("version", 0), found.get(name, {}).get("modified_at"))
+        for name in names
+    ]
+
+
+def bump_versions(*names, db=None):
+    """
+    Increments the version counters of the given collections.
+    Call after every write so cached copies (ETags) of their data go stale.
+    """
+    db = db if db is not None else get_database()
+    if db is None or not names:
+        return
+    now = datetime.now(timezone.utc)
+    db[VERSIONS_COLLECTION].bulk_write([
+        UpdateOne({"_id": name}, {"$inc": {"version": 1}, "$set": {"modified_at": now}}, upsert=True)
+        for name in names
+    ], ordered=False)
+
+
 def close_mongo_connection():
     """
     Closes the MongoDB connection
@@ -106,6 +192,16 @@ def close_mongo_connection():
         print("MongoDB connection closed")
 
 
+def reset_after_fork():
+    """
+    Forget the connection inherited from the parent process.
+    MongoClient is not fork-safe, so every worker opens its own on first use.
+    """
+    global database, client
+    client = None
+    database = None
+
+
 # Backwards-compatible alias expected by other modules
 def close_connection():
     """Alias to close the MongoDB connection (keeps older import name)."""
@@ -1,55 +1,153 @@
-from fastapi import APIRouter, HTTPException
-from database import get_collection
-from typing import Dict, Any
+from fastapi import APIRouter, HTTPException, Query, Request
+from database import get_collection, collection_versions
+from response_cache import get_response_cache, LATEST_ENTRY_KEY
+from conditional import validators, is_fresh, not_modified
+from fast_json import FastJSONResponse
+from datetime import datetime
+from typing import Dict, Any, Optional
 
 router = APIRouter()
 
+MAX_ENTRIES_PAGE = 5000
 
-@router.get("/latest-entry")
-def latest_entry() -> Dict[str, Any]:
-    """Return the latest combined patient + medical_record + heart_attack_test entry.
+# An entry is made of one document of each of these collections
+ENTRY_COLLECTIONS = ("heart_attack_tests", "medical_records", "patients")
 
-    The predict script expects a JSON with keys: 'patient', 'medical_record', 'heart_attack_test'.
-    This endpoint finds the most recent heart_attack_tests document (by test_date) and
-    joins it with the linked medical_records and patients documents.
+
+def entry_pipeline(*stages):
     """
-    try:
+    Aggregation that picks tests with the given stages ($match/$sort/$limit)
+    and joins each one with its medical record and patient server-side
+    """
+    return list(stages) + [
+        {"$lookup": {
+            "from": "medical_records",
+            "localField": "record_id",
+            "foreignField": "record_id",
+            "as": "_medical_record",
+        }},
+        {"$unwind": {"path": "$_medical_record", "preserveNullAndEmptyArrays": True}},
+        {"$lookup": {
+            "from": "patients",
+            "localField": "_medical_record.patient_id",
+            "foreignField": "patient_id",
+            "as": "_patients",
+        }},
+    ]
+
+
+def clean_doc(doc):
+    """Drop Mongo's internal _id so the document serializes as plain JSON"""
+    if not doc:
+        return None
+    doc = dict(doc)
+    doc.pop("_id", None)
+    return doc
+
+
+def to_entry(test):
+    """Split an entry_pipeline() result into patient / medical_record / heart_attack_test"""
+    medical_record = test.pop("_medical_record", None)
+    patients = test.pop("_patients")
+
+    # Same linking rules as before: no record_id -> no record, no patient_id -> no patient
+    if not test.get("record_id"):
+        medical_record = None
+    patient = None
+    if medical_record and medical_record.get("patient_id") and patients:
+        patient = patients[0]
+
+    return {
+        "patient": clean_doc(patient),
+        "medical_record": clean_doc(medical_record),
+        "heart_attack_test": clean_doc(test),
+    }
+
+
+def load_latest_entry(version: Optional[str] = None) -> Dict[str, Any]:
+    """The latest entry as a dict, from the response cache or the database.
+
+    Finds the most recent heart_attack_tests document (by test_date) and joins it
+    with the linked medical_records and patients documents in a single
+    aggregation ($sort/$limit/$lookup). Also used by /predict.
+    version is the ETag of the entry collections (read now when not given);
+    a cached entry loaded under another ETag is not reused.
+    """
+    if version is None:
+        version = validators(collection_versions(*ENTRY_COLLECTIONS)).get("ETag")
+
+    def load():
         tests_coll = get_collection("heart_attack_tests")
-        records_coll = get_collection("medical_records")
-        patients_coll = get_collection("patients")
 
-        # Find latest test by test_date (descending)
-        latest_test = tests_coll.find_one(sort=[("test_date", -1)])
-        if not latest_test:
+        # One round trip: latest test (uses the test_date index), then its
+        # medical record and patient joined server-side
+        pipeline = entry_pipeline({"$sort": {"test_date": -1, "test_id": -1}}, {"$limit": 1})
+        latest = next(tests_coll.aggregate(pipeline), None)
+        if not latest:
             raise HTTPException(status_code=404, detail="No heart attack tests found")
+        return to_entry(latest)
 
-        # Find linked medical record
-        record_id = latest_test.get("record_id")
-        medical_record = records_coll.find_one({"record_id": record_id}) if record_id else None
-
-        # Find patient (linked from medical_record.patient_id)
-        patient = None
-        if medical_record:
-            patient_id = medical_record.get("patient_id")
-            if patient_id:
-                patient = patients_coll.find_one({"patient_id": patient_id})
-
-        # Normalize ObjectId and datetime for JSON serialization
-        def clean_doc(doc):
-            if not doc:
-                return None
-            doc = dict(doc)
-            # remove Mongo internal _id if present
-            doc.pop("_id", None)
-            return doc
-
-        return {
-            "patient": clean_doc(patient),
-            "medical_record": clean_doc(medical_record),
-            "heart_attack_test": clean_doc(latest_test),
-        }
+    try:
+        # Served from the response cache until a write invalidates it (or the TTL expires)
+        return get_response_cache().get_or_load(LATEST_ENTRY_KEY, load, version=version)
 
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/latest-entry")
+def latest_entry(request: Request) -> Dict[str, Any]:
+    """Return the latest combined patient + medical_record + heart_attack_test entry.
+
+    The predict script expects a JSON with keys: 'patient', 'medical_record', 'heart_attack_test'.
+    Send the ETag back in If-None-Match to get a 304 while nothing changed.
+    """
+    headers = validators(collection_versions(*ENTRY_COLLECTIONS))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+    return FastJSONResponse(load_latest_entry(headers.get("ETag")), headers=headers)
+
+
+@router.get("/entries")
+def entries_after(
+    request: Request,
+    after_test_date: Optional[datetime] = Query(None, description="test_date of the last entry already seen"),
+    after_test_id: Optional[str] = Query(None, description="test_id of the last entry already seen"),
+    limit: int = Query(500, ge=1, le=MAX_ENTRIES_PAGE),
+) -> Dict[str, Any]:
+    """Entries (same shape as /api/latest-entry) for tests newer than a mark, oldest first.
+
+    Tests are ordered by (test_date, test_id); pass the test_date and test_id of
+    the last entry of a page to get the next one. Used by predict.py --watch.
+    """
+    query = {}
+    if after_test_date is not None:
+        query["$or"] = [{"test_date": {"$gt": after_test_date}}]
+        if after_test_id is not None:
+            query["$or"].append({"test_date": after_test_date, "test_id": {"$gt": after_test_id}})
+    elif after_test_id is not None:
+        query["test_id"] = {"$gt": after_test_id}
+
+    headers = validators(collection_versions(*ENTRY_COLLECTIONS))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+
+    try:
+        tests_coll = get_collection("heart_attack_tests")
+        pipeline = entry_pipeline(
+            {"$match": query},
+            {"$sort": {"test_date": 1, "test_id": 1}},
+            {"$limit": limit},
+        )
+        entries = [to_entry(test) for test in tests_coll.aggregate(pipeline)]
+        return FastJSONResponse({"count": len(entries), "entries": entries}, headers=headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/response-cache")
+def response_cache_stats() -> Dict[str, Any]:
+    """Response cache hit/miss counters, overall and per key namespace."""
+    return get_response_cache().stats()
@@ -1,15 +1,33 @@
 # Script to load CSV to MongoDB
 
 """
-Simple script to load CSV into MongoDB
-Just run: python load_data_simple.py
+Bulk loader: Medicaldataset.csv -> MongoDB (patients, medical_records, heart_attack_tests)
+Just run: python load_data.py
+
+The CSV is read in chunks, documents are built column-wise with pandas and
+written with unordered insert_many batches; the three collections are
+written concurrently and indexes are built once the data is in.
+
+Options:
+  --csv PATH           CSV file (default: Medicaldataset.csv)
+  --chunk-size N       CSV rows read per chunk (default: 50000)
+  --batch-size N       documents per insert_many call (default: 5000)
+  --workers N          concurrent insert_many calls (default: 6)
+  --append             keep existing data (IDs continue after the current count)
+  --rows-per-sec       print a per-collection throughput summary at the end
 """
 
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta, timezone
+from itertools import repeat
 import pandas as pd
 from pymongo import MongoClient
-from datetime import datetime
-import os
 from dotenv import load_dotenv
+from database import ensure_indexes, bump_versions
 
 # Load environment variables
 load_dotenv()
@@ -18,86 +36,227 @@ load_dotenv()
 MONGODB_URL = os.getenv("MONGODB_URL")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "heart_attack_db")
 
-print(" Connecting to MongoDB Atlas...")
-client = MongoClient(MONGODB_URL)
-db = client[DATABASE_NAME]
-
-# Test connection
-try:
-    client.admin.command('ping')
-    print(" Connected successfully!")
-except Exception as e:
-    print(f" Connection failed: {e}")
-    exit()
-
-# Read your CSV file
-print("\n Reading Medicaldataset.csv...")
-df = pd.read_csv("Medicaldataset.csv")
-print(f" Found {len(df)} records in CSV")
-
-# Get collections (like tables in SQL)
-patients_col = db["patients"]
-medical_records_col = db["medical_records"]
-heart_attack_tests_col = db["heart_attack_tests"]
-
-# Clear existing data (fresh start)
-print("\n Clearing existing data...")
-patients_col.delete_many({})
-medical_records_col.delete_many({})
-heart_attack_tests_col.delete_many({})
-
-# Load data into 3 collections
-print("\nLoading data into MongoDB...")
-
-for index, row in df.iterrows():
-    # Generate IDs
-    patient_id = f"P{str(index + 1).zfill(4)}"
-    record_id = f"R{str(index + 1).zfill(4)}"
-    test_id = f"T{str(index + 1).zfill(4)}"
-    timestamp = datetime.now()
-    
+COLLECTIONS = ["patients", "medical_records", "heart_attack_tests"]
+
+# Unique keys (like primary keys in SQL), built after the load
+UNIQUE_INDEXES = {
+    "patients": "patient_id",
+    "medical_records": "record_id",
+    "heart_attack_tests": "test_id",
+}
+
+
+# Rows get increasing timestamps, one ROW_INTERVAL apart (BSON dates are
+# millisecond precision), so "latest by test_date" never falls back to the
+# string order of test_id ("T9999" > "T10000"). The sequence is dated
+# backwards from the start of the load: the last row is stamped "now" and
+# nothing is ever in the future, so tests posted through the API afterwards
+# are always newer than the loaded ones.
+ROW_INTERVAL = timedelta(milliseconds=1)
+
+
+def count_rows(csv_path, chunk_size=500000):
+    """Data rows in the CSV (one cheap pass over a single column)"""
+    return sum(len(chunk) for chunk in pd.read_csv(csv_path, usecols=[0], chunksize=chunk_size))
+
+
+def row_timestamps(base, offset, n):
+    """Timestamps of the rows offset .. offset+n-1 (0-based) of a load starting at base"""
+    return [base + ROW_INTERVAL * i for i in range(offset, offset + n)]
+
+
+def make_ids(prefix, start, n):
+    """P0001, P0002, ... for rows start+1 .. start+n (vectorized)"""
+    numbers = pd.Series(range(start + 1, start + n + 1)).astype(str).str.zfill(4)
+    return (prefix + numbers).tolist()
+
+
+def to_documents(columns, n):
+    """Turn {field: list or scalar} into n documents"""
+    names = list(columns)
+    values = [v if isinstance(v, list) else repeat(v, n) for v in columns.values()]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def build_documents(chunk, start, timestamps):
+    """Documents for the three collections from one CSV chunk (one timestamp per row)"""
+    n = len(chunk)
+    patient_ids = make_ids("P", start, n)
+    record_ids = make_ids("R", start, n)
+    test_ids = make_ids("T", start, n)
+
     # Collection 1: Patients (demographics)
-    patients_col.insert_one({
-        "patient_id": patient_id,
-        "age": int(row['Age']),
-        "gender": int(row['Gender']),
-        "created_at": timestamp
-    })
-    
+    patients = to_documents({
+        "patient_id": patient_ids,
+        "age": chunk['Age'].astype(int).tolist(),
+        "gender": chunk['Gender'].astype(int).tolist(),
+        "created_at": timestamps,
+    }, n)
+
     # Collection 2: Medical Records (vital signs)
-    medical_records_col.insert_one({
-        "record_id": record_id,
-        "patient_id": patient_id,  # Links to patients collection
-        "heart_rate": int(row['Heart rate']),
-        "systolic_blood_pressure": int(row['Systolic blood pressure']),
-        "diastolic_blood_pressure": int(row['Diastolic blood pressure']),
-        "blood_sugar": int(row['Blood sugar']),
-        "recorded_at": timestamp
-    })
-    
+    medical_records = to_documents({
+        "record_id": record_ids,
+        "patient_id": patient_ids,  # Links to patients collection
+        "heart_rate": chunk['Heart rate'].astype(int).tolist(),
+        "systolic_blood_pressure": chunk['Systolic blood pressure'].astype(int).tolist(),
+        "diastolic_blood_pressure": chunk['Diastolic blood pressure'].astype(int).tolist(),
+        "blood_sugar": chunk['Blood sugar'].astype(int).tolist(),
+        "recorded_at": timestamps,
+    }, n)
+
     # Collection 3: Heart Attack Tests (lab results)
-    heart_attack_tests_col.insert_one({
-        "test_id": test_id,
-        "record_id": record_id,  # Links to medical_records collection
-        "ck_mb": float(row['CK-MB']),
-        "troponin": float(row['Troponin']),
-        "result": row['Result'].strip().lower(),
-        "test_date": timestamp
-    })
-
-# Create indexes (like primary keys in SQL)
-print("\n Creating indexes...")
-patients_col.create_index("patient_id", unique=True)
-medical_records_col.create_index("record_id", unique=True)
-heart_attack_tests_col.create_index("test_id", unique=True)
-
-# Summary
-print(" SUCCESS! Data loaded into MongoDB")
-print(f" Patients collection: {patients_col.count_documents({})} records")
-print(f" Medical records collection: {medical_records_col.count_documents({})} records")
-print(f" Heart attack tests collection: {heart_attack_tests_col.count_documents({})} records")
-print("\n Task 1 database creation is COMPLETE!")
-print("\n Next: Check your data in MongoDB Atlas web interface")
-print("   Go to: Browse Collections → heart_attack_db")
-
-client.close()
\ No newline at end of file
+    heart_attack_tests = to_documents({
+        "test_id": test_ids,
+        "record_id": record_ids,  # Links to medical_records collection
+        "ck_mb": chunk['CK-MB'].astype(float).tolist(),
+        "troponin": chunk['Troponin'].astype(float).tolist(),
+        "result": chunk['Result'].str.strip().str.lower().tolist(),
+        "test_date": timestamps,
+    }, n)
+
+    return {
+        "patients": patients,
+        "medical_records": medical_records,
+        "heart_attack_tests": heart_attack_tests,
+    }
+
+
+class LoadStats:
+    """Documents written and time spent writing, per collection"""
+
+    def __init__(self):
+        self.docs = {name: 0 for name in COLLECTIONS}
+        self.write_time = {name: 0.0 for name in COLLECTIONS}
+        self._lock = threading.Lock()
+
+    def add(self, name, count, seconds):
+        with self._lock:
+            self.docs[name] += count
+            self.write_time[name] += seconds
+
+
+def insert_batch(collection, documents, stats):
+    """One unordered insert_many call (the server can apply it in parallel)"""
+    start = time.perf_counter()
+    collection.insert_many(documents, ordered=False)
+    stats.add(collection.name, len(documents), time.perf_counter() - start)
+
+
+def load_csv(db, csv_path, chunk_size=50000, batch_size=5000, workers=6, start=0, end=None):
+    """
+    Load the CSV into the three collections.
+    Row timestamps increase row by row and the last row is stamped end
+    (default: now, UTC). With --append the loaded rows are history: they can
+    be older than tests already stored, and watch mode doesn't score them
+    (predict/backfill.py does).
+    Returns (rows loaded, LoadStats).
+    """
+    end = end or datetime.now(timezone.utc)
+    base = end - ROW_INTERVAL * max(count_rows(csv_path) - 1, 0)
+    stats = LoadStats()
+    rows = 0
+    load_start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+            documents = build_documents(chunk, start + rows, row_timestamps(base, rows, len(chunk)))
+            rows += len(chunk)
+
+            # Interleave the collections so all three are written at the same time
+            for offset in range(0, len(chunk), batch_size):
+                for name in COLLECTIONS:
+                    batch = documents[name][offset:offset + batch_size]
+                    pending.add(executor.submit(insert_batch, db[name], batch, stats))
+
+                # Keep a bounded number of batches in flight
+                while len(pending) > workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+
+            elapsed = time.perf_counter() - load_start
+            print(f" Read {rows:,} rows ({rows / elapsed:,.0f} rows/sec)")
+
+        for future in pending:
+            future.result()
+
+    return rows, stats
+
+
+def build_indexes(db):
+    """Unique keys plus the indexes the API relies on"""
+    for name, field in UNIQUE_INDEXES.items():
+        db[name].create_index(field, unique=True)
+    ensure_indexes(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load Medicaldataset.csv into MongoDB")
+    parser.add_argument("--csv", default="Medicaldataset.csv", help="CSV file to load")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="CSV rows read per chunk")
+    parser.add_argument("--batch-size", type=int, default=5000, help="documents per insert_many call")
+    parser.add_argument("--workers", type=int, default=6, help="concurrent insert_many calls")
+    parser.add_argument("--append", action="store_true", help="keep existing data instead of starting fresh")
+    parser.add_argument("--rows-per-sec", action="store_true", help="print a throughput summary at the end")
+    args = parser.parse_args()
+
+    print(" Connecting to MongoDB Atlas...")
+    client = MongoClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+
+    # Test connection
+    try:
+        client.admin.command('ping')
+        print(" Connected successfully!")
+    except Exception as e:
+        print(f" Connection failed: {e}")
+        exit()
+
+    start = 0
+    if args.append:
+        start = db["patients"].estimated_document_count()
+        print(f"\n Appending after {start} existing records...")
+    else:
+        # Dropping (instead of delete_many) also drops the indexes, so the
+        # inserts don't have to maintain them; they are rebuilt after the load
+        print("\n Clearing existing data...")
+        for name in COLLECTIONS:
+            db[name].drop()
+
+    print(f"\n Loading {args.csv} into MongoDB (chunks of {args.chunk_size}, batches of {args.batch_size}, {args.workers} workers)...")
+    load_start = time.perf_counter()
+    rows, stats = load_csv(db, args.csv, args.chunk_size, args.batch_size, args.workers, start)
+    load_time = time.perf_counter() - load_start
+
+    print("\n Creating indexes...")
+    index_start = time.perf_counter()
+    build_indexes(db)
+    index_time = time.perf_counter() - index_start
+    # New ETags for the API, so clients don't keep their copies of the old data
+    bump_versions(*COLLECTIONS, db=db)
+    total_time = load_time + index_time
+
+    # Summary
+    print(" SUCCESS! Data loaded into MongoDB")
+    for name in COLLECTIONS:
+        print(f" {name} collection: {db[name].estimated_document_count()} records")
+    print(f"\n Loaded {rows:,} rows in {load_time:.2f}s, indexes built in {index_time:.2f}s")
+
+    if args.rows_per_sec:
+        print("\n THROUGHPUT")
+        print(f" {'collection':<22}{'documents':>12}{'busy time (s)':>16}{'docs/sec':>14}")
+        for name in COLLECTIONS:
+            seconds = stats.write_time[name]
+            rate = stats.docs[name] / seconds if seconds else 0.0
+            print(f" {name:<22}{stats.docs[name]:>12,}{seconds:>16.2f}{rate:>14,.0f}")
+        print(f" rows/sec (end to end, including indexes): {rows / max(total_time, 1e-9):,.0f}")
+
+    print("\n Next: Check your data in MongoDB Atlas web interface")
+    print("   Go to: Browse Collections → heart_attack_db")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,33 @@ Production FastAPI Application
 Run: python main.py
 """
 
-from database import get_database, close_connection
+import os
+import sys
+
+# The trained model and its loader live in ../predict
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "predict"))
+
+from database import get_database, close_connection, ensure_indexes
 from get_endpoints import router as get_router
 from post_endpoints import router as post_router
+from predict_endpoints import router as predict_router
+from predictions import router as predictions_router, close_prediction_buffer
+from model_service import get_model_service
+from fast_json import FastJSONResponse
+from compression import CompressionMiddleware
+from metrics import MetricsMiddleware, instrument_mongodb, metrics_response
+from profiling import ProfilingMiddleware, flush_profiles
+from tracing import TracingMiddleware, trace_mongodb, set_service_name, get_trace, slowest_traces
 import config
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
 # Create FastAPI app
 app = FastAPI(
     title="Heart Attack Prediction API",
     description="MongoDB-based API for heart attack prediction data",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse  # orjson, ObjectId/datetime aware
 )
 
 # Enable CORS
@@ -28,21 +43,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# brotli/gzip for large JSON and NDJSON responses
+app.add_middleware(CompressionMiddleware)
+
+# Opt-in stack sampling of single requests (PROFILE_SECRET) or 1 in PROFILE_SAMPLE_RATE
+app.add_middleware(ProfilingMiddleware)
+
+# Request latency per route (wraps compression, so its cost is included)
+app.add_middleware(MetricsMiddleware)
+
+# Request spans; the trace id is returned in X-Trace-Id
+app.add_middleware(TracingMiddleware)
+set_service_name("mongodb-api")
+
+# Time every MongoDB command and track the driver's pool (before the client is created)
+instrument_mongodb()
+trace_mongodb()
+
 # Include routers
 app.include_router(get_router, prefix="/api", tags=["GET Operations - MongoDB"])
 app.include_router(post_router, prefix="/api", tags=["POST Operations - MongoDB"])  # NEW
+app.include_router(predict_router, prefix="/api", tags=["Prediction"])
+app.include_router(predictions_router, prefix="/api", tags=["Prediction"])
 
 # Startup
 @app.on_event("startup")
 async def startup():
     print("HEART ATTACK PREDICTION API - STARTING")
     get_database()  # Initialize connection
+    ensure_indexes()  # Indexes used by /api/latest-entry and the lookups
+    try:
+        get_model_service()  # Load the model once and keep it warm
+        print("Prediction model loaded")
+    except Exception as e:
+        print(f"Could not load prediction model: {e}")
     print(f"API Documentation: http://localhost:{config.API_PORT}/docs")
 
 # Shutdown
 @app.on_event("shutdown")
 async def shutdown():
     print("Shutting down...")
+    close_prediction_buffer()  # Write predictions still waiting in the buffer
+    flush_profiles()
     close_connection()
 
 # Root endpoint
@@ -65,6 +107,24 @@ async def health():
     except:
         return {"status": "unhealthy", "database": "disconnected"}
 
+# Prometheus metrics (request, database, model and cache latencies)
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+# Recent traces kept in memory: slowest requests, and the spans of one trace
+@app.get("/traces", include_in_schema=False)
+def traces(limit: int = 20):
+    return {"traces": slowest_traces(limit)}
+
+
+@app.get("/traces/{trace_id}", include_in_schema=False)
+def trace(trace_id: str):
+    spans = get_trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found (or no longer in memory)")
+    return {"trace_id": trace_id, "spans": spans}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host=config.API_HOST, port=config.API_PORT)
\ No newline at end of file
@@ -12,3 +12,15 @@ class Patient(BaseModel):
 
     class Config:
         extra = "allow"
+
+
+class MedicalRecord(BaseModel):
+    # Vital signs of one visit, linked to a patient by patient_id
+    patient_id: Optional[str] = None
+    heart_rate: Optional[int] = None
+    systolic_blood_pressure: Optional[int] = None
+    diastolic_blood_pressure: Optional[int] = None
+    blood_sugar: Optional[int] = None
+
+    class Config:
+        extra = "allow"
@@ -1,7 +1,11 @@
 from fastapi import APIRouter
 from routes.heart_attack_tests import router as hat_router
+from routes.patients import router as patients_router
+from routes.medical_records import router as medical_records_router
 
 router = APIRouter()
 
 # Include POST-style routers (creates a grouping for POST operations)
 router.include_router(hat_router)
+router.include_router(patients_router)
+router.include_router(medical_records_router)
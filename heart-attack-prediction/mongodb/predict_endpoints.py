@@ -0,0 +1,170 @@
+from fastapi import APIRouter, HTTPException, Body
+from datetime import datetime
+from typing import Dict, Any, List
+from database import get_collection
+from get_endpoints import load_latest_entry
+from model_service import get_model_service
+from predictions import prediction_record, store_predictions
+
+# Upper bound on rows scored by one /predict/batch call
+MAX_BATCH_SIZE = 50000
+# IDs per $in query when fetching a batch (keeps every command far below the 16MB BSON limit)
+ID_CHUNK_SIZE = 1000
+
+router = APIRouter()
+
+
+@router.get("/predict")
+def predict_latest() -> Dict[str, Any]:
+    """Score the latest entry with the in-memory model.
+
+    Same data as /latest-entry, plus the prediction, class probabilities and
+    risk level, in a single request.
+    """
+    data = load_latest_entry()
+    if not data["patient"] or not data["medical_record"]:
+        raise HTTPException(status_code=404, detail="Latest test is not linked to a patient record")
+    result = predict_entry(data)
+
+    # Stored tests get their score persisted (payloads posted to /predict don't)
+    store_predictions([prediction_record(
+        data["heart_attack_test"].get("test_id"), result["patient_id"], get_model_service().version, result
+    )])
+    return result
+
+
+@router.post("/predict")
+def predict_entry(payload: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
+    """Score a payload shaped like /latest-entry.
+
+    Expects keys 'patient', 'medical_record' and 'heart_attack_test'.
+    """
+    try:
+        service = get_model_service()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model not available: {e}")
+
+    try:
+        return service.predict_entry(payload)
+    except (KeyError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"Missing or invalid field: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def find_in(coll, field, values):
+    """Documents whose field is one of values, with one $in query per ID_CHUNK_SIZE values"""
+    for start in range(0, len(values), ID_CHUNK_SIZE):
+        yield from coll.find({field: {"$in": values[start:start + ID_CHUNK_SIZE]}}, {"_id": 0})
+
+
+def tested_at(test):
+    """Sort key of a test by date (tests without a date come last)"""
+    value = test.get("test_date")
+    return value if isinstance(value, datetime) else datetime.min
+
+
+def fetch_entries(test_ids=None, patient_ids=None) -> List[Dict[str, Any]]:
+    """Join tests, medical records and patients for many IDs at once.
+
+    Uses chunked $in queries (ID_CHUNK_SIZE IDs each) per collection instead
+    of three find_one calls per entry. With patient_ids, each patient's most
+    recent test is used.
+    """
+    tests_coll = get_collection("heart_attack_tests")
+    records_coll = get_collection("medical_records")
+    patients_coll = get_collection("patients")
+
+    if test_ids is not None:
+        tests = list(find_in(tests_coll, "test_id", test_ids))
+        record_ids = list({t.get("record_id") for t in tests})
+        records = find_in(records_coll, "record_id", record_ids)
+    else:
+        records = list(find_in(records_coll, "patient_id", patient_ids))
+        record_ids = [r["record_id"] for r in records]
+        # Keep only the latest test of each patient
+        patient_of_record = {r["record_id"]: r["patient_id"] for r in records}
+        latest = {}
+        for t in find_in(tests_coll, "record_id", record_ids):
+            patient = patient_of_record.get(t.get("record_id"))
+            if patient not in latest or tested_at(t) > tested_at(latest[patient]):
+                latest[patient] = t
+        tests = list(latest.values())
+
+    records_by_id = {r["record_id"]: r for r in records}
+    patient_keys = list({r.get("patient_id") for r in records_by_id.values()})
+    patients_by_id = {p["patient_id"]: p for p in find_in(patients_coll, "patient_id", patient_keys)}
+
+    entries = []
+    for test in tests:
+        record = records_by_id.get(test.get("record_id"))
+        patient = patients_by_id.get(record.get("patient_id")) if record else None
+        entries.append({"patient": patient, "medical_record": record, "heart_attack_test": test})
+    return entries
+
+
+@router.post("/predict/batch")
+def predict_batch(payload: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
+    """Score many entries with a single model pass.
+
+    Body takes one of:
+    - "test_ids": list of heart_attack_tests.test_id
+    - "patient_ids": list of patient_id (latest test of each patient is scored)
+    - "rows": list of feature dicts or payloads shaped like /latest-entry
+    """
+    test_ids = payload.get("test_ids")
+    patient_ids = payload.get("patient_ids")
+    rows = payload.get("rows")
+
+    requested = [x for x in (test_ids, patient_ids, rows) if x is not None]
+    if len(requested) != 1 or not isinstance(requested[0], list):
+        raise HTTPException(status_code=422, detail="Provide exactly one list: test_ids, patient_ids or rows")
+    if len(requested[0]) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_SIZE} rows)")
+
+    try:
+        service = get_model_service()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model not available: {e}")
+
+    try:
+        missing = []
+        keys = []
+        if rows is None:
+            rows = []
+            for entry in fetch_entries(test_ids=test_ids, patient_ids=patient_ids):
+                # Tests whose record/patient link is broken are reported as missing
+                if entry["patient"] is None or entry["medical_record"] is None:
+                    continue
+                rows.append(entry)
+                keys.append({
+                    "test_id": entry["heart_attack_test"].get("test_id"),
+                    "patient_id": entry["patient"]["patient_id"]
+                })
+            id_field = "test_id" if test_ids is not None else "patient_id"
+            scored = {k[id_field] for k in keys}
+            missing = [i for i in requested[0] if i not in scored]
+
+        results = service.predict_batch(rows)
+        for key, result in zip(keys, results):
+            result.update(key)
+        if keys:
+            store_predictions([
+                prediction_record(key["test_id"], key["patient_id"], service.version, result)
+                for key, result in zip(keys, results)
+            ])
+
+        return {"count": len(results), "predictions": results, "missing": missing}
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Missing or invalid field: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/predict/cache")
+def prediction_cache_stats() -> Dict[str, Any]:
+    """Prediction cache hit/miss counters and the model version in use."""
+    try:
+        return get_model_service().cache_stats()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model not available: {e}")
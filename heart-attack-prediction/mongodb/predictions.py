@@ -0,0 +1,119 @@
+import threading
+from fastapi import APIRouter, HTTPException, Query, Request
+from pymongo import UpdateOne
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+from database import get_collection, collection_versions, bump_versions
+from conditional import validators, is_fresh, not_modified
+from fast_json import FastJSONResponse
+from prediction_buffer import PredictionBuffer
+
+router = APIRouter()
+
+MAX_PREDICTIONS_PAGE = 1000
+
+
+def prediction_time():
+    """Timestamp stored in predicted_at: aware UTC (MongoDB stores dates as UTC)"""
+    return datetime.now(timezone.utc)
+
+
+def as_utc(value):
+    """A query datetime in UTC; one without a time zone is taken as UTC already"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def prediction_record(test_id, patient_id, model_version, result, source="api"):
+    """Stored form of one scored test (result as returned by ModelService)"""
+    return {
+        "test_id": test_id,
+        "patient_id": patient_id,
+        "model_version": model_version,
+        "prediction": result["prediction"],
+        "probability": result["probabilities"]["positive"],
+        "risk_level": result["risk_level"],
+        "predicted_at": prediction_time(),
+        "source": source,
+    }
+
+
+def save_predictions(records, db=None):
+    """Upsert prediction records by (test_id, model_version) with one bulk write"""
+    if not records:
+        return
+    coll = db["predictions"] if db is not None else get_collection("predictions")
+    operations = [
+        UpdateOne({"test_id": r["test_id"], "model_version": r["model_version"]}, {"$set": r}, upsert=True)
+        for r in records
+    ]
+    coll.bulk_write(operations, ordered=False)
+    bump_versions("predictions", db=coll.database)
+
+
+# Process-wide write buffer, started on first use
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_prediction_buffer():
+    """Returns the buffer that batches prediction writes for this process"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = PredictionBuffer(save_predictions)
+    return _buffer
+
+
+def close_prediction_buffer():
+    """Write pending predictions (called at app shutdown)"""
+    if _buffer is not None:
+        _buffer.close()
+
+
+def store_predictions(records):
+    """Queue prediction records; they are written in batches in the background"""
+    get_prediction_buffer().add(records)
+
+
+@router.get("/predictions")
+def list_predictions(
+    request: Request,
+    patient_id: Optional[str] = Query(None, description="Only this patient's predictions"),
+    test_id: Optional[str] = Query(None, description="Only predictions of this test"),
+    since: Optional[datetime] = Query(None, description="Only predictions made at or after this time (UTC unless it has an offset)"),
+    model_version: Optional[str] = Query(None, description="Only predictions of this model version"),
+    limit: int = Query(100, ge=1, le=MAX_PREDICTIONS_PAGE),
+) -> Dict[str, Any]:
+    """Stored risk scores, newest first.
+
+    Filled by /predict, /predict/batch (stored tests only) and predict/backfill.py.
+    """
+    query = {}
+    if patient_id is not None:
+        query["patient_id"] = patient_id
+    if test_id is not None:
+        query["test_id"] = test_id
+    if since is not None:
+        query["predicted_at"] = {"$gte": as_utc(since)}
+    if model_version is not None:
+        query["model_version"] = model_version
+
+    headers = validators(collection_versions("predictions"))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+
+    try:
+        cursor = get_collection("predictions").find(query, {"_id": 0}).sort("predicted_at", -1).limit(limit)
+        predictions = list(cursor)
+        return FastJSONResponse({"count": len(predictions), "predictions": predictions}, headers=headers)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/predictions/buffer")
+def prediction_buffer_stats() -> Dict[str, Any]:
+    """Write buffer counters (pending, written, dropped)."""
+    return get_prediction_buffer().stats()
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List, Optional
-from database import get_collection
+from database import get_collection, collection_versions, bump_versions
+from response_cache import get_response_cache, LATEST_ENTRY_KEY
+from conditional import validators, is_fresh, not_modified
+from fast_json import FastJSONResponse
+from streaming import stream_documents, DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
 
@@ -10,6 +14,11 @@ def heart_tests_coll():
 	return get_collection("heart_attack_tests")
 
 
+def test_key(test_id):
+	"""Response cache key of GET /heart-attack-tests/{test_id}"""
+	return f"heart-test:{test_id}" if test_id is not None else None
+
+
 @router.post("/heart-attack-tests", status_code=201)
 def create_heart_test(payload: dict):
 	"""Create a heart attack test document.
@@ -19,32 +28,45 @@ def create_heart_test(payload: dict):
 	coll = heart_tests_coll()
 	try:
 		res = coll.insert_one(payload)
+		bump_versions("heart_attack_tests")
+		get_response_cache().invalidate(LATEST_ENTRY_KEY, test_key(payload.get("test_id")))
 		return {"inserted_id": str(res.inserted_id)}
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/heart-attack-tests")
-def get_all_heart_tests():
-	coll = heart_tests_coll()
-	try:
-		docs = list(coll.find())
-		for d in docs:
-			d["_id"] = str(d["_id"])
-		return docs
-	except Exception as e:
-		raise HTTPException(status_code=500, detail=str(e))
+def get_all_heart_tests(
+	request: Request,
+	fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+	after_id: Optional[str] = Query(None, description="Return documents after this _id"),
+	limit: Optional[int] = Query(None, ge=1),
+	batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=MAX_BATCH_SIZE),
+	format: str = Query("json", description="json or ndjson"),
+):
+	"""Stream heart attack tests ordered by _id."""
+	headers = validators(collection_versions("heart_attack_tests"))
+	if is_fresh(request, headers):
+		return not_modified(headers)
+	return stream_documents(heart_tests_coll(), fields=fields, after_id=after_id, limit=limit,
+		batch_size=batch_size, format=format, headers=headers)
 
 
 @router.get("/heart-attack-tests/{test_id}")
-def get_heart_test(test_id: str):
-	coll = heart_tests_coll()
-	try:
-		doc = coll.find_one({"test_id": test_id})
+def get_heart_test(test_id: str, request: Request):
+	headers = validators(collection_versions("heart_attack_tests"))
+	if is_fresh(request, headers):
+		return not_modified(headers)
+
+	def load():
+		doc = heart_tests_coll().find_one({"test_id": test_id})
 		if not doc:
 			raise HTTPException(status_code=404, detail="Test not found")
-		doc["_id"] = str(doc["_id"])
 		return doc
+
+	try:
+		# FastJSONResponse encodes the ObjectId _id as a string
+		return FastJSONResponse(get_response_cache().get_or_load(test_key(test_id), load, version=headers.get("ETag")), headers=headers)
 	except HTTPException:
 		raise
 	except Exception as e:
@@ -52,15 +74,17 @@ def get_heart_test(test_id: str):
 
 
 @router.get("/heart-attack-tests/record/{record_id}")
-def get_tests_by_record(record_id: str):
+def get_tests_by_record(record_id: str, request: Request):
+	headers = validators(collection_versions("heart_attack_tests"))
+	if is_fresh(request, headers):
+		return not_modified(headers)
+
 	coll = heart_tests_coll()
 	try:
 		docs = list(coll.find({"record_id": record_id}))
 		if not docs:
 			raise HTTPException(status_code=404, detail="No tests found for this record")
-		for d in docs:
-			d["_id"] = str(d["_id"])
-		return docs
+		return FastJSONResponse(docs, headers=headers)
 	except HTTPException:
 		raise
 	except Exception as e:
@@ -74,6 +98,9 @@ def update_heart_test(test_id: str, payload: dict):
 		res = coll.update_one({"test_id": test_id}, {"$set": payload})
 		if res.matched_count == 0:
 			raise HTTPException(status_code=404, detail="Test not found")
+		bump_versions("heart_attack_tests")
+		# The payload may also change the test_id itself
+		get_response_cache().invalidate(LATEST_ENTRY_KEY, test_key(test_id), test_key(payload.get("test_id")))
 		return {"matched_count": res.matched_count, "modified_count": res.modified_count}
 	except HTTPException:
 		raise
@@ -88,6 +115,8 @@ def delete_heart_test(test_id: str):
 		res = coll.delete_one({"test_id": test_id})
 		if res.deleted_count == 0:
 			raise HTTPException(status_code=404, detail="Test not found")
+		bump_versions("heart_attack_tests")
+		get_response_cache().invalidate(LATEST_ENTRY_KEY, test_key(test_id))
 		return {"deleted_count": res.deleted_count}
 	except HTTPException:
 		raise
@@ -3,15 +3,33 @@ Medical Records CRUD Operations
 Route: /medical-records
 """
 
-from fastapi import APIRouter, HTTPException
-from heart_project.models import MedicalRecord
-from heart_project.db import medical_records_coll, patients_coll
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Optional
+from models import MedicalRecord
+from database import get_collection, collection_versions, bump_versions
+from response_cache import get_response_cache, LATEST_ENTRY_KEY
+from conditional import validators, is_fresh, not_modified
+from fast_json import FastJSONResponse
+from streaming import stream_documents, DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
 
 router = APIRouter()
 
 
+def medical_records_coll():
+    return get_collection("medical_records")
+
+
+def patients_coll():
+    return get_collection("patients")
+
+
+def patient_records_key(patient_id):
+    """Response cache key of GET /medical-records/patient/{patient_id}"""
+    return f"patient-records:{patient_id}" if patient_id is not None else None
+
+
 @router.post("/medical-records", status_code=201)
 def create_medical_record(record: MedicalRecord):
     """Create a new medical record"""
@@ -21,44 +39,54 @@ def create_medical_record(record: MedicalRecord):
     patient_id = data.get("patient_id")
     if patient_id:
         # Check if patient exists
-        patient = patients_coll.find_one({"patient_id": patient_id})
+        patient = patients_coll().find_one({"patient_id": patient_id})
         if not patient:
             raise HTTPException(status_code=404, detail=f"Patient {patient_id} not found")
     
     try:
-        res = medical_records_coll.insert_one(data)
+        res = medical_records_coll().insert_one(data)
+        bump_versions("medical_records")
+        get_response_cache().invalidate(patient_records_key(patient_id))
         return {"inserted_id": str(res.inserted_id), "message": "Medical record created"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/medical-records")
-def get_all_medical_records():
-    """Get all medical records"""
-    try:
-        records = list(medical_records_coll.find())
-        for record in records:
-            record["_id"] = str(record["_id"])
-        return records
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def get_all_medical_records(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    after_id: Optional[str] = Query(None, description="Return documents after this _id"),
+    limit: Optional[int] = Query(None, ge=1),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=MAX_BATCH_SIZE),
+    format: str = Query("json", description="json or ndjson"),
+):
+    """Stream medical records ordered by _id"""
+    headers = validators(collection_versions("medical_records"))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+    return stream_documents(medical_records_coll(), fields=fields, after_id=after_id, limit=limit,
+                            batch_size=batch_size, format=format, headers=headers)
 
 
 @router.get("/medical-records/{record_id}")
-def get_medical_record(record_id: str):
+def get_medical_record(record_id: str, request: Request):
     """Get specific medical record by ID"""
+    headers = validators(collection_versions("medical_records"))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+
     try:
         try:
             oid = ObjectId(record_id)
         except InvalidId:
             raise HTTPException(status_code=400, detail="Invalid record id")
         
-        record = medical_records_coll.find_one({"_id": oid})
+        record = medical_records_coll().find_one({"_id": oid})
         if not record:
             raise HTTPException(status_code=404, detail="Medical record not found")
         
-        record["_id"] = str(record["_id"])
-        return record
+        return FastJSONResponse(record, headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -66,16 +94,21 @@ def get_medical_record(record_id: str):
 
 
 @router.get("/medical-records/patient/{patient_id}")
-def get_patient_records(patient_id: str):
+def get_patient_records(patient_id: str, request: Request):
     """Get all medical records for a specific patient"""
-    try:
-        records = list(medical_records_coll.find({"patient_id": patient_id}))
+    headers = validators(collection_versions("medical_records"))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+
+    def load():
+        records = list(medical_records_coll().find({"patient_id": patient_id}))
         if not records:
             raise HTTPException(status_code=404, detail=f"No records found for patient {patient_id}")
-        
-        for record in records:
-            record["_id"] = str(record["_id"])
         return records
+
+    try:
+        # Hot path: the same few patients are read over and over
+        return FastJSONResponse(get_response_cache().get_or_load(patient_records_key(patient_id), load, version=headers.get("ETag")), headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -93,9 +126,17 @@ def update_medical_record(record_id: str, record: MedicalRecord):
         except InvalidId:
             raise HTTPException(status_code=400, detail="Invalid record id")
         
-        res = medical_records_coll.update_one({"_id": oid}, {"$set": data})
+        # The update may move the record to another patient: both lists change
+        old = medical_records_coll().find_one({"_id": oid}, {"patient_id": 1}) or {}
+        res = medical_records_coll().update_one({"_id": oid}, {"$set": data})
         if res.matched_count == 0:
             raise HTTPException(status_code=404, detail="Medical record not found")
+        bump_versions("medical_records")
+        get_response_cache().invalidate(
+            LATEST_ENTRY_KEY,
+            patient_records_key(old.get("patient_id")),
+            patient_records_key(data.get("patient_id")),
+        )
         
         return {
             "matched_count": res.matched_count,
@@ -117,12 +158,15 @@ def delete_medical_record(record_id: str):
         except InvalidId:
             raise HTTPException(status_code=400, detail="Invalid record id")
         
-        res = medical_records_coll.delete_one({"_id": oid})
-        if res.deleted_count == 0:
+        # find_one_and_delete returns the record, so we know whose list changed
+        deleted = medical_records_coll().find_one_and_delete({"_id": oid}, {"patient_id": 1})
+        if deleted is None:
             raise HTTPException(status_code=404, detail="Medical record not found")
+        bump_versions("medical_records")
+        get_response_cache().invalidate(LATEST_ENTRY_KEY, patient_records_key(deleted.get("patient_id")))
         
         return {
-            "deleted_count": res.deleted_count,
+            "deleted_count": 1,
             "message": "Medical record deleted"
         }
     except HTTPException:
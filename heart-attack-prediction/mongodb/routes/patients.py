@@ -1,12 +1,20 @@
-from fastapi import APIRouter, HTTPException
-from heart_project.models import Patient
-from heart_project.db import patients_coll
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Optional
+from models import Patient
+from database import get_collection, collection_versions, bump_versions
+from response_cache import get_response_cache, LATEST_ENTRY_KEY
+from conditional import validators, is_fresh, not_modified
+from streaming import stream_documents, DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
 
 router = APIRouter()
 
 
+def patients_coll():
+    return get_collection("patients")
+
+
 @router.get("/")
 def root():
     return {"message": "Heart Patients API is running!"}
@@ -26,21 +34,28 @@ def create_patient(patient: Patient):
             data["gender"] = "Female"
 
     try:
-        res = patients_coll.insert_one(data)
+        res = patients_coll().insert_one(data)
+        bump_versions("patients")
         return {"inserted_id": str(res.inserted_id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/patients")
-def get_all_patients():
-    try:
-        patients = list(patients_coll.find())
-        for patient in patients:
-            patient["_id"] = str(patient["_id"])
-        return patients
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def get_all_patients(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+    after_id: Optional[str] = Query(None, description="Return documents after this _id"),
+    limit: Optional[int] = Query(None, ge=1),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=MAX_BATCH_SIZE),
+    format: str = Query("json", description="json or ndjson"),
+):
+    """Stream patients ordered by _id"""
+    headers = validators(collection_versions("patients"))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+    return stream_documents(patients_coll(), fields=fields, after_id=after_id, limit=limit,
+                            batch_size=batch_size, format=format, headers=headers)
 
 
 @router.put("/patients/{patient_id}")
@@ -62,9 +77,12 @@ def update_patient(patient_id: str, patient: Patient):
         except InvalidId:
             raise HTTPException(status_code=400, detail="Invalid patient id")
 
-        res = patients_coll.update_one({"_id": oid}, {"$set": data})
+        res = patients_coll().update_one({"_id": oid}, {"$set": data})
         if res.matched_count == 0:
             raise HTTPException(status_code=404, detail="Patient not found")
+        bump_versions("patients")
+        # Patient fields are part of /api/latest-entry
+        get_response_cache().invalidate(LATEST_ENTRY_KEY)
         return {"matched_count": res.matched_count, "modified_count": res.modified_count}
     except HTTPException:
         raise
@@ -80,9 +98,11 @@ def delete_patient(patient_id: str):
         except InvalidId:
             raise HTTPException(status_code=400, detail="Invalid patient id")
 
-        res = patients_coll.delete_one({"_id": oid})
+        res = patients_coll().delete_one({"_id": oid})
         if res.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Patient not found")
+        bump_versions("patients")
+        get_response_cache().invalidate(LATEST_ENTRY_KEY)
         return {"deleted_count": res.deleted_count}
     except HTTPException:
         raise
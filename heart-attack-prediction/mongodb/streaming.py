@@ -0,0 +1,86 @@
+"""
+Streaming list responses for MongoDB collections.
+Documents are serialized as they come off the cursor instead of being
+loaded into a list first, so memory stays bounded on large collections.
+"""
+
+from itertools import chain
+from typing import Optional
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from fast_json import dumps, dumps_line
+
+DEFAULT_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 10000
+# Documents serialized per chunk written to the response
+DOCS_PER_CHUNK = 100
+
+
+def parse_fields(fields: Optional[str]):
+    """Turn ?fields=a,b,c into a projection ({"a": 1, ...}); _id is always returned"""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    return {name: 1 for name in names} or None
+
+
+def _serialize(docs, ndjson):
+    """Yield the response body a few documents at a time (orjson, _id encoded as a string)"""
+    parts = [] if ndjson else [b"["]
+    for count, doc in enumerate(docs):
+        if ndjson:
+            parts.append(dumps_line(doc))
+        else:
+            if count:
+                parts.append(b",")
+            parts.append(dumps(doc))
+        if (count + 1) % DOCS_PER_CHUNK == 0:
+            yield b"".join(parts)
+            parts = []
+    if not ndjson:
+        parts.append(b"]")
+    if parts:
+        yield b"".join(parts)
+
+
+def stream_documents(coll, query=None, fields=None, after_id=None, limit=None,
+                     batch_size=DEFAULT_BATCH_SIZE, format="json", headers=None):
+    """
+    Stream documents of a collection ordered by _id.
+
+    - query: extra filter
+    - fields: comma separated projection (?fields=)
+    - after_id: only documents with _id greater than this (pass the last _id
+      of the previous page to continue)
+    - limit: maximum number of documents
+    - batch_size: documents fetched per round trip to MongoDB
+    - format: "json" (array) or "ndjson" (one document per line)
+    - headers: extra response headers (ETag / Last-Modified)
+    """
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'")
+
+    query = dict(query or {})
+    if after_id:
+        try:
+            query["_id"] = {"$gt": ObjectId(after_id)}
+        except InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid after_id")
+
+    cursor = coll.find(query, parse_fields(fields)).sort("_id", 1).batch_size(batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    # Read the first document now so connection/query errors still become a 500
+    # instead of a truncated stream
+    try:
+        first = next(cursor, None)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    docs = chain([first], cursor) if first is not None else iter(())
+    ndjson = format == "ndjson"
+    media_type = "application/x-ndjson" if ndjson else "application/json"
+    return StreamingResponse(_serialize(docs, ndjson), media_type=media_type, headers=headers)
@@ -0,0 +1,22 @@
+USE heart_attack_db;
+
+-- Stored risk scores, one row per (test, model version)
+-- Written in batches by the API (/api/predict, /api/predict/batch) and predict/backfill.py
+CREATE TABLE IF NOT EXISTS predictions (
+    prediction_id  BIGINT AUTO_INCREMENT PRIMARY KEY,
+    test_id        INT NOT NULL,
+    patient_id     INT NOT NULL,
+    model_version  VARCHAR(32) NOT NULL,
+    prediction     TINYINT(1) NOT NULL,     -- 1 = positive, 0 = negative
+    probability    DOUBLE NOT NULL,         -- probability of the positive class
+    risk_level     VARCHAR(20) NOT NULL,    -- LOW RISK / MODERATE RISK / HIGH RISK
+    predicted_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_predictions_test_model UNIQUE (test_id, model_version),
+    CONSTRAINT fk_predictions_test
+      FOREIGN KEY (test_id) REFERENCES tests(test_id)
+      ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+-- /api/predictions?patient_id=&since= and ?since=
+CREATE INDEX idx_predictions_patient_time ON predictions(patient_id, predicted_at);
+CREATE INDEX idx_predictions_time ON predictions(predicted_at);
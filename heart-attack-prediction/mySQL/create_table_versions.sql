@@ -0,0 +1,15 @@
+USE heart_attack_db;
+
+-- Version counter per table, bumped by every API write (and by load_data.py)
+-- ETags of the GET endpoints are built from these rows, so an unchanged
+-- table answers If-None-Match with 304 without reading the data
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name   VARCHAR(64) PRIMARY KEY,
+    version      BIGINT NOT NULL DEFAULT 0,
+    modified_at  DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)   -- UTC
+) ENGINE=InnoDB;
+
+INSERT IGNORE INTO table_versions (table_name, modified_at) VALUES
+    ('patients', UTC_TIMESTAMP(6)),
+    ('tests', UTC_TIMESTAMP(6)),
+    ('predictions', UTC_TIMESTAMP(6));
@@ -0,0 +1,335 @@
+# MySQL connection setup and connection pool
+
+"""
+MySQL connections for the FastAPI app.
+The pool is created once at startup; endpoints borrow a connection through
+the get_db dependency instead of opening a new TCP+auth handshake per request.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import mysql.connector
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+load_dotenv()
+
+# Pool settings (override with environment variables)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))                 # connections kept open
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))  # extra connections under load
+POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # seconds before a connection is replaced
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))         # seconds to wait for a free connection
+
+
+def get_db_connection(**options):
+    """Open a new (unpooled) MySQL connection; extra options go to mysql.connector.connect"""
+    return mysql.connector.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASS"),
+        database=os.getenv("DB_NAME"),
+        **options
+    )
+
+
+# Optional function applied to every connection the pool opens (main.py installs
+# metrics.instrument_connection so each statement is timed); None = plain connections
+connection_wrapper = None
+
+
+def _connect_pooled():
+    conn = get_db_connection()
+    return connection_wrapper(conn) if connection_wrapper is not None else conn
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes free within the pool timeout"""
+
+
+class _PooledConnection:
+    """A connection plus the time it was opened"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Thread-safe MySQL connection pool
+
+    - keeps up to `size` idle connections open
+    - opens up to `max_overflow` extra connections under load (closed when returned)
+    - replaces connections older than `max_lifetime` seconds
+    - pings a connection before handing it out when `pre_ping` is on
+    - waits up to `timeout` seconds for a free connection, then raises PoolTimeoutError
+    """
+
+    def __init__(self, size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW, max_lifetime=POOL_MAX_LIFETIME,
+                 pre_ping=POOL_PRE_PING, timeout=POOL_TIMEOUT, connect=_connect_pooled):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.max_lifetime = max_lifetime
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+        self._connect = connect
+
+        self._idle = deque()
+        self._in_use = {}
+        self._opening = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # Statistics
+        self.checkouts = 0
+        self.connections_opened = 0
+        self.connections_discarded = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _total(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _is_usable(self, pooled):
+        """Lifetime and (optionally) liveness check before reuse"""
+        if self.max_lifetime and time.monotonic() - pooled.created_at > self.max_lifetime:
+            return False
+        if self.pre_ping:
+            try:
+                pooled.conn.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, pooled):
+        with self._cond:
+            self.connections_discarded += 1
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """Borrow a connection; call release() (or use connection()) to give it back"""
+        start = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._total() < self.size + self.max_overflow:
+                    pooled = None
+                    self._opening += 1
+                    break
+
+                # Pool exhausted: wait for a connection to come back
+                waited = True
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle and self._total() >= self.size + self.max_overflow:
+                        self.timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {self.timeout:.1f}s "
+                            f"(pool size {self.size}, overflow {self.max_overflow})"
+                        )
+
+        # Checks and new connections happen outside the lock
+        if pooled is not None and not self._is_usable(pooled):
+            self._discard(pooled)
+            with self._cond:
+                self._opening += 1
+            pooled = None
+
+        if pooled is None:
+            try:
+                pooled = _PooledConnection(self._connect())
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._opening -= 1
+                self.connections_opened += 1
+
+        wait_time = time.monotonic() - start
+        with self._cond:
+            self._in_use[id(pooled.conn)] = pooled
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+        return pooled.conn
+
+    def release(self, conn):
+        """Return a borrowed connection to the pool"""
+        with self._cond:
+            pooled = self._in_use.get(id(conn))
+        if pooled is None:
+            return
+
+        keep = not self._closed
+        if keep:
+            try:
+                # End any open transaction so the next user starts clean
+                # (an open read transaction would pin an old InnoDB snapshot)
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                keep = False
+
+        with self._cond:
+            del self._in_use[id(conn)]
+            if keep and not self._closed and len(self._idle) < self.size:
+                self._idle.append(pooled)
+                pooled = None
+            self._cond.notify()
+        if pooled is not None:
+            self._discard(pooled)
+
+    @contextmanager
+    def connection(self):
+        """with pool.connection() as conn: ..."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close idle connections; in-use connections are closed when released"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def stats(self):
+        """Pool usage and wait statistics"""
+        with self._cond:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "total": self._total(),
+                "checkouts": self.checkouts,
+                "connections_opened": self.connections_opened,
+                "connections_discarded": self.connections_discarded,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait_time / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_time * 1000, 3),
+            }
+
+
+# Global pool shared by every request in this process
+pool = None
+_pool_lock = threading.Lock()
+
+
+def init_pool():
+    """Create the global pool (called at app startup)"""
+    global pool
+    with _pool_lock:
+        if pool is None:
+            pool = ConnectionPool()
+            print(f"MySQL connection pool ready (size={pool.size}, overflow={pool.max_overflow})")
+    return pool
+
+
+def get_pool():
+    """Returns the global pool, creating it on first use"""
+    if pool is None:
+        return init_pool()
+    return pool
+
+
+def close_pool():
+    """Close the global pool (called at app shutdown)"""
+    global pool
+    with _pool_lock:
+        if pool is not None:
+            pool.close()
+            pool = None
+            print("MySQL connection pool closed")
+
+
+def reset_after_fork():
+    """
+    Forget the pool inherited from the parent process.
+    Its sockets belong to the parent, so every worker creates its own pool on first use.
+    """
+    global pool
+    pool = None
+
+
+def table_versions(*names, conn=None):
+    """
+    Returns [(table, version, modified_at), ...] from the table_versions table
+    (create_table_versions.sql). Used to build ETags: a table that was never
+    bumped has version 0, and the version is None when it can't be read.
+    """
+    query = f"SELECT table_name, version, modified_at FROM table_versions WHERE table_name IN ({', '.join(['%s'] * len(names))})"
+    try:
+        if conn is None:
+            with get_pool().connection() as pooled:
+                found = _fetch_versions(pooled, query, names)
+        else:
+            # Read in the request's transaction: the data read next comes from the same snapshot
+            found = _fetch_versions(conn, query, names)
+    except Exception:
+        # Unknown versions: the response goes out without an ETag
+        return [(name, None, None) for name in names]
+    return [(name, *found.get(name, (0, None))) for name in names]
+
+
+def _fetch_versions(conn, query, names):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, names)
+        return {table: (version, modified_at) for table, version, modified_at in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def bump_versions(cursor, *names):
+    """
+    Increments the version counters of the given tables.
+    Run in the write's own transaction (before commit), so the new data and
+    the new version become visible together.
+    """
+    try:
+        cursor.executemany("""
+            INSERT INTO table_versions (table_name, version, modified_at)
+            VALUES (%s, 1, UTC_TIMESTAMP(6))
+            ON DUPLICATE KEY UPDATE version = version + 1, modified_at = UTC_TIMESTAMP(6)
+        """, [(name,) for name in sorted(names)])  # same lock order in every transaction
+    except mysql.connector.Error as e:
+        # No version table yet: responses carry no ETag, so nothing can go stale
+        print(f"Could not bump table versions {names}: {e}")
+
+
+def get_db():
+    """FastAPI dependency: borrow a pooled connection for the duration of a request"""
+    db_pool = get_pool()
+    try:
+        conn = db_pool.acquire()
+    except PoolTimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        yield conn
+    finally:
+        db_pool.release(conn)
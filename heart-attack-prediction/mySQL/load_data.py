@@ -0,0 +1,218 @@
+# Script to load CSV to MySQL
+
+"""
+Bulk loader: Medicaldataset.csv -> MySQL (patients, tests)
+Run: python load_data.py --csv ../ml_model/Medicaldataset.csv
+
+Each CSV row becomes one patient (Age, Gender, Result) and one test
+(vital signs and lab values) linked to it. The CSV is read in chunks and
+every chunk is written in a single transaction, either with multi-row
+INSERTs (executemany) or with LOAD DATA LOCAL INFILE when the server allows it.
+
+Options:
+  --csv PATH            CSV file (default: Medicaldataset.csv)
+  --chunk-size N        CSV rows per transaction (default: 100000)
+  --batch-size N        rows per multi-row INSERT (default: 5000)
+  --load-data           use LOAD DATA LOCAL INFILE (falls back to INSERTs if unavailable)
+  --suspend-triggers    skip the per-row log_test_insert trigger and write
+                        the logs rows in one statement after the load
+                        (needs the trigger.sql that checks @disable_log_triggers)
+"""
+
+import argparse
+import csv
+import os
+import tempfile
+import time
+import pandas as pd
+from database import get_db_connection, bump_versions
+
+PATIENT_COLUMNS = ["patient_id", "age", "gender", "result"]
+TEST_COLUMNS = ["patient_id", "heart_rate", "systolic_bp", "diastolic_bp",
+                "blood_sugar", "ck_mb", "troponin"]
+
+# mysql.connector rewrites executemany() of a plain INSERT ... VALUES into one
+# multi-row INSERT per call
+PATIENT_INSERT = f"INSERT INTO patients ({', '.join(PATIENT_COLUMNS)}) VALUES ({', '.join(['%s'] * len(PATIENT_COLUMNS))})"
+TEST_INSERT = f"INSERT INTO tests ({', '.join(TEST_COLUMNS)}) VALUES ({', '.join(['%s'] * len(TEST_COLUMNS))})"
+
+
+def build_rows(chunk, first_patient_id):
+    """Patient and test rows for one CSV chunk (column-wise, no iterrows)"""
+    patient_ids = list(range(first_patient_id, first_patient_id + len(chunk)))
+    patients = list(zip(
+        patient_ids,
+        chunk['Age'].astype(int).tolist(),
+        chunk['Gender'].astype(int).tolist(),
+        chunk['Result'].str.strip().str.lower().tolist(),
+    ))
+    tests = list(zip(
+        patient_ids,
+        chunk['Heart rate'].astype(int).tolist(),
+        chunk['Systolic blood pressure'].astype(int).tolist(),
+        chunk['Diastolic blood pressure'].astype(int).tolist(),
+        chunk['Blood sugar'].astype(int).tolist(),
+        chunk['CK-MB'].astype(float).tolist(),
+        chunk['Troponin'].astype(float).tolist(),
+    ))
+    return patients, tests
+
+
+def insert_rows(cursor, sql, rows, batch_size):
+    """Write rows with one multi-row INSERT per batch"""
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def load_data_infile(cursor, table, columns, rows):
+    """Write rows through a temporary CSV and LOAD DATA LOCAL INFILE"""
+    with tempfile.NamedTemporaryFile("w", newline="", suffix=".csv", delete=False) as f:
+        csv.writer(f, lineterminator="\n").writerows(rows)
+        path = f.name
+    try:
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+            f"LINES TERMINATED BY '\\n' ({', '.join(columns)})",
+            (path,)
+        )
+    finally:
+        os.remove(path)
+
+
+def local_infile_enabled(cursor):
+    """True if the server accepts LOAD DATA LOCAL INFILE"""
+    try:
+        cursor.execute("SHOW VARIABLES LIKE 'local_infile'")
+        row = cursor.fetchone()
+        return bool(row) and str(row[1]).upper() in ("ON", "1")
+    except Exception:
+        return False
+
+
+def triggers_can_be_suspended(cursor):
+    """True if log_test_insert checks @disable_log_triggers (trigger.sql)"""
+    cursor.execute(
+        "SELECT ACTION_STATEMENT FROM information_schema.TRIGGERS "
+        "WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = 'log_test_insert'"
+    )
+    row = cursor.fetchone()
+    # No trigger at all: nothing to suspend, and nothing wrote logs rows either
+    return row is None or "@disable_log_triggers" in row[0]
+
+
+def backfill_logs(cursor, first_patient_id, last_patient_id):
+    """One 'INSERT on tests' log row per loaded test, in a single statement"""
+    cursor.execute(
+        "INSERT INTO logs (patient_id, operation) "
+        "SELECT patient_id, 'INSERT on tests' FROM tests "
+        "WHERE patient_id BETWEEN %s AND %s ORDER BY test_id",
+        (first_patient_id, last_patient_id)
+    )
+    return cursor.rowcount
+
+
+def load_csv(conn, csv_path, chunk_size=100000, batch_size=5000, use_infile=False):
+    """
+    Load the CSV, one transaction per chunk.
+    Returns (rows loaded, first patient_id, last patient_id).
+    """
+    cursor = conn.cursor()
+    rows = 0
+    first_patient_id = None
+    last_patient_id = None
+    load_start = time.perf_counter()
+
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+            # autocommit is off: everything up to commit() is one transaction
+            try:
+                # Patient IDs are assigned here so tests can reference them without
+                # a round trip per row; FOR UPDATE holds the end of the key range
+                # until commit so concurrent inserts can't take the same IDs
+                cursor.execute("SELECT COALESCE(MAX(patient_id), 0) FROM patients FOR UPDATE")
+                next_id = cursor.fetchone()[0] + 1
+                patients, tests = build_rows(chunk, next_id)
+
+                if use_infile:
+                    load_data_infile(cursor, "patients", PATIENT_COLUMNS, patients)
+                    load_data_infile(cursor, "tests", TEST_COLUMNS, tests)
+                else:
+                    insert_rows(cursor, PATIENT_INSERT, patients, batch_size)
+                    insert_rows(cursor, TEST_INSERT, tests, batch_size)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            if first_patient_id is None:
+                first_patient_id = next_id
+            last_patient_id = next_id + len(chunk) - 1
+            rows += len(chunk)
+            elapsed = time.perf_counter() - load_start
+            print(f" Loaded {rows:,} rows ({rows / elapsed:,.0f} rows/sec)")
+    finally:
+        cursor.close()
+
+    return rows, first_patient_id, last_patient_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load Medicaldataset.csv into MySQL")
+    parser.add_argument("--csv", default="Medicaldataset.csv", help="CSV file to load")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="CSV rows per transaction")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per multi-row INSERT")
+    parser.add_argument("--load-data", action="store_true", help="use LOAD DATA LOCAL INFILE when available")
+    parser.add_argument("--suspend-triggers", action="store_true",
+                        help="skip per-row audit triggers and backfill logs afterwards")
+    args = parser.parse_args()
+
+    print(" Connecting to MySQL...")
+    try:
+        conn = get_db_connection(allow_local_infile=args.load_data)
+    except Exception as e:
+        print(f" Connection failed: {e}")
+        exit()
+
+    cursor = conn.cursor()
+    use_infile = args.load_data and local_infile_enabled(cursor)
+    if args.load_data and not use_infile:
+        print(" LOAD DATA LOCAL INFILE is disabled on the server, using multi-row INSERTs")
+
+    suspend = args.suspend_triggers
+    if suspend and not triggers_can_be_suspended(cursor):
+        print(" log_test_insert does not check @disable_log_triggers (run trigger.sql); triggers stay on")
+        suspend = False
+    if suspend:
+        # Session variable: only this connection skips the audit rows
+        cursor.execute("SET @disable_log_triggers = 1")
+    conn.commit()  # end the read transaction opened by the checks above
+
+    print(f"\n Loading {args.csv} into MySQL ({'LOAD DATA' if use_infile else 'multi-row INSERT'}, "
+          f"{args.chunk_size} rows per transaction)...")
+    start = time.perf_counter()
+    try:
+        rows, first_id, last_id = load_csv(conn, args.csv, args.chunk_size, args.batch_size, use_infile)
+        # New ETags for the API, so clients don't keep their copies of the old data
+        bump_versions(cursor, "patients", "tests")
+        conn.commit()
+
+        if suspend and rows:
+            print("\n Backfilling logs...")
+            logged = backfill_logs(cursor, first_id, last_id)
+            conn.commit()
+            print(f" {logged:,} log rows written")
+    finally:
+        if suspend:
+            cursor.execute("SET @disable_log_triggers = NULL")
+        cursor.close()
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"\n SUCCESS! Loaded {rows:,} rows in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+    if rows:
+        print(f" patient_id range: {first_id} - {last_id}")
+
+
+if __name__ == "__main__":
+    main()
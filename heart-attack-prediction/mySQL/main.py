@@ -1,28 +1,106 @@
 # --- FastAPI + MySQL Connection Setup ---
-from fastapi import FastAPI, HTTPException, Request, Body
+from fastapi import FastAPI, HTTPException, Request, Body, Depends, Query
+from fastapi.responses import StreamingResponse
 import mysql.connector
 from dotenv import load_dotenv
+from datetime import datetime
+from typing import Optional
 import os
+import sys
+import database
+from database import get_db, get_pool, init_pool, close_pool, PoolTimeoutError, table_versions, bump_versions
 load_dotenv()
 
+# The trained model and its loader live in ../predict
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "predict"))
+from model_service import get_model_service
+from predictions import prediction_record, store_predictions, close_prediction_buffer, get_prediction_buffer, as_utc
+from response_cache import get_response_cache, LATEST_ENTRY_KEY
+from conditional import validators, is_fresh, not_modified
+from fast_json import FastJSONResponse, dumps_line
+from compression import CompressionMiddleware
+from metrics import MetricsMiddleware, instrument_connection, register_pool, metrics_response
+from profiling import ProfilingMiddleware, flush_profiles
+from tracing import TracingMiddleware, trace_connection, set_service_name, get_trace, slowest_traces
+
 # Create the FastAPI app
-app = FastAPI(title="Heart Attack API", version="1.0")
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST","localhost"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASS"),
-        database=os.getenv("DB_NAME")
-    )
+# Responses are encoded with orjson (DECIMAL/DATETIME columns included) and compressed
+app = FastAPI(title="Heart Attack API", version="1.0", default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ProfilingMiddleware)  # opt-in: PROFILE_SECRET / PROFILE_SAMPLE_RATE
+app.add_middleware(MetricsMiddleware)  # latency includes compression
+app.add_middleware(TracingMiddleware)  # request spans, trace id returned in X-Trace-Id
+set_service_name("mysql-api")
+
+# Every statement run on a pooled connection is timed (db_call_duration_seconds)
+# and recorded as a span of the request that ran it
+database.connection_wrapper = lambda conn: trace_connection(instrument_connection(conn))
+register_pool("mysql", lambda: database.pool.stats() if database.pool is not None else None)
+
+
+# Open the connection pool once at startup; endpoints borrow from it via get_db
+@app.on_event("startup")
+def open_connection_pool():
+    init_pool()
+
 
-    return connection
+@app.on_event("shutdown")
+def close_connection_pool():
+    close_prediction_buffer()  # Write predictions still waiting in the buffer while the pool is open
+    flush_profiles()
+    close_pool()
 
 
+# Load the prediction model once at startup and keep it warm
+@app.on_event("startup")
+def load_prediction_model():
+    try:
+        get_model_service()
+        print("Prediction model loaded")
+    except Exception as e:
+        print(f"Could not load prediction model: {e}")
+
 # A simple test endpoint 
 @app.get("/")
 def read_root():
     return {"message": "FastAPI is running and connected to MySQL database heart_attack_db!"}
 
+
+# Health check (used by the Docker HEALTHCHECK and Render)
+@app.get("/health")
+def health():
+    try:
+        with get_pool().connection() as conn:
+            conn.ping(reconnect=False)
+        return {"status": "healthy", "database": "connected"}
+    except Exception:
+        return {"status": "unhealthy", "database": "disconnected"}
+
+
+# Connection pool statistics (in use, idle, wait times)
+@app.get("/pool-stats")
+def pool_stats():
+    return get_pool().stats()
+
+
+# Prometheus metrics (request, database, model and cache latencies)
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+# Recent traces kept in memory: slowest requests, and the spans of one trace
+@app.get("/traces", include_in_schema=False)
+def traces(limit: int = 20):
+    return {"traces": slowest_traces(limit)}
+
+
+@app.get("/traces/{trace_id}", include_in_schema=False)
+def trace(trace_id: str):
+    spans = get_trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found (or no longer in memory)")
+    return {"trace_id": trace_id, "spans": spans}
+
 # UPDATE (PUT) endpoint
 @app.put("/patients/{patient_id}")
 def update_patient(
@@ -34,10 +112,10 @@ def update_patient(
     fasting_bs: int,
     max_heart_rate: int,
     exercise_angina: int,
-    target: int
+    target: int,
+    conn=Depends(get_db)
 ):
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         update_query = """
@@ -56,44 +134,53 @@ def update_patient(
             age, gender, resting_bp, cholesterol, fasting_bs,
             max_heart_rate, exercise_angina, target, patient_id
         ))
-        conn.commit()
-
-        if cursor.rowcount == 0:
+        # Read before bump_versions: its upsert on the same cursor overwrites rowcount
+        updated = cursor.rowcount
+        if updated == 0:
+            conn.rollback()
             raise HTTPException(status_code=404, detail=f"No patient found with ID {patient_id}")
+        bump_versions(cursor, "patients")
+        conn.commit()
 
+        get_response_cache().invalidate(patient_key(patient_id), LATEST_ENTRY_KEY)
         return {"message": f"Patient {patient_id} updated successfully"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     finally:
         cursor.close()
-        conn.close()
 
 
 #  Delete (DELETE) endpoint for removing patients
 
 @app.delete("/patients/{patient_id}")
-def delete_patient(patient_id: int):
+def delete_patient(patient_id: int, conn=Depends(get_db)):
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         delete_query = "DELETE FROM Patients WHERE patient_id = %s"
         cursor.execute(delete_query, (patient_id,))
-        conn.commit()
-
-        if cursor.rowcount == 0:
+        deleted = cursor.rowcount  # before bump_versions overwrites it
+        if deleted == 0:
+            conn.rollback()
             raise HTTPException(status_code=404, detail=f"No patient found with ID {patient_id}")
+        # The patient's tests (and their predictions) are deleted by ON DELETE CASCADE
+        bump_versions(cursor, "patients", "tests", "predictions")
+        conn.commit()
 
+        get_response_cache().invalidate(patient_key(patient_id), LATEST_ENTRY_KEY)
         return {"message": f"🗑️ Patient {patient_id} deleted successfully"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     finally:
         cursor.close()
-        conn.close()
 
 # CREATE (POST) endpoint
 @app.post("/patients/")
@@ -105,10 +192,10 @@ def create_patient(
     fasting_bs: int = Body(...),
     max_heart_rate: int = Body(...),
     exercise_angina: int = Body(...),
-    target: int = Body(...)
+    target: int = Body(...),
+    conn=Depends(get_db)
 ):
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         insert_query = """
@@ -123,9 +210,10 @@ def create_patient(
             age, gender, resting_bp, cholesterol, fasting_bs,
             max_heart_rate, exercise_angina, target
         ))
-        conn.commit()
-
+        # Read before bump_versions: its upsert on the same cursor overwrites lastrowid
         new_id = cursor.lastrowid
+        bump_versions(cursor, "patients")
+        conn.commit()
 
         return {
             "message": "Patient record created successfully",
@@ -137,76 +225,185 @@ def create_patient(
 
     finally:
         cursor.close()
-        conn.close()
 
 
-@app.get("/patients/{patient_id}")
-def read_patient(patient_id: int):
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+def patient_key(patient_id):
+    """Response cache key of GET /patients/{patient_id}"""
+    return f"patient:{patient_id}"
 
-        query = """
-            SELECT p.*, t.*
-            FROM patients p
-            LEFT JOIN tests t ON p.patient_id = t.patient_id
-            WHERE p.patient_id = %s
-        """
-        cursor.execute(query, (patient_id,))
-        result = cursor.fetchone()
+
+# Tables a patient (with its tests) or an entry is read from
+PATIENT_TABLES = ("patients", "tests")
+
+
+@app.get("/patients/{patient_id}")
+def read_patient(patient_id: int, request: Request):
+    headers = validators(table_versions(*PATIENT_TABLES))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+
+    # Most reads hit a small set of hot patients: only a cache miss borrows a connection
+    def load():
+        with get_pool().connection() as conn:
+            # Buffered: the row set is read in full, so close() never finds unread rows
+            cursor = conn.cursor(dictionary=True, buffered=True)
+            try:
+                # One row per test: keep the patient with their latest test
+                query = """
+                    SELECT p.*, t.*
+                    FROM patients p
+                    LEFT JOIN tests t ON p.patient_id = t.patient_id
+                    WHERE p.patient_id = %s
+                    ORDER BY t.recorded_date DESC, t.test_id DESC
+                    LIMIT 1
+                """
+                cursor.execute(query, (patient_id,))
+                result = cursor.fetchone()
+            finally:
+                cursor.close()
 
         if not result:
             raise HTTPException(status_code=404, detail=f"Patient ID {patient_id} not found")
-
         return result
 
+    try:
+        return FastJSONResponse(get_response_cache().get_or_load(patient_key(patient_id), load, version=headers.get("ETag")), headers=headers)
+    except HTTPException:
+        raise
+    except PoolTimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    finally:
-        cursor.close()
-        conn.close()
+# Columns returned by GET /patients (tests are nested under each patient)
+PATIENT_COLUMNS = ["patient_id", "age", "gender", "result", "created_at"]
+TEST_COLUMNS = ["test_id", "heart_rate", "systolic_bp", "diastolic_bp",
+                "blood_sugar", "ck_mb", "troponin", "recorded_date"]
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
-@app.get("/patients")
-def get_all_patients():
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
 
-        # Retrieve all patients, optionally joined with test info
-        query = """
-            SELECT 
-                p.patient_id, p.age, p.gender, p.resting_bp, p.cholesterol,
-                p.fasting_bs, p.max_heart_rate, p.exercise_angina, p.target,
-                p.created_at,
-                t.test_id, t.ecg_result, t.st_depression, t.slope,
-                t.num_major_vessels, t.thalassemia, t.recorded_date
-            FROM patients p
-            LEFT JOIN tests t ON p.patient_id = t.patient_id
-            ORDER BY p.patient_id ASC
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
+def stream_patients(after_id, limit):
+    """
+    Yield every patient (after after_id) as one NDJSON line with its tests nested.
+    Uses an unbuffered cursor so rows are read from the server as they are sent:
+    memory stays flat no matter how big the table is.
+    """
+    patient_cols = ", ".join(f"p.{c}" for c in PATIENT_COLUMNS)
+    test_cols = ", ".join(f"t.{c}" for c in TEST_COLUMNS)
+    limit_sql = "LIMIT %s" if limit else ""
+    params = (after_id, limit) if limit else (after_id,)
+    query = f"""
+        SELECT {patient_cols}, {test_cols}
+        FROM (
+            SELECT * FROM patients
+            WHERE patient_id > %s
+            ORDER BY patient_id
+            {limit_sql}
+        ) p
+        LEFT JOIN tests t ON p.patient_id = t.patient_id
+        ORDER BY p.patient_id, t.test_id
+    """
 
-        if not results:
-            return {"message": "No patients found in the database."}
+    # The connection is borrowed here, not through get_db: dependencies are
+    # released before a streaming response starts sending
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(query, params)
+            n_patient = len(PATIENT_COLUMNS)
+            current = None
+            for row in cursor:
+                if current is None or current["patient_id"] != row[0]:
+                    if current is not None:
+                        yield dumps_line(current)
+                    current = dict(zip(PATIENT_COLUMNS, row[:n_patient]))
+                    current["tests"] = []
+                if row[n_patient] is not None:
+                    current["tests"].append(dict(zip(TEST_COLUMNS, row[n_patient:])))
+            if current is not None:
+                yield dumps_line(current)
+        finally:
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                # Client went away mid-stream; the pool discards the connection
+                pass
 
-        return {"total_patients": len(results), "data": results}
 
+@app.get("/patients")
+def get_all_patients(
+    request: Request,
+    after_id: int = Query(0, ge=0, description="Return patients with patient_id greater than this"),
+    limit: Optional[int] = Query(None, ge=1, description=f"Page size (default {DEFAULT_PAGE_SIZE}, max {MAX_PAGE_SIZE}; no limit when streaming)"),
+    stream: bool = Query(False, description="Stream every patient as NDJSON instead of one page")
+):
+    """
+    Patients with their tests nested, ordered by patient_id.
+    - Pages use keyset pagination: pass next_after_id back as after_id.
+    - stream=true returns NDJSON (one patient per line) read with an unbuffered cursor.
+    """
+    headers = validators(table_versions(*PATIENT_TABLES))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+    if stream:
+        return StreamingResponse(stream_patients(after_id, limit), media_type="application/x-ndjson", headers=headers)
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    if limit > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=422, detail=f"limit must be <= {MAX_PAGE_SIZE} (use stream=true for everything)")
+
+    try:
+        with get_pool().connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                # Keyset pagination on the primary key: no OFFSET scan
+                cursor.execute(f"""
+                    SELECT {", ".join(PATIENT_COLUMNS)}
+                    FROM patients
+                    WHERE patient_id > %s
+                    ORDER BY patient_id
+                    LIMIT %s
+                """, (after_id, limit))
+                patients = cursor.fetchall()
+
+                tests_by_patient = {p["patient_id"]: [] for p in patients}
+                if patients:
+                    placeholders = ", ".join(["%s"] * len(patients))
+                    cursor.execute(f"""
+                        SELECT patient_id, {", ".join(TEST_COLUMNS)}
+                        FROM tests
+                        WHERE patient_id IN ({placeholders})
+                        ORDER BY patient_id, test_id
+                    """, tuple(tests_by_patient))
+                    for test in cursor.fetchall():
+                        tests_by_patient[test.pop("patient_id")].append(test)
+            finally:
+                cursor.close()
+
+        for patient in patients:
+            patient["tests"] = tests_by_patient[patient["patient_id"]]
+
+        return FastJSONResponse({
+            "count": len(patients),
+            "data": patients,
+            "next_after_id": patients[-1]["patient_id"] if len(patients) == limit else None
+        }, headers=headers)
+
+    except PoolTimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except mysql.connector.Error as db_err:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(db_err)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    finally:
-        cursor.close()
-        conn.close()
-
 # UPDATE (PUT) endpoint
 @app.put("/tests/{test_id}")
 def update_test(test_id: int,
                 heart_rate: int, systolic_bp: int, diastolic_bp: int,
-                blood_sugar: int, ck_mb: float, troponin: float):
+                blood_sugar: int, ck_mb: float, troponin: float,
+                conn=Depends(get_db)):
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         update_query = """
@@ -220,82 +417,366 @@ def update_test(test_id: int,
             WHERE test_id = %s
         """
         cursor.execute(update_query, (heart_rate, systolic_bp, diastolic_bp, blood_sugar, ck_mb, troponin, test_id))
-        conn.commit()
-
-        if cursor.rowcount == 0:
+        updated = cursor.rowcount  # before bump_versions overwrites it
+        if updated == 0:
+            conn.rollback()
             raise HTTPException(status_code=404, detail=f"⚠️ No test found with ID {test_id}")
+        bump_versions(cursor, "tests")
+        conn.commit()
 
+        # GET /patients/{patient_id} includes the patient's test
+        cursor.execute("SELECT patient_id FROM tests WHERE test_id = %s", (test_id,))
+        row = cursor.fetchone()
+        get_response_cache().invalidate(LATEST_ENTRY_KEY, patient_key(row[0]) if row else None)
         return {"message": f"Test {test_id} updated successfully"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()
+
+
+# Columns shared by the latest-entry and batch prediction queries
+ENTRY_COLUMNS = """
+    p.patient_id, p.age, p.gender, p.result,
+    t.test_id, t.heart_rate, t.systolic_bp, t.diastolic_bp,
+    t.blood_sugar, t.ck_mb, t.troponin, t.recorded_date
+"""
+
+
+def format_entry(result):
+    """Format a patients+tests row to match the MongoDB structure for predict.py compatibility"""
+    return {
+        "patient": {
+            "patient_id": result["patient_id"],
+            "age": result["age"],
+            "gender": result["gender"]
+        },
+        "medical_record": {
+            "heart_rate": result["heart_rate"],
+            "systolic_blood_pressure": result["systolic_bp"],
+            "diastolic_blood_pressure": result["diastolic_bp"],
+            "blood_sugar": result["blood_sugar"]
+        },
+        "heart_attack_test": {
+            "test_id": result["test_id"],
+            "ck_mb": float(result["ck_mb"]),
+            "troponin": float(result["troponin"]),
+            "result": result["result"] if result["result"] else "unknown"
+        }
+    }
+
+
+def load_latest_entry(version=None):
+    """
+    The latest test with its patient, from the response cache or the database.
+    Shared by /api/latest-entry and /api/predict.
+    version is the ETag of the patient tables (read now when not given);
+    a cached entry loaded under another ETag is not reused.
+    """
+    if version is None:
+        version = validators(table_versions(*PATIENT_TABLES)).get("ETag")
+
+    def load():
+        with get_pool().connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                # Get the latest test with its corresponding patient data
+                query = f"""
+                    SELECT {ENTRY_COLUMNS}
+                    FROM tests t
+                    JOIN patients p ON t.patient_id = p.patient_id
+                    ORDER BY t.recorded_date DESC, t.test_id DESC
+                    LIMIT 1
+                """
+                cursor.execute(query)
+                result = cursor.fetchone()
+            finally:
+                cursor.close()
+
+        if not result:
+            raise HTTPException(status_code=404, detail="No test records found in database")
+        return format_entry(result)
+
+    try:
+        # Served from the response cache until a write invalidates it (or the TTL expires)
+        return get_response_cache().get_or_load(LATEST_ENTRY_KEY, load, version=version)
+    except HTTPException:
+        raise
+    except PoolTimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except mysql.connector.Error as db_err:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(db_err)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 # GET LATEST ENTRY endpoint for predict.py
 @app.get("/api/latest-entry")
-def get_latest_entry():
+def get_latest_entry(request: Request):
     """
     Fetch the latest test record with patient info for prediction.
     This endpoint combines data from patients and tests tables.
+    Send the ETag back in If-None-Match to get a 304 while nothing changed.
+    """
+    headers = validators(table_versions(*PATIENT_TABLES))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+    return FastJSONResponse(load_latest_entry(headers.get("ETag")), headers=headers)
+
+
+MAX_ENTRIES_PAGE = 5000
+
+
+# GET ENTRIES endpoint for predict.py --watch
+@app.get("/api/entries")
+def get_entries_after(
+    request: Request,
+    after_test_id: int = Query(0, ge=0, description="test_id of the last entry already seen"),
+    limit: int = Query(500, ge=1, le=MAX_ENTRIES_PAGE),
+    conn=Depends(get_db),
+):
     """
-    conn = None
+    Entries (same shape as /api/latest-entry) for tests with test_id greater
+    than after_test_id, oldest first. Pass the last test_id of a page to get the next one.
+    """
+    headers = validators(table_versions(*PATIENT_TABLES, conn=conn))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+
     cursor = None
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
-
-        # Get the latest test with its corresponding patient data
-        query = """
-            SELECT 
-                p.patient_id, p.age, p.gender, p.result,
-                t.test_id, t.heart_rate, t.systolic_bp, t.diastolic_bp,
-                t.blood_sugar, t.ck_mb, t.troponin, t.recorded_date
+        cursor.execute(f"""
+            SELECT {ENTRY_COLUMNS}
             FROM tests t
             JOIN patients p ON t.patient_id = p.patient_id
-            ORDER BY t.recorded_date DESC, t.test_id DESC
-            LIMIT 1
-        """
-        cursor.execute(query)
-        result = cursor.fetchone()
+            WHERE t.test_id > %s
+            ORDER BY t.test_id
+            LIMIT %s
+        """, (after_test_id, limit))
+        entries = [format_entry(row) for row in cursor.fetchall()]
+        return FastJSONResponse({"count": len(entries), "entries": entries}, headers=headers)
 
-        if not result:
-            raise HTTPException(status_code=404, detail="No test records found in database")
+    except mysql.connector.Error as db_err:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(db_err)}")
+    finally:
+        if cursor:
+            cursor.close()
 
-        # Format response to match MongoDB structure for predict.py compatibility
-        response = {
-            "patient": {
-                "patient_id": result["patient_id"],
-                "age": result["age"],
-                "gender": result["gender"]
-            },
-            "medical_record": {
-                "heart_rate": result["heart_rate"],
-                "systolic_blood_pressure": result["systolic_bp"],
-                "diastolic_blood_pressure": result["diastolic_bp"],
-                "blood_sugar": result["blood_sugar"]
-            },
-            "heart_attack_test": {
-                "test_id": result["test_id"],
-                "ck_mb": float(result["ck_mb"]),
-                "troponin": float(result["troponin"]),
-                "result": result["result"] if result["result"] else "unknown"
-            }
-        }
 
-        return response
+# PREDICT endpoints - score with the in-memory model
+@app.get("/api/predict")
+def predict_latest():
+    """
+    Score the latest test with the in-memory model.
+    Same data as /api/latest-entry plus prediction, probabilities and risk level.
+    """
+    data = load_latest_entry()
+    result = predict_entry(data)
+
+    # Stored tests get their score persisted (payloads posted to /api/predict don't)
+    store_predictions([prediction_record(
+        data["heart_attack_test"]["test_id"], result["patient_id"], get_model_service().version, result
+    )])
+    return result
+
+
+@app.post("/api/predict")
+def predict_entry(payload: dict = Body(...)):
+    """
+    Score a payload shaped like /api/latest-entry
+    (keys: patient, medical_record, heart_attack_test).
+    """
+    try:
+        service = get_model_service()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model not available: {e}")
 
+    try:
+        return service.predict_entry(payload)
+    except (KeyError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"Missing or invalid field: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Upper bound on rows scored by one /api/predict/batch call
+MAX_BATCH_SIZE = 50000
+# IDs per IN (...) query when fetching a batch
+ID_CHUNK_SIZE = 1000
+
+
+def fetch_entries(test_ids=None, patient_ids=None):
+    """
+    Fetch latest-entry style payloads for many tests (or patients) with
+    chunked IN (...) queries. With patient_ids, each patient's latest test is used.
+    """
+    ids = test_ids if test_ids is not None else patient_ids
+    column = "t.test_id" if test_ids is not None else "t.patient_id"
+
+    rows = []
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            for start in range(0, len(ids), ID_CHUNK_SIZE):
+                chunk = ids[start:start + ID_CHUNK_SIZE]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(f"""
+                    SELECT {ENTRY_COLUMNS}
+                    FROM tests t
+                    JOIN patients p ON t.patient_id = p.patient_id
+                    WHERE {column} IN ({placeholders})
+                    ORDER BY t.patient_id, t.recorded_date DESC, t.test_id DESC
+                """, tuple(chunk))
+                rows.extend(cursor.fetchall())
+        finally:
+            cursor.close()
+
+    if patient_ids is not None:
+        # Rows are ordered newest first within each patient; keep the first one
+        latest = {}
+        for row in rows:
+            latest.setdefault(row["patient_id"], row)
+        rows = list(latest.values())
+
+    return [format_entry(row) for row in rows]
+
+
+# BATCH PREDICT endpoint - many rows, one model pass
+@app.post("/api/predict/batch")
+def predict_batch(payload: dict = Body(...)):
+    """
+    Score many entries with a single model pass.
+    Body takes one of:
+    - test_ids: list of tests.test_id
+    - patient_ids: list of patients.patient_id (latest test of each patient is scored)
+    - rows: list of feature dicts or payloads shaped like /api/latest-entry
+    """
+    test_ids = payload.get("test_ids")
+    patient_ids = payload.get("patient_ids")
+    rows = payload.get("rows")
+
+    requested = [x for x in (test_ids, patient_ids, rows) if x is not None]
+    if len(requested) != 1 or not isinstance(requested[0], list):
+        raise HTTPException(status_code=422, detail="Provide exactly one list: test_ids, patient_ids or rows")
+    if len(requested[0]) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_SIZE} rows)")
+
+    try:
+        service = get_model_service()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model not available: {e}")
+
+    try:
+        missing = []
+        keys = []
+        if rows is None:
+            rows = fetch_entries(test_ids=test_ids, patient_ids=patient_ids)
+            keys = [
+                {"test_id": r["heart_attack_test"]["test_id"], "patient_id": r["patient"]["patient_id"]}
+                for r in rows
+            ]
+            id_field = "test_id" if test_ids is not None else "patient_id"
+            scored = {k[id_field] for k in keys}
+            missing = [i for i in requested[0] if i not in scored]
+
+        results = service.predict_batch(rows)
+        for key, result in zip(keys, results):
+            result.update(key)
+        if keys:
+            store_predictions([
+                prediction_record(key["test_id"], key["patient_id"], service.version, result)
+                for key, result in zip(keys, results)
+            ])
+
+        return {"count": len(results), "predictions": results, "missing": missing}
+
+    except PoolTimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except mysql.connector.Error as db_err:
         raise HTTPException(status_code=500, detail=f"Database error: {str(db_err)}")
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Missing or invalid field: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# Prediction cache counters
+@app.get("/api/predict/cache")
+def prediction_cache_stats():
+    """Prediction cache hit/miss counters and the model version in use."""
+    try:
+        return get_model_service().cache_stats()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Model not available: {e}")
+
+
+MAX_PREDICTIONS_PAGE = 1000
+
+
+# STORED PREDICTIONS - precomputed risk scores
+@app.get("/api/predictions")
+def get_predictions(
+    request: Request,
+    patient_id: Optional[int] = Query(None, description="Only this patient's predictions"),
+    test_id: Optional[int] = Query(None, description="Only predictions of this test"),
+    since: Optional[datetime] = Query(None, description="Only predictions made at or after this time (UTC unless it has an offset)"),
+    model_version: Optional[str] = Query(None, description="Only predictions of this model version"),
+    limit: int = Query(100, ge=1, le=MAX_PREDICTIONS_PAGE),
+    conn=Depends(get_db),
+):
+    """
+    Stored risk scores, newest first.
+    Filled by /api/predict, /api/predict/batch (stored tests only) and predict/backfill.py.
+    """
+    filters = []
+    params = []
+    for column, value in (("patient_id", patient_id), ("test_id", test_id), ("model_version", model_version)):
+        if value is not None:
+            filters.append(f"{column} = %s")
+            params.append(value)
+    if since is not None:
+        filters.append("predicted_at >= %s")
+        params.append(as_utc(since))
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+    headers = validators(table_versions("predictions", conn=conn))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+
+    cursor = None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT test_id, patient_id, model_version, prediction, probability, risk_level, predicted_at
+            FROM predictions
+            {where}
+            ORDER BY predicted_at DESC
+            LIMIT %s
+        """, (*params, limit))
+        predictions = cursor.fetchall()
+        return FastJSONResponse({"count": len(predictions), "predictions": predictions}, headers=headers)
+
+    except mysql.connector.Error as db_err:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(db_err)}")
     finally:
         if cursor:
             cursor.close()
-        if conn:
-            conn.close()
+
+
+@app.get("/api/response-cache")
+def response_cache_stats():
+    """Response cache hit/miss counters, overall and per key namespace."""
+    return get_response_cache().stats()
+
+
+@app.get("/api/predictions/buffer")
+def prediction_buffer_stats():
+    """Write buffer counters (pending, written, dropped)."""
+    return get_prediction_buffer().stats()
 
 
 if __name__ == "__main__":
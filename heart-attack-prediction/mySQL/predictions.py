@@ -0,0 +1,97 @@
+# Stored predictions (predictions table, see create_table_predictions.sql)
+
+"""
+Buffered writes to the predictions table.
+The API queues scored tests here; a background thread writes them with one
+multi-row upsert per batch on a pooled connection.
+"""
+
+import threading
+from datetime import datetime, timezone
+from database import get_pool, bump_versions
+from prediction_buffer import PredictionBuffer
+
+PREDICTION_COLUMNS = ["test_id", "patient_id", "model_version", "prediction",
+                      "probability", "risk_level", "predicted_at"]
+
+PREDICTION_UPSERT = f"""
+    INSERT INTO predictions ({", ".join(PREDICTION_COLUMNS)})
+    VALUES ({", ".join(["%s"] * len(PREDICTION_COLUMNS))})
+    ON DUPLICATE KEY UPDATE
+        prediction = VALUES(prediction),
+        probability = VALUES(probability),
+        risk_level = VALUES(risk_level),
+        predicted_at = VALUES(predicted_at)
+"""
+
+
+def prediction_time():
+    """Timestamp stored in predicted_at: UTC without a time zone (the driver sends naive datetimes as is)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def as_utc(value):
+    """A query datetime as naive UTC, like predicted_at; one without a time zone is taken as UTC already"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def prediction_record(test_id, patient_id, model_version, result, source="api"):
+    """Stored form of one scored test (result as returned by ModelService)"""
+    return {
+        "test_id": test_id,
+        "patient_id": patient_id,
+        "model_version": model_version,
+        "prediction": result["prediction"],
+        "probability": result["probabilities"]["positive"],
+        "risk_level": result["risk_level"],
+        "predicted_at": prediction_time(),
+        "source": source,
+    }
+
+
+def save_predictions(records, conn=None):
+    """Upsert prediction records by (test_id, model_version) in one transaction"""
+    if not records:
+        return
+    if conn is None:
+        with get_pool().connection() as pooled:
+            return save_predictions(records, pooled)
+
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(PREDICTION_UPSERT, [tuple(r[c] for c in PREDICTION_COLUMNS) for r in records])
+        bump_versions(cursor, "predictions")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# Process-wide write buffer, started on first use
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_prediction_buffer():
+    """Returns the buffer that batches prediction writes for this process"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = PredictionBuffer(save_predictions)
+    return _buffer
+
+
+def close_prediction_buffer():
+    """Write pending predictions (called at app shutdown, before the pool closes)"""
+    if _buffer is not None:
+        _buffer.close()
+
+
+def store_predictions(records):
+    """Queue prediction records; they are written in batches in the background"""
+    get_prediction_buffer().add(records)
@@ -0,0 +1,143 @@
+# Tests for the connection pool in database.py (no MySQL server needed)
+
+import threading
+import time
+import pytest
+from database import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    """The part of a mysql.connector connection the pool uses"""
+
+    def __init__(self):
+        self.closed = False
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.alive = True
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise OSError("server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**options):
+    opened = []
+
+    def connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    options = {"size": 2, "max_overflow": 1, "max_lifetime": 0, "pre_ping": False, "timeout": 0.1, **options}
+    return ConnectionPool(connect=connect, **options), opened
+
+
+def test_idle_connections_are_reused():
+    pool, opened = make_pool()
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    stats = pool.stats()
+    assert (stats["connections_opened"], stats["checkouts"], stats["idle"], stats["in_use"]) == (1, 2, 1, 0)
+
+
+def test_overflow_connections_are_closed_on_release():
+    pool, opened = make_pool(size=1, max_overflow=1)
+    first = pool.acquire()
+    overflow = pool.acquire()
+    assert pool.stats()["total"] == 2
+
+    pool.release(first)
+    pool.release(overflow)
+    # Only `size` connections stay idle, the overflow one is closed
+    assert overflow.closed and not first.closed
+    assert pool.stats()["idle"] == 1
+    assert pool.stats()["connections_discarded"] == 1
+
+
+def test_exhausted_pool_times_out():
+    pool, _ = make_pool(size=1, max_overflow=1, timeout=0.05)
+    held = [pool.acquire(), pool.acquire()]
+    start = time.monotonic()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert time.monotonic() - start >= 0.05
+    assert pool.stats()["timeouts"] == 1
+    for conn in held:
+        pool.release(conn)
+
+
+def test_waiter_gets_the_connection_released_by_another_thread():
+    pool, opened = make_pool(size=1, max_overflow=0, timeout=2)
+    held = pool.acquire()
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    pool.release(held)
+    waiter.join(2)
+
+    assert result == [held]
+    assert len(opened) == 1
+    stats = pool.stats()
+    assert stats["waits"] == 1 and stats["timeouts"] == 0
+    assert stats["max_wait_ms"] >= 40
+
+
+def test_open_transaction_is_rolled_back_on_release():
+    pool, _ = make_pool()
+    conn = pool.acquire()
+    conn.in_transaction = True
+    pool.release(conn)
+    assert conn.rollbacks == 1
+    assert pool.acquire() is conn
+
+
+def test_dead_and_expired_connections_are_replaced():
+    pool, opened = make_pool(pre_ping=True)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.alive = False
+    replacement = pool.acquire()
+    assert replacement is not conn and conn.closed
+    pool.release(replacement)
+
+    pool.max_lifetime = 0.01
+    time.sleep(0.02)
+    assert pool.acquire() is not replacement
+    assert len(opened) == 3
+
+
+def test_failed_connect_frees_its_slot():
+    calls = []
+
+    def connect():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("connection refused")
+        return FakeConnection()
+
+    pool = ConnectionPool(size=1, max_overflow=0, max_lifetime=0, pre_ping=False, timeout=0.05, connect=connect)
+    with pytest.raises(OSError):
+        pool.acquire()
+    assert pool.stats()["total"] == 0
+    assert isinstance(pool.acquire(), FakeConnection)
+
+
+def test_closed_pool_refuses_new_checkouts():
+    pool, _ = make_pool()
+    held = pool.acquire()
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+    # Connections still in use are closed when they come back
+    pool.release(held)
+    assert held.closed
@@ -1,29 +1,43 @@
 USE heart_attack_db;
 
+-- Bulk loaders can skip the per-row audit inserts for their own session with
+--   SET @disable_log_triggers = 1;
+-- and write the logs rows in one statement afterwards (see load_data.py)
+
+DROP TRIGGER IF EXISTS log_test_insert;
+DROP TRIGGER IF EXISTS log_test_update;
+DROP TRIGGER IF EXISTS log_test_delete;
+
 DELIMITER //
 
 CREATE TRIGGER log_test_insert
 AFTER INSERT ON tests
 FOR EACH ROW
 BEGIN
-  INSERT INTO logs (patient_id, operation)
-  VALUES (NEW.patient_id, 'INSERT on tests');
+  IF @disable_log_triggers IS NULL OR @disable_log_triggers = 0 THEN
+    INSERT INTO logs (patient_id, operation)
+    VALUES (NEW.patient_id, 'INSERT on tests');
+  END IF;
 END //
 
 CREATE TRIGGER log_test_update
 AFTER UPDATE ON tests
 FOR EACH ROW
 BEGIN
-  INSERT INTO logs (patient_id, operation)
-  VALUES (NEW.patient_id, 'UPDATE on tests');
+  IF @disable_log_triggers IS NULL OR @disable_log_triggers = 0 THEN
+    INSERT INTO logs (patient_id, operation)
+    VALUES (NEW.patient_id, 'UPDATE on tests');
+  END IF;
 END //
 
 CREATE TRIGGER log_test_delete
 AFTER DELETE ON tests
 FOR EACH ROW
 BEGIN
-  INSERT INTO logs (patient_id, operation)
-  VALUES (OLD.patient_id, 'DELETE on tests');
+  IF @disable_log_triggers IS NULL OR @disable_log_triggers = 0 THEN
+    INSERT INTO logs (patient_id, operation)
+    VALUES (OLD.patient_id, 'DELETE on tests');
+  END IF;
 END //
 
 DELIMITER ;
@@ -0,0 +1,299 @@
+"""
+Backfill scorer for heart attack risk
+Re-scores every historical test with the current model and writes the
+results to the predictions collection (MongoDB) or table (MySQL)
+
+The tests are split into key ranges that are scored by a pool of worker
+processes; each worker loads the model once and writes its chunk back with
+one bulk write. Finished chunks are saved to a checkpoint file, so an
+interrupted run continues where it stopped.
+
+Run: python backfill.py --source mongodb [--workers 4] [--chunk-size 50000]
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from model_service import ModelService, build_feature_matrix, risk_level, file_version, MODEL_PATH
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+APP_DIRS = {"mongodb": "mongodb", "mysql": "mySQL"}
+
+# Columns read from MySQL, in the order of the feature dictionary
+MYSQL_FEATURE_COLUMNS = {
+    'Age': "p.age",
+    'Gender': "p.gender",
+    'Heart rate': "t.heart_rate",
+    'Systolic blood pressure': "t.systolic_bp",
+    'Diastolic blood pressure': "t.diastolic_bp",
+    'Blood sugar': "t.blood_sugar",
+    'CK-MB': "t.ck_mb",
+    'Troponin': "t.troponin",
+}
+
+
+def import_app_module(source, name):
+    """A module (database, predictions) of the mongodb/ or mySQL/ app"""
+    app_dir = os.path.join(PROJECT_DIR, APP_DIRS[source])
+    if app_dir not in sys.path:
+        sys.path.insert(0, app_dir)
+    return importlib.import_module(name)
+
+
+class MongoSource:
+    """heart_attack_tests joined with medical_records and patients"""
+
+    def __init__(self):
+        from bson.objectid import ObjectId
+        self.database = import_app_module("mongodb", "database")
+        self.predictions = import_app_module("mongodb", "predictions")
+        self.db = self.database.get_database()
+        if self.db is None:
+            raise RuntimeError("MongoDB connection not available")
+        self._object_id = ObjectId
+
+    def prepare(self):
+        """Indexes used by the joins and the prediction upserts"""
+        self.database.ensure_indexes(self.db)
+
+    def plan(self, chunk_size):
+        """Split the tests into (after _id, up to _id] ranges of chunk_size documents
+
+        Each bound is found server-side by skipping chunk_size - 1 keys of the
+        _id index after the previous bound, so only one _id per chunk is sent
+        to the client. The index is walked once in total.
+        """
+        tests = self.db["heart_attack_tests"]
+        bounds = []
+        after = None
+        while True:
+            query = {} if after is None else {"_id": {"$gt": after}}
+            bound = next(tests.find(query, {"_id": 1}).sort("_id", 1).skip(chunk_size - 1).limit(1), None)
+            if bound is None:
+                # Last, partial chunk: up to the highest _id
+                tail = next(tests.find(query, {"_id": 1}).sort("_id", -1).limit(1), None)
+                if tail is not None:
+                    bounds.append(tail["_id"])
+                break
+            after = bound["_id"]
+            bounds.append(after)
+        bounds = [str(bound) for bound in bounds]
+        return [[bounds[i - 1] if i else None, bounds[i]] for i in range(len(bounds))]
+
+    def fetch(self, low, high, feature_names):
+        """Return (test_ids, patient_ids, feature matrix) for one range"""
+        # Imported here so the worker resolves it after the app directory is on sys.path
+        from get_endpoints import entry_pipeline, to_entry
+
+        id_range = {"$lte": self._object_id(high)}
+        if low is not None:
+            id_range["$gt"] = self._object_id(low)
+        pipeline = entry_pipeline({"$match": {"_id": id_range}})
+
+        entries = []
+        for test in self.db["heart_attack_tests"].aggregate(pipeline, batchSize=10000):
+            entry = to_entry(test)
+            # Tests without a linked record or patient can't be scored
+            if entry["patient"] and entry["medical_record"]:
+                entries.append(entry)
+
+        test_ids = [entry["heart_attack_test"]["test_id"] for entry in entries]
+        patient_ids = [entry["patient"]["patient_id"] for entry in entries]
+        return test_ids, patient_ids, build_feature_matrix(entries, feature_names)
+
+    def write(self, predictions):
+        """Upsert by (test_id, model_version) so re-running a chunk is harmless"""
+        self.predictions.save_predictions(predictions, self.db)
+
+    def close(self):
+        self.database.close_connection()
+
+
+class MySQLSource:
+    """tests joined with patients"""
+
+    def __init__(self):
+        self.database = import_app_module("mysql", "database")
+        self.predictions = import_app_module("mysql", "predictions")
+        self.conn = self.database.get_db_connection()
+
+    def prepare(self):
+        """The predictions table comes from mySQL/create_table_predictions.sql"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT 1 FROM predictions LIMIT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+            self.conn.commit()
+
+    def plan(self, chunk_size):
+        """Split the tests into (after test_id, up to test_id] ranges"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT MIN(test_id), MAX(test_id) FROM tests")
+            first, last = cursor.fetchone()
+        finally:
+            cursor.close()
+            self.conn.commit()
+        if first is None:
+            return []
+        return [[low, min(low + chunk_size, last)] for low in range(first - 1, last, chunk_size)]
+
+    def fetch(self, low, high, feature_names):
+        """Return (test_ids, patient_ids, feature matrix) for one range"""
+        columns = ", ".join(f"{MYSQL_FEATURE_COLUMNS[name]} AS `{name}`" for name in feature_names)
+        cursor = self.conn.cursor(dictionary=True)
+        try:
+            cursor.execute(f"""
+                SELECT t.test_id, t.patient_id, {columns}
+                FROM tests t
+                JOIN patients p ON t.patient_id = p.patient_id
+                WHERE t.test_id > %s AND t.test_id <= %s
+            """, (low, high))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            self.conn.commit()
+
+        test_ids = [row["test_id"] for row in rows]
+        patient_ids = [row["patient_id"] for row in rows]
+        return test_ids, patient_ids, build_feature_matrix(rows, feature_names)
+
+    def write(self, predictions):
+        """Multi-row upsert by (test_id, model_version) in one transaction"""
+        self.predictions.save_predictions(predictions, self.conn)
+
+    def close(self):
+        self.conn.close()
+
+
+SOURCES = {"mongodb": MongoSource, "mysql": MySQLSource}
+
+
+# Per-process state, set up once by init_worker
+_source = None
+_service = None
+
+
+def init_worker(source_name):
+    """Open a database connection and load the model once per worker process"""
+    global _source, _service
+    _source = SOURCES[source_name]()
+    _service = ModelService(backend="sklearn").load()
+    # One core per worker: the pool already uses every core
+    _service.model.n_jobs = 1
+
+
+def score_chunk(index, low, high):
+    """Score one key range and write it back; returns (index, rows, seconds)"""
+    start = time.perf_counter()
+    test_ids, patient_ids, X = _source.fetch(low, high, _service.feature_names)
+    if len(X):
+        labels, probabilities = _service.predict_proba_matrix(X)
+        # Same UTC timestamp as the API path, so backfilled and live predictions compare
+        predicted_at = _source.predictions.prediction_time()
+        _source.write([
+            {
+                "test_id": test_id,
+                "patient_id": patient_id,
+                "model_version": _service.version,
+                "prediction": int(label),
+                "probability": float(proba[1]),
+                "risk_level": risk_level(proba[1]),
+                "predicted_at": predicted_at,
+                "source": "backfill",
+            }
+            for test_id, patient_id, label, proba in zip(test_ids, patient_ids, labels, probabilities)
+        ])
+    return index, len(X), time.perf_counter() - start
+
+
+def load_checkpoint(path, source_name, model_version):
+    """Saved plan and finished chunks, or None if there is nothing to resume"""
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if checkpoint.get("source") != source_name or checkpoint.get("model_version") != model_version:
+        print(" Checkpoint is for another source or model version, starting over")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    """Write + rename so a crash never leaves half a checkpoint"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score every historical test with the current model")
+    parser.add_argument("--source", choices=sorted(SOURCES), required=True, help="database to read and write")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="tests per chunk")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint file (default: backfill_<source>.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or f"backfill_{args.source}.json"
+    model_version = file_version(MODEL_PATH)
+    print("HEART ATTACK PREDICTION BACKFILL")
+    print(f" Source: {args.source}, model version: {model_version}")
+
+    source = SOURCES[args.source]()
+    try:
+        source.prepare()
+        checkpoint = None if args.restart else load_checkpoint(checkpoint_path, args.source, model_version)
+        if checkpoint is None:
+            print(" Planning chunks...")
+            checkpoint = {
+                "source": args.source,
+                "model_version": model_version,
+                "chunks": source.plan(args.chunk_size),
+                "done": [],
+                "rows": 0,
+            }
+            save_checkpoint(checkpoint_path, checkpoint)
+    finally:
+        source.close()
+
+    done = set(checkpoint["done"])
+    todo = [(i, low, high) for i, (low, high) in enumerate(checkpoint["chunks"]) if i not in done]
+    print(f" Chunks: {len(checkpoint['chunks'])} total, {len(done)} already done, {len(todo)} to score")
+    if not todo:
+        print("BACKFILL COMPLETE")
+        return
+
+    rows = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.source,)) as executor:
+        futures = [executor.submit(score_chunk, *chunk) for chunk in todo]
+        for future in as_completed(futures):
+            index, chunk_rows, seconds = future.result()
+            rows += chunk_rows
+
+            # Only finished chunks are recorded, so a crash re-scores at most the chunks in flight
+            checkpoint["done"].append(index)
+            checkpoint["rows"] += chunk_rows
+            save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.perf_counter() - start
+            print(f" Chunk {index}: {chunk_rows:,} rows in {seconds:.2f}s"
+                  f" | {len(checkpoint['done'])}/{len(checkpoint['chunks'])} chunks,"
+                  f" {rows:,} rows, {rows / elapsed:,.0f} rows/sec")
+
+    elapsed = time.perf_counter() - start
+    print(f"\nScored {rows:,} tests in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+    print("BACKFILL COMPLETE")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+"""
+Benchmark: API endpoint latency and throughput
+Boots mongodb/main.py and/or mySQL/main.py against a local database seeded
+with synthetic data (the training CSV resampled with noise, loaded with the
+apps' own load_data.py), drives concurrent load at every route and reports
+requests/sec and p50/p95/p99 latency per endpoint to a JSON results file.
+With --baseline the run is compared with an earlier one and the script exits
+with status 1 when an endpoint got slower than --tolerance allows.
+
+Database stand-ins:
+- MongoDB: in-memory mongomock by default (pip install mongomock), or a local
+  mongod with --mongo-url mongodb://localhost:27017
+- MySQL: a local MySQL or MariaDB server, reached with DB_HOST / DB_USER /
+  DB_PASS (e.g. docker run -d -p 3306:3306 -e MARIADB_ROOT_PASSWORD=bench mariadb:11)
+The benchmark database (--db-name) is dropped and re-created on every run:
+never point it at real data.
+
+Each app runs in its own process (so the load generator doesn't share its
+GIL); routes are measured one after another, writes last. DELETE routes are
+not benchmarked, they would remove the seeded data under the other routes.
+
+Run: python bench_endpoints.py [--backend all|mongodb|mysql] [--rows 10000]
+     [--concurrency 16] [--duration 5] [--out bench_results.json]
+     [--baseline bench_baseline.json] [--save-baseline bench_baseline.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+APP_DIRS = {
+    "mongodb": os.path.join(ROOT, "mongodb"),
+    "mysql": os.path.join(ROOT, "mySQL"),
+}
+DATASET_PATH = os.path.join(ROOT, "ml_model", "Medicaldataset.csv")
+MYSQL_SCHEMA = ["create_table_main.sql", "create_table_predictions.sql", "create_table_versions.sql"]
+
+# Valid ranges of the synthetic CSV columns (noise is clipped to these)
+COLUMN_RANGES = {
+    "Age": (14, 103),
+    "Heart rate": (20, 200),
+    "Systolic blood pressure": (42, 220),
+    "Diastolic blood pressure": (38, 154),
+    "Blood sugar": (35, 541),
+    "CK-MB": (0.32, 300.0),
+    "Troponin": (0.001, 10.3),
+}
+
+
+# ---------------------------------------------------------------------------
+# Server side: seed a stand-in database and run one app (bench_endpoints.py --serve)
+# ---------------------------------------------------------------------------
+
+def write_synthetic_csv(rows, seed=42):
+    """Medicaldataset.csv resampled (with noise) to `rows` rows, as a temporary CSV"""
+    df = pd.read_csv(DATASET_PATH)
+    rng = np.random.default_rng(seed)
+    df = df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+    for column, (low, high) in COLUMN_RANGES.items():
+        noisy = df[column] * rng.normal(1.0, 0.05, rows)
+        df[column] = noisy.clip(low, high)
+        if column not in ("CK-MB", "Troponin"):
+            df[column] = df[column].round().astype(int)
+    df["CK-MB"] = df["CK-MB"].round(2)
+    df["Troponin"] = df["Troponin"].round(3)
+
+    handle, path = tempfile.mkstemp(prefix="bench_", suffix=".csv")
+    os.close(handle)
+    df.to_csv(path, index=False)
+    return path
+
+
+def seed_mongodb(csv_path, db_name, mongo_url):
+    """Load the CSV into MongoDB (mongomock when mongo_url is 'mongomock')"""
+    os.environ["DATABASE_NAME"] = db_name
+    if mongo_url != "mongomock":
+        os.environ["MONGODB_URL"] = mongo_url
+    import database
+    import load_data
+
+    if mongo_url == "mongomock":
+        import mongomock
+        client = mongomock.MongoClient()
+        # connect_to_mongo() (used by the app) gets the same in-memory client
+        database.MongoClient = lambda *args, **kwargs: client
+
+    db = database.get_database()
+    if db is None:
+        raise SystemExit(f"MongoDB is not reachable at {mongo_url}")
+    for name in load_data.COLLECTIONS + ["predictions", database.VERSIONS_COLLECTION]:
+        db[name].drop()
+
+    # mongomock isn't meant for concurrent bulk writes
+    rows, _ = load_data.load_csv(db, csv_path, workers=1 if mongo_url == "mongomock" else 6)
+    load_data.build_indexes(db)
+    database.bump_versions(*load_data.COLLECTIONS, db=db)
+    return rows
+
+
+def run_sql_script(cursor, path, db_name):
+    """Run a .sql file of the repo against db_name (statements split on ';')"""
+    with open(path) as f:
+        script = f.read().replace("heart_attack_db", db_name)
+    lines = [line for line in script.splitlines() if not line.strip().startswith("--")]
+    for statement in "\n".join(lines).split(";"):
+        if statement.strip():
+            cursor.execute(statement)
+
+
+def seed_mysql(csv_path, db_name):
+    """Create db_name from the repo's schema scripts and load the CSV"""
+    import mysql.connector
+    import database
+    import load_data
+
+    try:
+        conn = mysql.connector.connect(
+            host=os.getenv("DB_HOST", "localhost"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASS"),
+        )
+    except mysql.connector.Error as e:
+        raise SystemExit(f"MySQL is not reachable: {e}")
+
+    cursor = conn.cursor()
+    try:
+        for script in MYSQL_SCHEMA:
+            run_sql_script(cursor, os.path.join(APP_DIRS["mysql"], script), db_name)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    # The app's pool and load_data.py connect to DB_NAME
+    os.environ["DB_NAME"] = db_name
+    conn = database.get_db_connection()
+    try:
+        rows, _, _ = load_data.load_csv(conn, csv_path)
+        cursor = conn.cursor()
+        database.bump_versions(cursor, "patients", "tests")
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return rows
+
+
+def serve(backend, port, rows, db_name, mongo_url):
+    """Seed the stand-in database, then run the app until killed"""
+    app_dir = APP_DIRS[backend]
+    os.chdir(app_dir)
+    sys.path.insert(0, app_dir)
+
+    csv_path = write_synthetic_csv(rows)
+    try:
+        start = time.perf_counter()
+        if backend == "mongodb":
+            loaded = seed_mongodb(csv_path, db_name, mongo_url)
+        else:
+            loaded = seed_mysql(csv_path, db_name)
+        print(f" Seeded {loaded:,} rows into {backend} ({time.perf_counter() - start:.1f}s)", flush=True)
+    finally:
+        os.remove(csv_path)
+
+    import uvicorn
+    import main
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+# ---------------------------------------------------------------------------
+# Routes under test
+# ---------------------------------------------------------------------------
+
+class Route:
+    """One benchmarked request; {test_id}, {record_id}, {patient_id} in the
+    path or body are replaced by random seeded IDs on every request"""
+
+    def __init__(self, method, path, body=None, conditional=False, write=False, label=None):
+        self.method = method
+        self.path = path
+        self.body = body
+        self.conditional = conditional  # send the current ETag back: measures the 304 path
+        self.write = write
+        self.label = label or f"{method} {path}" + (" (304)" if conditional else "")
+        self.route = path.split("?")[0]  # path template as listed in /openapi.json
+
+    def request(self, ids):
+        body = self.body(ids) if callable(self.body) else self.body
+        return self.method, self.path.format(**ids), body
+
+
+def mongodb_ids(rng, rows):
+    n = rng.randint(1, rows)
+    return {"test_id": f"T{n:04d}", "record_id": f"R{n:04d}", "patient_id": f"P{n:04d}", "n": n}
+
+
+def mysql_ids(rng, rows):
+    n = rng.randint(1, rows)
+    return {"test_id": n, "patient_id": n, "n": n}
+
+
+def batch_ids(ids, size=100):
+    """A predict/batch body of `size` consecutive IDs starting at a random row"""
+    first = ids["n"]
+    if isinstance(ids["test_id"], str):
+        return {"test_ids": [f"T{first + i:04d}" for i in range(size)]}
+    return {"test_ids": list(range(first, first + size))}
+
+
+def mongodb_routes(entry):
+    return [
+        Route("GET", "/health"),
+        Route("GET", "/api/latest-entry"),
+        Route("GET", "/api/latest-entry", conditional=True),
+        Route("GET", "/api/entries?limit=100"),
+        Route("GET", "/api/heart-attack-tests?limit=100"),
+        Route("GET", "/api/heart-attack-tests?limit=100&format=ndjson", label="GET /api/heart-attack-tests (ndjson)"),
+        Route("GET", "/api/heart-attack-tests/{test_id}"),
+        Route("GET", "/api/heart-attack-tests/record/{record_id}"),
+        Route("GET", "/api/medical-records?limit=100"),
+        Route("GET", "/api/medical-records/{record_id}"),
+        Route("GET", "/api/medical-records/patient/{patient_id}"),
+        Route("GET", "/api/predictions?limit=100"),
+        Route("GET", "/api/predict"),
+        Route("POST", "/api/predict", body=entry),
+        Route("POST", "/api/predict/batch", body=batch_ids),
+        Route("GET", "/api/predict/cache"),
+        Route("GET", "/api/predictions/buffer"),
+        Route("GET", "/api/response-cache"),
+        Route("PUT", "/api/heart-attack-tests/{test_id}", body={"result": "positive"}, write=True),
+        Route("POST", "/api/heart-attack-tests", write=True, body=lambda ids: {
+            "test_id": f"B{random.getrandbits(64):x}", "record_id": ids["record_id"],
+            "ck_mb": 2.5, "troponin": 0.01, "result": "negative",
+        }),
+    ]
+
+
+def mysql_routes(entry):
+    return [
+        Route("GET", "/health"),
+        Route("GET", "/pool-stats"),
+        Route("GET", "/api/latest-entry"),
+        Route("GET", "/api/latest-entry", conditional=True),
+        Route("GET", "/api/entries?limit=100"),
+        Route("GET", "/patients?limit=100"),
+        Route("GET", "/patients?limit=100&stream=true", label="GET /patients (stream)"),
+        Route("GET", "/patients/{patient_id}"),
+        Route("GET", "/api/predictions?limit=100"),
+        Route("GET", "/api/predict"),
+        Route("POST", "/api/predict", body=entry),
+        Route("POST", "/api/predict/batch", body=batch_ids),
+        Route("GET", "/api/predict/cache"),
+        Route("GET", "/api/predictions/buffer"),
+        Route("GET", "/api/response-cache"),
+        Route("PUT", "/tests/{test_id}?heart_rate=80&systolic_bp=120&diastolic_bp=80"
+                     "&blood_sugar=100&ck_mb=2.5&troponin=0.01", write=True),
+    ]
+
+
+ROUTES = {"mongodb": (mongodb_routes, mongodb_ids), "mysql": (mysql_routes, mysql_ids)}
+
+
+# ---------------------------------------------------------------------------
+# Client side: load generation and statistics
+# ---------------------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(backend, args):
+    """Start `--serve backend` and wait until /health answers; returns (process, base URL)"""
+    port = free_port()
+    command = [sys.executable, os.path.abspath(__file__), "--serve", backend, "--port", str(port),
+               "--rows", str(args.rows), "--db-name", args.db_name, "--mongo-url", args.mongo_url]
+    process = subprocess.Popen(command)
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{backend} server exited with status {process.returncode}")
+        try:
+            health = requests.get(base_url + "/health", timeout=2).json()
+            if health.get("status") != "healthy":
+                raise RuntimeError(f"{backend} server is up but unhealthy: {health}")
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError(f"{backend} server did not start within {args.startup_timeout}s")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def send(session, base_url, route, ids, headers):
+    """One request; returns (seconds, status code or None on a connection error)"""
+    method, path, body = route.request(ids)
+    start = time.perf_counter()
+    try:
+        response = session.request(method, base_url + path, json=body, headers=headers, timeout=60)
+        response.content  # read the whole body (streams included)
+        status = response.status_code
+    except requests.RequestException:
+        status = None
+    return time.perf_counter() - start, status
+
+
+def run_route(base_url, route, make_ids, args):
+    """Warm up, then `concurrency` clients send requests for `duration` seconds"""
+    headers = {}
+    if route.conditional:
+        etag = requests.get(base_url + route.path).headers.get("ETag")
+        if etag:
+            headers["If-None-Match"] = etag
+
+    with requests.Session() as session:
+        rng = random.Random(0)
+        for _ in range(args.warmup):
+            send(session, base_url, route, make_ids(rng, args.rows), headers)
+
+    deadline = time.perf_counter() + args.duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        timings, statuses = [], {}
+        with requests.Session() as session:
+            while time.perf_counter() < deadline:
+                seconds, status = send(session, base_url, route, make_ids(rng, args.rows), headers)
+                timings.append(seconds)
+                statuses[status] = statuses.get(status, 0) + 1
+        return timings, statuses
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        outcomes = list(executor.map(client, range(1, args.concurrency + 1)))
+    elapsed = time.perf_counter() - start
+
+    timings = np.array([t for outcome, _ in outcomes for t in outcome]) * 1000
+    statuses = {}
+    for _, counts in outcomes:
+        for status, count in counts.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    errors = sum(count for status, count in statuses.items() if status == "None" or int(status) >= 400)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) if len(timings) else (0.0, 0.0, 0.0)
+    return {
+        "requests": int(len(timings)),
+        "errors": int(errors),
+        "statuses": statuses,
+        "rps": round(len(timings) / elapsed, 1),
+        "mean_ms": round(float(timings.mean()), 3) if len(timings) else 0.0,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(timings.max()), 3) if len(timings) else 0.0,
+    }
+
+
+def mounted_routes(base_url):
+    """{(method, path template)} served by the app, from its OpenAPI schema"""
+    paths = requests.get(base_url + "/openapi.json").json()["paths"]
+    return {(method.upper(), path) for path, methods in paths.items() for method in methods}
+
+
+def bench_backend(backend, args):
+    """Benchmark every route of one app; returns {label: stats}"""
+    print(f"\n{backend.upper()} ({args.rows:,} rows, {args.concurrency} clients, {args.duration}s per route)")
+    process, base_url = start_server(backend, args)
+    try:
+        make_routes, make_ids = ROUTES[backend]
+        entry = requests.get(base_url + "/api/latest-entry").json()
+        routes = make_routes(entry)
+
+        mounted = mounted_routes(base_url)
+        covered = {(route.method, route.route) for route in routes}
+        not_covered = sorted(r for r in mounted - covered if r[0] != "DELETE" and r[1] not in ("/", "/docs", "/redoc"))
+        if not_covered:
+            print(" Not benchmarked: " + ", ".join(f"{m} {p}" for m, p in not_covered))
+
+        results = {}
+        print(f" {'endpoint':<46}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        for route in sorted(routes, key=lambda r: r.write):  # writes last
+            if (route.method, route.route) not in mounted:
+                print(f" {route.label:<46} not mounted, skipped")
+                continue
+            stats = run_route(base_url, route, make_ids, args)
+            results[route.label] = stats
+            print(f" {route.label:<46}{stats['rps']:>9,.0f}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}"
+                  f"{stats['p99_ms']:>9.2f}{stats['errors']:>8}")
+        return results
+    finally:
+        stop_server(process)
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Print the change against the baseline; returns the regressed (backend, label) pairs
+
+    An endpoint regresses when its p95 grew by more than `tolerance` (and by at
+    least min_delta_ms, so sub-millisecond noise is ignored) or its throughput
+    fell by more than `tolerance`.
+    """
+    regressions = []
+    print(f"\nCOMPARISON WITH BASELINE ({baseline['meta'].get('started_at', '?')}, tolerance {tolerance:.0%})")
+    for setting in ("rows", "concurrency", "duration", "mongo_url", "cpus"):
+        if baseline["meta"].get(setting) != results["meta"][setting]:
+            print(f" Warning: {setting} differs from the baseline "
+                  f"({baseline['meta'].get(setting)} -> {results['meta'][setting]}), numbers may not be comparable")
+    for backend, routes in results["backends"].items():
+        previous_routes = baseline.get("backends", {}).get(backend, {})
+        for label, current in routes.items():
+            previous = previous_routes.get(label)
+            if previous is None:
+                print(f" {backend:<8}{label:<46} new endpoint")
+                continue
+            p95_change = current["p95_ms"] / previous["p95_ms"] - 1 if previous["p95_ms"] else 0.0
+            rps_change = current["rps"] / previous["rps"] - 1 if previous["rps"] else 0.0
+            slower = p95_change > tolerance and current["p95_ms"] - previous["p95_ms"] >= min_delta_ms
+            regressed = slower or rps_change < -tolerance or current["errors"] > previous["errors"]
+            if regressed:
+                regressions.append((backend, label))
+            print(f" {backend:<8}{label:<46} p95 {p95_change:>+7.1%}  req/s {rps_change:>+7.1%}"
+                  f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API endpoint latency benchmark")
+    parser.add_argument("--backend", choices=["all", "mongodb", "mysql"], default="all")
+    parser.add_argument("--rows", type=int, default=10000, help="synthetic rows seeded into the database")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients per route")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of load per route")
+    parser.add_argument("--warmup", type=int, default=20, help="requests sent before each measurement")
+    parser.add_argument("--out", default="bench_results.json", help="results file (JSON)")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare with")
+    parser.add_argument("--save-baseline", metavar="PATH", help="also write the results to PATH")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 / throughput change")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="smallest p95 increase counted as a regression")
+    parser.add_argument("--db-name", default="heart_attack_bench", help="benchmark database (dropped on every run)")
+    parser.add_argument("--mongo-url", default="mongomock", help="'mongomock' or a mongod URL")
+    parser.add_argument("--startup-timeout", type=float, default=600, help="seconds allowed for seeding and startup")
+    parser.add_argument("--serve", choices=list(APP_DIRS), help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.rows, args.db_name, args.mongo_url)
+        return
+
+    results = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "rows": args.rows,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mongo_url": args.mongo_url if args.mongo_url == "mongomock" else "mongod",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "backends": {},
+    }
+
+    print("ENDPOINT BENCHMARK")
+    backends = list(APP_DIRS) if args.backend == "all" else [args.backend]
+    for backend in backends:
+        try:
+            results["backends"][backend] = bench_backend(backend, args)
+        except RuntimeError as e:
+            print(f" {backend} skipped: {e}")
+
+    for path in filter(None, (args.out, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} endpoint(s) regressed")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: compiled forest vs sklearn predict_proba
+Checks that both give identical probabilities, then reports single-row
+latency and throughput (rows/sec) for a small and a large batch
+Run: python bench_forest.py [--rows 100000] [--repeat 200]
+"""
+
+import argparse
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from forest import compile_forest
+from model_service import MODEL_PATH
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ml_model", "Medicaldataset.csv")
+
+
+def load_rows(model, n_rows):
+    """Tile the training CSV (with a little noise) up to n_rows feature rows"""
+    df = pd.read_csv(DATASET_PATH)[list(model.feature_names_in_)]
+    reps = -(-n_rows // len(df))
+    X = pd.concat([df] * reps, ignore_index=True).iloc[:n_rows]
+    noise = np.random.default_rng(42).normal(0, 0.5, X.shape)
+    return X + noise
+
+
+def single_row_latency(predict_proba, row, repeat):
+    """Median seconds per single-row predict_proba call"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def throughput(predict_proba, X):
+    """Rows per second for one predict_proba call over the whole batch"""
+    start = time.perf_counter()
+    predict_proba(X)
+    return len(X) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiled forest benchmark")
+    parser.add_argument("--rows", type=int, default=100000, help="rows for the large batch throughput test")
+    parser.add_argument("--small", type=int, default=100, help="rows for the small batch throughput test")
+    parser.add_argument("--repeat", type=int, default=200, help="single-row calls to time")
+    args = parser.parse_args()
+
+    print("FOREST INFERENCE BENCHMARK")
+    model = joblib.load(MODEL_PATH)
+    compiled = compile_forest(model)
+    X = load_rows(model, args.rows)
+    X_np = np.ascontiguousarray(X.to_numpy(dtype=np.float64))
+    print(f"Trees: {compiled.n_estimators}, nodes: {len(compiled.feature)}, max depth: {compiled.max_depth}")
+
+    # Correctness first: compiled must match sklearn bit for bit
+    trained_n_jobs = model.n_jobs
+    model.n_jobs = 1
+    expected = model.predict_proba(X)
+    actual = compiled.predict_proba(X_np)
+    print(f"\nIdentical probabilities: {np.array_equal(expected, actual)}"
+          f" (max abs diff {np.abs(expected - actual).max():.3g})")
+
+    row_df = X.iloc[[0]]
+    row_np = X_np[:1]
+    backends = [
+        (f"sklearn (n_jobs={n_jobs})", n_jobs, model.predict_proba, row_df, X)
+        for n_jobs in sorted({trained_n_jobs, 1}, key=str)
+    ]
+    backends.append(("compiled (DataFrame)", None, compiled.predict_proba, row_df, X))
+    backends.append(("compiled (ndarray)", None, compiled.predict_proba, row_np, X_np))
+
+    small_label = f"rows/sec @{args.small}"
+    large_label = f"rows/sec @{args.rows}"
+    print(f"\n{'backend':<24}{'single row (us)':>18}{small_label:>20}{large_label:>22}")
+    for name, n_jobs, predict_proba, row, batch in backends:
+        if n_jobs is not None:
+            model.n_jobs = n_jobs
+        repeat = args.repeat if n_jobs is None else max(args.repeat // 10, 5)
+        latency = single_row_latency(predict_proba, row, repeat)
+        small_rate = throughput(predict_proba, batch[:args.small])
+        large_rate = throughput(predict_proba, batch)
+        print(f"{name:<24}{latency * 1e6:>18.1f}{small_rate:>20,.0f}{large_rate:>22,.0f}")
+
+    model.n_jobs = trained_n_jobs
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Benchmark: stages of the prediction path in predict.py
+Times each stage separately so it is clear whether time goes into model
+loading, pandas or the forest itself:
+
+- load_model(): cold (fresh interpreter, imports timed separately, RSS growth)
+  and warm (already imported, files in the page cache)
+- prepare_features(): one call per entry, as predict.py does
+- DataFrame construction (plus the reorder to model.feature_names_in_)
+- predict_proba, and the labels derived from it
+- end to end: make_prediction() for one entry, score_entries() for a batch
+
+at batch sizes 1, 10, 1k and 100k, for the compiled and the sklearn backend.
+Per stage it reports the median time, time per row, peak traced memory and
+the memory blocks the stage leaves allocated (tracemalloc; NumPy buffers are
+included). Results are written as JSON with the commit and model version, so
+runs can be compared across both; --baseline prints the change per stage and
+exits with status 1 when a stage got slower than --tolerance allows.
+Run: python bench_inference.py [--batches 1,10,1000,100000] [--backend both]
+     [--out bench_inference.json] [--baseline earlier.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(BASE_DIR, "..", "ml_model", "Medicaldataset.csv")
+BACKENDS = ["compiled", "sklearn"]
+
+
+def quiet():
+    """predict.py reports progress with print(); keep it out of the timings' output"""
+    return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+
+def make_entries(n, seed=42):
+    """n latest-entry payloads built from the training CSV (resampled, with noise)"""
+    import numpy as np
+    import pandas as pd
+
+    df = pd.read_csv(DATASET_PATH)
+    rng = np.random.default_rng(seed)
+    df = df.iloc[rng.integers(0, len(df), n)].reset_index(drop=True)
+    noise = rng.normal(1.0, 0.02, (n, 2))
+    return [
+        {
+            "patient": {"patient_id": f"P{i:04d}", "age": int(row[0]), "gender": int(row[1])},
+            "medical_record": {
+                "heart_rate": int(row[2]),
+                "systolic_blood_pressure": int(row[3]),
+                "diastolic_blood_pressure": int(row[4]),
+                "blood_sugar": int(row[5]),
+            },
+            "heart_attack_test": {"ck_mb": float(row[6] * noise[i, 0]), "troponin": float(row[7] * noise[i, 1]),
+                                  "result": row[8]},
+        }
+        for i, row in enumerate(df.itertuples(index=False))
+    ]
+
+
+def time_stage(func, min_time, max_repeat):
+    """Median seconds of func(), repeated until min_time has passed (at least 3 runs)"""
+    timings = []
+    total = 0.0
+    while len(timings) < 3 or (total < min_time and len(timings) < max_repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        total += elapsed
+    return statistics.median(timings), len(timings)
+
+
+def trace_stage(func):
+    """Peak traced KiB above the starting point and blocks still allocated by func()'s result"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        start_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+        del result
+    finally:
+        tracemalloc.stop()
+    return (peak - start_bytes) / 1024, blocks
+
+
+def measure(func, rows, args):
+    seconds, runs = time_stage(func, args.min_time, args.max_repeat)
+    peak_kib, blocks = trace_stage(func)
+    return {
+        "ms": round(seconds * 1000, 4),
+        "us_per_row": round(seconds * 1e6 / rows, 3),
+        "runs": runs,
+        "peak_kib": round(peak_kib, 1),
+        "blocks": int(blocks),
+    }
+
+
+# ---------------------------------------------------------------------------
+# load_model(): cold in a fresh interpreter (bench_inference.py --cold-load), warm in-process
+# ---------------------------------------------------------------------------
+
+def rss_kib():
+    """Current resident set size of this process (KiB); None without /proc (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def cold_load():
+    """Runs in a child process: time the imports and the first load_model() call
+
+    Not traced (tracemalloc would slow unpickling down); memory is the RSS
+    growth, which also counts the memory-mapped model pages that were read.
+    """
+    start = time.perf_counter()
+    import predict
+    imported = time.perf_counter()
+    rss_before = rss_kib()
+    with quiet():
+        model, _ = predict.load_model()
+    loaded = time.perf_counter()
+    rss_after = rss_kib()
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "load_ms": (loaded - imported) * 1000,
+        "rss_kib": rss_after - rss_before if rss_before is not None else None,
+        "model": type(model).__name__,
+    }))
+
+
+def bench_load(backend, args):
+    """Cold (median of fresh processes) and warm load_model() timings"""
+    env = dict(os.environ, MODEL_BACKEND=backend)
+    cold = []
+    for _ in range(args.cold_runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--cold-load"], cwd=BASE_DIR,
+                                env=env, capture_output=True, text=True, check=True).stdout
+        cold.append(json.loads(output.strip().splitlines()[-1]))
+
+    import predict
+
+    def warm():
+        with quiet():
+            return predict.load_model()
+
+    predict.MODEL_BACKEND = backend
+    warm_stats = measure(warm, 1, args)
+    return {
+        "model": cold[0]["model"],
+        "cold_import_ms": round(statistics.median(c["import_ms"] for c in cold), 2),
+        "cold_load_ms": round(statistics.median(c["load_ms"] for c in cold), 2),
+        "cold_rss_kib": statistics.median(c["rss_kib"] for c in cold) if cold[0]["rss_kib"] is not None else None,
+        "warm_load_ms": round(warm_stats["ms"], 2),
+        "warm_peak_kib": warm_stats["peak_kib"],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Per-batch stages
+# ---------------------------------------------------------------------------
+
+def bench_stages(model, feature_names, entries, args):
+    """{stage: stats} for one batch of entries"""
+    import pandas as pd
+    import predict
+
+    rows = len(entries)
+    expected = getattr(model, "feature_names_in_", None)
+
+    def prepare():
+        with quiet():
+            return [predict.prepare_features(entry) for entry in entries]
+
+    features = prepare()
+
+    def dataframe():
+        X = pd.DataFrame(features, columns=feature_names)
+        return X[expected] if expected is not None else X
+
+    X = dataframe()
+
+    def predict_proba():
+        return model.predict_proba(X)
+
+    probabilities = predict_proba()
+
+    def labels():
+        return model.classes_[probabilities.argmax(axis=1)]
+
+    if rows == 1:
+        def end_to_end():
+            with quiet():
+                return predict.make_prediction(model, feature_names, predict.prepare_features(entries[0]))
+    else:
+        def end_to_end():
+            return predict.score_entries(model, feature_names, entries)
+
+    stages = {
+        "prepare_features": prepare,
+        "dataframe": dataframe,
+        "predict_proba": predict_proba,
+        "labels": labels,
+        "end_to_end": end_to_end,
+    }
+    return {name: measure(func, rows, args) for name, func in stages.items()}
+
+
+def load_backend(backend):
+    import predict
+    predict.MODEL_BACKEND = backend
+    with quiet():
+        return predict.load_model()
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Print the change per stage against the baseline; returns the regressed stages"""
+    regressions = []
+    meta, previous_meta = results["meta"], baseline["meta"]
+    print(f"\nCOMPARISON WITH BASELINE ({previous_meta.get('commit')}, model {previous_meta.get('model_version')})")
+    if previous_meta.get("model_version") != meta["model_version"]:
+        print(f" Model changed: {previous_meta.get('model_version')} -> {meta['model_version']}")
+
+    for backend, load in results["load"].items():
+        old = baseline.get("load", {}).get(backend)
+        if old:
+            for key in ("cold_load_ms", "warm_load_ms"):
+                print(f" {backend:<10}{'':>8}  {key:<18}{old[key]:>12.2f}{load[key]:>12.2f} ms"
+                      f"{load[key] / old[key] - 1 if old[key] else 0:>+9.1%}")
+
+    for backend, batches in results["stages"].items():
+        for batch, stages in batches.items():
+            for stage, stats in stages.items():
+                old = baseline.get("stages", {}).get(backend, {}).get(batch, {}).get(stage)
+                if not old:
+                    continue
+                change = stats["ms"] / old["ms"] - 1 if old["ms"] else 0.0
+                regressed = change > tolerance and stats["ms"] - old["ms"] >= min_delta_ms
+                if regressed:
+                    regressions.append((backend, batch, stage))
+                print(f" {backend:<10}{batch:>8}  {stage:<18}{old['ms']:>12.3f}{stats['ms']:>12.3f} ms"
+                      f"{change:>+9.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prediction path benchmark")
+    parser.add_argument("--batches", default="1,10,1000,100000", help="comma separated batch sizes")
+    parser.add_argument("--backend", choices=["both"] + BACKENDS, default="both")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds spent timing each stage")
+    parser.add_argument("--max-repeat", type=int, default=1000, help="max runs per stage")
+    parser.add_argument("--cold-runs", type=int, default=3, help="fresh processes for the cold load")
+    parser.add_argument("--out", default="bench_inference.json", help="results file (JSON)")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown per stage")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="smallest slowdown counted as a regression")
+    parser.add_argument("--cold-load", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # predict.py opens the model files relative to its own folder
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+    if args.cold_load:
+        cold_load()
+        return
+
+    import numpy as np
+    import pandas as pd
+    import sklearn
+    from model_service import file_version
+
+    batches = [int(b) for b in args.batches.split(",")]
+    backends = BACKENDS if args.backend == "both" else [args.backend]
+    results = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "model_version": file_version("heart_attack_model.pkl"),
+            "artifact": os.path.isdir("heart_attack_model.forest"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "cpus": os.cpu_count(),
+        },
+        "load": {},
+        "stages": {},
+    }
+
+    print("INFERENCE BENCHMARK")
+    print(f" model {results['meta']['model_version']}, batches {batches}")
+    entries = make_entries(max(batches))
+
+    for backend in backends:
+        print(f"\n{backend.upper()}")
+        load = results["load"][backend] = bench_load(backend, args)
+        print(f" load_model  cold {load['cold_load_ms']:.1f} ms (+{load['cold_import_ms']:.0f} ms imports, "
+              f"RSS +{load['cold_rss_kib'] or 0:,.0f} KiB)  warm {load['warm_load_ms']:.1f} ms "
+              f"(peak {load['warm_peak_kib']:,.0f} KiB)  [{load['model']}]")
+
+        model, feature_names = load_backend(backend)
+        results["stages"][backend] = {}
+        print(f" {'batch':>8}  {'stage':<18}{'ms':>12}{'us/row':>10}{'peak KiB':>12}{'blocks':>10}")
+        for batch in batches:
+            stages = bench_stages(model, feature_names, entries[:batch], args)
+            results["stages"][backend][str(batch)] = stages
+            for stage, stats in stages.items():
+                print(f" {batch:>8}  {stage:<18}{stats['ms']:>12.3f}{stats['us_per_row']:>10.2f}"
+                      f"{stats['peak_kib']:>12,.1f}{stats['blocks']:>10,}")
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) regressed")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
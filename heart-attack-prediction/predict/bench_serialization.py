@@ -0,0 +1,148 @@
+"""
+Benchmark: JSON serialization of API responses
+Times three ways of encoding the same documents and reports milliseconds
+per 10k documents, then the cost and size of gzip / brotli on the result:
+
+- fastapi: the old path (_id rewritten to str per document, then
+  jsonable_encoder + json.dumps, what a handler returning a dict gets)
+- json: json.dumps with a default hook (the old streaming path)
+- orjson: fast_json.dumps (FastJSONResponse and the streaming endpoints)
+
+Documents look like MongoDB heart_attack_tests (ObjectId, datetime) or
+MySQL patients+tests rows (DECIMAL, DATETIME).
+Run: python bench_serialization.py [--docs 10000] [--repeat 5]
+"""
+
+import argparse
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+import numpy as np
+from bson.objectid import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fast_json import dumps, loads
+from compression import GZIP_LEVEL, BROTLI_QUALITY, brotli
+
+
+def mongo_docs(n):
+    """heart_attack_tests documents as returned by pymongo"""
+    rng = np.random.default_rng(0)
+    base = datetime(2025, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "test_id": f"T{i:07d}",
+            "record_id": f"R{i:07d}",
+            "ck_mb": float(rng.uniform(0.3, 300)),
+            "troponin": float(rng.uniform(0.001, 10)),
+            "result": "positive" if i % 3 else "negative",
+            "test_date": base + timedelta(minutes=i),
+        }
+        for i in range(n)
+    ]
+
+
+def mysql_rows(n):
+    """patients JOIN tests rows as returned by cursor(dictionary=True)"""
+    rng = np.random.default_rng(0)
+    base = datetime(2025, 1, 1)
+    return [
+        {
+            "patient_id": i,
+            "age": int(rng.integers(20, 90)),
+            "gender": int(i % 2),
+            "result": "positive" if i % 3 else "negative",
+            "created_at": base,
+            "test_id": i,
+            "heart_rate": int(rng.integers(50, 140)),
+            "systolic_bp": int(rng.integers(90, 200)),
+            "diastolic_bp": int(rng.integers(50, 120)),
+            "blood_sugar": int(rng.integers(60, 400)),
+            "ck_mb": Decimal(f"{rng.uniform(0.3, 300):.2f}"),
+            "troponin": Decimal(f"{rng.uniform(0.001, 10):.3f}"),
+            "recorded_date": base + timedelta(minutes=i),
+        }
+        for i in range(n)
+    ]
+
+
+def json_default(value):
+    """What the old streaming endpoints passed to json.dumps"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(type(value).__name__)
+
+
+def encode_fastapi(docs):
+    # Old handlers rewrote _id, then FastAPI ran jsonable_encoder and json.dumps
+    docs = [dict(d) for d in docs]
+    for d in docs:
+        if "_id" in d:
+            d["_id"] = str(d["_id"])
+    return json.dumps(jsonable_encoder(docs), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_json(docs):
+    return json.dumps(docs, default=json_default, separators=(",", ":")).encode("utf-8")
+
+
+def encode_orjson(docs):
+    return dumps(docs)
+
+
+ENCODERS = {"fastapi": encode_fastapi, "json": encode_json, "orjson": encode_orjson}
+
+
+def best_time(func, repeat):
+    """Fastest of `repeat` runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON serialization benchmark")
+    parser.add_argument("--docs", type=int, default=10000, help="documents per response")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is kept)")
+    args = parser.parse_args()
+    per_10k = 10000 / args.docs
+
+    print("SERIALIZATION BENCHMARK")
+    print(f" {args.docs:,} documents, best of {args.repeat} runs, times in ms per 10k documents")
+
+    for name, docs in (("MongoDB tests", mongo_docs(args.docs)), ("MySQL rows", mysql_rows(args.docs))):
+        print(f"\n{name}")
+        outputs = {}
+        baseline = None
+        for encoder, encode in ENCODERS.items():
+            outputs[encoder] = encode(docs)
+            ms = best_time(lambda: encode(docs), args.repeat) * 1000 * per_10k
+            baseline = baseline or ms
+            print(f" {encoder:<10}{ms:>10.2f} ms  {baseline / ms:>6.1f}x")
+        # Same JSON values whichever way they were encoded
+        identical = loads(outputs["orjson"]) == loads(outputs["fastapi"])
+        print(f" orjson output matches the old output: {identical}")
+
+        body = outputs["orjson"]
+        print(f" body: {len(body) / 1024:,.0f} KiB")
+        ms = best_time(lambda: gzip.compress(body, GZIP_LEVEL), args.repeat) * 1000 * per_10k
+        print(f" gzip {GZIP_LEVEL}:   {ms:>8.2f} ms, {len(gzip.compress(body, GZIP_LEVEL)) / len(body):.1%} of the size")
+        if brotli is not None:
+            compress = lambda: brotli.compress(body, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+            ms = best_time(compress, args.repeat) * 1000 * per_10k
+            print(f" brotli {BROTLI_QUALITY}: {ms:>8.2f} ms, {len(compress()) / len(body):.1%} of the size")
+        else:
+            print(" brotli: not installed (pip install brotli)")
+
+
+if __name__ == "__main__":
+    main()
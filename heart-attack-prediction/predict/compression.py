@@ -0,0 +1,153 @@
+"""
+Response compression for both APIs
+ASGI middleware that picks brotli or gzip from the client's Accept-Encoding
+and compresses JSON/NDJSON responses larger than COMPRESSION_MIN_SIZE.
+Streaming responses are compressed chunk by chunk (each chunk is flushed,
+so NDJSON clients still receive documents as they are produced).
+
+brotli is optional: without the `brotli` package only gzip is offered.
+"""
+
+import os
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Only text formats compress well; everything else is sent as is
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def choose_encoding(accept_encoding):
+    """'br', 'gzip' or None for an Accept-Encoding header (q=0 means refused)"""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    candidates = [name for name in candidates if offered.get(name, offered.get("*", 0)) > 0]
+    if not candidates:
+        return None
+    # Highest q wins; on a tie the order above (brotli first) decides
+    return max(candidates, key=lambda name: offered.get(name, offered.get("*", 0)))
+
+
+class _Compressor:
+    """Incremental gzip or brotli stream"""
+
+    def __init__(self, encoding, gzip_level, brotli_quality):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(mode=brotli.MODE_TEXT, quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def chunk(self, data):
+        """Compressed data, flushed so the client can decode it right away"""
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b""):
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """Compress large JSON responses with brotli or gzip"""
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE, gzip_level=GZIP_LEVEL,
+                 brotli_quality=BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _Responder(send, encoding, self)
+        await self.app(scope, receive, responder.send)
+
+
+class _Responder:
+    """Wraps `send`: decides on the first body chunk whether to compress"""
+
+    def __init__(self, send, encoding, options):
+        self._send = send
+        self.encoding = encoding
+        self.options = options
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not self._should_compress(body, more_body):
+                self.passthrough = True
+                await self._send(self.start)
+                await self._send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding, self.options.gzip_level, self.options.brotli_quality)
+            headers = MutableHeaders(raw=self.start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            # The compressed bytes differ from the identity ones: a strong ETag becomes weak
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                body = self.compressor.finish(body)
+                headers["Content-Length"] = str(len(body))
+                await self._send(self.start)
+                await self._send({"type": "http.response.body", "body": body})
+                return
+            await self._send(self.start)
+
+        data = self.compressor.chunk(body) if more_body else self.compressor.finish(body)
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def _should_compress(self, body, more_body):
+        headers = Headers(raw=self.start["headers"])
+        if self.start["status"] < 200 or self.start["status"] in (204, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        if not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+            return False
+        # A streamed body's size isn't known up front: always compress it
+        return more_body or len(body) >= self.options.minimum_size
@@ -0,0 +1,67 @@
+"""
+Conditional GET support for both APIs
+Every collection (MongoDB) or table (MySQL) has a version counter and a
+last-modified stamp that the write routes bump. A read endpoint builds its
+ETag from the versions of everything its response is made of, so a client
+that sends the ETag back in If-None-Match gets a 304 without the data being
+queried or serialized again.
+
+    headers = validators(collection_versions("heart_attack_tests"))
+    if is_fresh(request, headers):
+        return not_modified(headers)
+    response.headers.update(headers)
+"""
+
+import hashlib
+from email.utils import format_datetime
+from datetime import timezone
+from fastapi import Response
+
+
+def validators(versions):
+    """ETag and Last-Modified headers for [(name, version, modified_at), ...]
+
+    Returns {} when a version is unknown (e.g. the version table is missing),
+    so the response is sent without validators and never answered with 304.
+    """
+    if not versions or any(version is None for _, version, _ in versions):
+        return {}
+
+    # The stamps are part of the tag, so counters that restart after a reset never collide
+    token = ";".join(
+        f"{name}:{version}:{modified_at.timestamp() if modified_at else 0}"
+        for name, version, modified_at in sorted(versions, key=lambda v: v[0])
+    )
+    headers = {"ETag": f'W/"{hashlib.blake2b(token.encode(), digest_size=8).hexdigest()}"'}
+
+    stamps = [modified_at for _, _, modified_at in versions if modified_at is not None]
+    if stamps:
+        last = max(stamps)
+        if last.tzinfo is None:
+            last = last.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def is_fresh(request, headers):
+    """True if the client's If-None-Match holds the current ETag
+
+    Only the ETag is compared: Last-Modified has one-second resolution, so
+    two writes within a second could not be told apart by If-Modified-Since.
+    """
+    etag = headers.get("ETag")
+    if etag is None:
+        return False
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" match
+    current = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == current for tag in if_none_match.split(","))
+
+
+def not_modified(headers):
+    """304 response carrying the validators"""
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,46 @@
+"""
+Fast JSON serialization for both APIs
+orjson encodes dicts, lists, datetime/date and NumPy values in C; the only
+Python callback is json_default, which orjson calls for the few types it
+doesn't know (ObjectId, Decimal). Handlers can return raw MongoDB documents
+and MySQL rows without rewriting every value first.
+
+Return FastJSONResponse(content) from a handler to skip FastAPI's
+jsonable_encoder pass, which walks every value in Python before encoding.
+"""
+
+from decimal import Decimal
+import orjson
+from bson.objectid import ObjectId
+from fastapi.responses import JSONResponse
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def json_default(value):
+    """Values orjson doesn't encode natively (same output as FastAPI's encoder)"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def dumps(value):
+    """Compact JSON as bytes"""
+    return orjson.dumps(value, default=json_default, option=OPTIONS)
+
+
+def dumps_line(value):
+    """One NDJSON line as bytes"""
+    return orjson.dumps(value, default=json_default, option=OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+
+loads = orjson.loads
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson, with BSON and DECIMAL support"""
+
+    def render(self, content):
+        return dumps(content)
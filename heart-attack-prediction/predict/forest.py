@@ -0,0 +1,189 @@
+"""
+Compiled Random Forest for fast heart attack risk scoring
+Flattens the trained sklearn forest into plain NumPy arrays and walks all
+trees for a whole batch at once, without sklearn's per-call input checks
+and joblib thread dispatch
+"""
+
+import json
+import os
+import numpy as np
+
+# Rows traversed per step; small chunks keep the (rows x trees) node index
+# matrix in cache
+CHUNK_ROWS = 512
+
+# Arrays written by CompiledForest.save, one uncompressed .npy file each so
+# they can be memory-mapped
+ARTIFACT_ARRAYS = ["feature", "threshold", "children", "value", "roots"]
+ARTIFACT_META = "meta.json"
+
+
+class CompiledForest:
+    """Array-backed copy of a fitted RandomForestClassifier
+
+    All trees are concatenated into one node table:
+    - feature[i], threshold[i]: split of node i (go left when x[feature] <= threshold)
+    - children[2*i], children[2*i + 1]: global index of the left and right
+      child (leaves point to themselves)
+    - value[i]: class probabilities stored at node i
+    - roots[t]: index of the root node of tree t
+
+    predict_proba returns the same numbers as sklearn: inputs are cast to
+    float32 like sklearn does, and tree outputs are summed in estimator
+    order before dividing by the number of trees.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth,
+                 classes, feature_names=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+        self.n_classes_ = len(classes)
+        self.n_estimators = len(roots)
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.n_features_in_ = int(feature.max()) + 1 if feature_names is None else len(feature_names)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flatten a fitted sklearn RandomForestClassifier"""
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output forests can be compiled")
+
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+
+            # Leaves loop back to themselves so every row can take max_depth steps
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+            pairs = np.empty(2 * n_nodes, dtype=np.int64)
+            pairs[0::2] = np.where(is_leaf, node_ids, tree.children_left) + offset
+            pairs[1::2] = np.where(is_leaf, node_ids, tree.children_right) + offset
+            children.append(pairs)
+            values.append(tree.value[:, 0, :model.n_classes_].astype(np.float64))
+            roots.append(offset)
+
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.concatenate(children).astype(np.int32),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            classes=model.classes_,
+            feature_names=getattr(model, 'feature_names_in_', None),
+        )
+
+    def save(self, directory, **meta):
+        """Write the node arrays as .npy files plus a small meta.json
+
+        Extra keyword arguments (e.g. source_version) are stored in meta.json.
+        The directory is written next to its final location and renamed into
+        place, so a reader never sees a half-written artifact.
+        """
+        tmp_dir = f"{directory}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name in ARTIFACT_ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        meta = dict(meta,
+                    max_depth=int(self.max_depth),
+                    classes=self.classes_.tolist(),
+                    feature_names=list(self.feature_names_in_) if hasattr(self, 'feature_names_in_') else None)
+        with open(os.path.join(tmp_dir, ARTIFACT_META), "w") as f:
+            json.dump(meta, f)
+
+        if os.path.isdir(directory):
+            old_dir = f"{directory}.old"
+            os.rename(directory, old_dir)
+            os.rename(tmp_dir, directory)
+            for name in os.listdir(old_dir):
+                os.remove(os.path.join(old_dir, name))
+            os.rmdir(old_dir)
+        else:
+            os.rename(tmp_dir, directory)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        """Open an artifact written by save()
+
+        With mmap_mode='r' the arrays are memory-mapped read-only: loading
+        takes milliseconds and every process using the artifact shares the
+        same pages of the OS page cache.
+        """
+        meta = read_artifact_meta(directory)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+                  for name in ARTIFACT_ARRAYS}
+        forest = cls(
+            max_depth=meta["max_depth"],
+            classes=np.asarray(meta["classes"]),
+            feature_names=meta["feature_names"],
+            **arrays,
+        )
+        forest.meta = meta
+        return forest
+
+    def _as_matrix(self, X):
+        """Convert input to a float32 matrix in training column order"""
+        if hasattr(X, 'columns') and hasattr(self, 'feature_names_in_'):
+            X = X[list(self.feature_names_in_)]
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected a 2D input with {self.n_features_in_} features, got shape {X.shape}")
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity")
+        return X
+
+    def apply(self, X):
+        """Return the leaf index reached in every tree, shape (n_samples, n_trees)"""
+        X = self._as_matrix(X)
+        return self._apply(X)
+
+    def _apply(self, X):
+        n_samples, n_features = X.shape
+        X_flat = X.ravel()
+        row_offsets = (np.arange(n_samples, dtype=np.int32) * n_features)[:, None]
+        nodes = np.repeat(self.roots[None, :], n_samples, axis=0)
+        for _ in range(self.max_depth):
+            go_right = X_flat.take(row_offsets + self.feature.take(nodes)) > self.threshold.take(nodes)
+            nodes = self.children.take((nodes << 1) | go_right)
+        return nodes
+
+    def predict_proba(self, X):
+        """Class probabilities averaged over all trees, shape (n_samples, n_classes)"""
+        X = self._as_matrix(X)
+        proba = np.empty((X.shape[0], self.n_classes_), dtype=np.float64)
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            leaves = self._apply(X[start:start + CHUNK_ROWS])
+            # cumsum adds trees one after another, the same order sklearn uses
+            proba[start:start + CHUNK_ROWS] = np.cumsum(self.value[leaves], axis=1)[:, -1]
+        proba /= self.n_estimators
+        return proba
+
+    def predict(self, X):
+        """Predicted class labels"""
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def read_artifact_meta(directory):
+    """meta.json of a saved artifact"""
+    with open(os.path.join(directory, ARTIFACT_META)) as f:
+        return json.load(f)
+
+
+def compile_forest(model):
+    """Flatten a fitted RandomForestClassifier into a CompiledForest"""
+    return CompiledForest.from_sklearn(model)
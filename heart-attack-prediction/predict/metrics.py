@@ -0,0 +1,335 @@
+"""
+Prometheus metrics for both APIs
+Served at GET /metrics in the Prometheus text format:
+
+- http_request_duration_seconds{method, route, status}: MetricsMiddleware
+  (route is the path template, e.g. /patients/{patient_id})
+- db_call_duration_seconds{db, target, operation}: one sample per MongoDB
+  command (MongoCommandListener) or MySQL statement (instrument_connection);
+  target is the collection or table
+- model_inference_duration_seconds{backend} and model_batch_size{backend}:
+  every predict_proba pass of the model service
+- cache_requests_total{cache, namespace, result}: response cache and
+  prediction cache lookups (hit ratio = hit / (hit + miss))
+- db_pool_*{db}: connections in use / idle / capacity, waits and timeouts,
+  read from the connection pool when /metrics is scraped
+
+Recording a sample costs about a microsecond (one lock, one bisect), so the
+metrics stay on in production. Under Gunicorn, PROMETHEUS_MULTIPROC_DIR
+(set by gunicorn.conf.py) makes every scrape report the sum over all workers;
+pool gauges, which describe one worker's pool, then carry a pid label.
+"""
+
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency (until the last body byte is sent)",
+    ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_CALL_DURATION = Histogram(
+    "db_call_duration_seconds", "Database call latency per collection/table and operation",
+    ["db", "target", "operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+DB_CALL_ERRORS = Counter(
+    "db_call_errors_total", "Database calls that failed", ["db", "target", "operation"],
+)
+INFERENCE_DURATION = Histogram(
+    "model_inference_duration_seconds", "Latency of one predict_proba pass", ["backend"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "model_batch_size", "Rows scored per predict_proba pass", ["backend"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by result (hit or miss)", ["cache", "namespace", "result"],
+)
+
+
+class MetricsMiddleware:
+    """Records http_request_duration_seconds for every HTTP request
+
+    Added last (outermost), so compression and streaming are included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500  # an exception before the response started
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope; unmatched paths
+            # share one label so random URLs can't create new series
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - start)
+
+
+def observe_db(db, target, operation, seconds, failed=False):
+    DB_CALL_DURATION.labels(db, target, operation).observe(seconds)
+    if failed:
+        DB_CALL_ERRORS.labels(db, target, operation).inc()
+
+
+def observe_inference(backend, rows, seconds):
+    INFERENCE_DURATION.labels(backend).observe(seconds)
+    INFERENCE_BATCH_SIZE.labels(backend).observe(rows)
+
+
+def count_cache(cache, namespace, hits, misses):
+    if hits:
+        CACHE_REQUESTS.labels(cache, namespace, "hit").inc(hits)
+    if misses:
+        CACHE_REQUESTS.labels(cache, namespace, "miss").inc(misses)
+
+
+# ---------------------------------------------------------------------------
+# MongoDB: pymongo monitoring listeners (register before the client is created)
+# ---------------------------------------------------------------------------
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every command the driver sends, labelled by collection"""
+
+    def __init__(self):
+        self._targets = {}
+
+    def started(self, event):
+        command = event.command
+        target = command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = command.get("collection")
+        self._targets[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _finish(self, event, failed):
+        target = self._targets.pop((event.connection_id, event.request_id), "")
+        observe_db("mongodb", target, event.command_name, event.duration_micros / 1e6, failed)
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Counts checked-out connections of the driver's pools for db_pool_*"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.open = 0
+        self.capacity = 0
+        self.timeouts = 0
+
+    def pool_created(self, event):
+        with self._lock:
+            self.capacity += event.options.get("maxPoolSize", 100)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.in_use += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_check_out_failed(self, event):
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            with self._lock:
+                self.timeouts += 1
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {"in_use": self.in_use, "idle": max(self.open - self.in_use, 0),
+                    "capacity": self.capacity, "timeouts": self.timeouts}
+
+
+def instrument_mongodb():
+    """Register the MongoDB listeners (call before the MongoClient is created)"""
+    pool_listener = MongoPoolListener()
+    monitoring.register(MongoCommandListener())
+    monitoring.register(pool_listener)
+    register_pool("mongodb", pool_listener.stats)
+
+
+# ---------------------------------------------------------------------------
+# MySQL: connections handed out by the pool time every execute()
+# ---------------------------------------------------------------------------
+
+_TARGET = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+`?(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def classify_sql(sql):
+    """(table, operation) of a statement, e.g. ("tests", "select")"""
+    words = sql.split(None, 1)
+    operation = words[0].lower() if words else ""
+    match = _TARGET.search(sql)
+    return (match.group(1) if match else ""), operation
+
+
+class _InstrumentedCursor:
+    """Cursor proxy: execute() / executemany() are timed, the rest is passed through"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _timed(self, method, operation, *args, **kwargs):
+        target, kind = classify_sql(operation)
+        start = time.perf_counter()
+        try:
+            result = method(operation, *args, **kwargs)
+        except Exception:
+            observe_db("mysql", target, kind, time.perf_counter() - start, failed=True)
+            raise
+        observe_db("mysql", target, kind, time.perf_counter() - start)
+        return result
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _InstrumentedConnection:
+    """Connection proxy whose cursors are instrumented"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return _InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def instrument_connection(conn):
+    """Wrap a mysql.connector connection so every statement is recorded"""
+    return _InstrumentedConnection(conn)
+
+
+# ---------------------------------------------------------------------------
+# Connection pool gauges, read when /metrics is scraped
+# ---------------------------------------------------------------------------
+
+class _PoolCollector:
+    """db_pool_* from the stats() of the registered pools"""
+
+    def __init__(self):
+        self.sources = {}
+
+    def collect(self):
+        labels = ["db", "pid"] if MULTIPROCESS else ["db"]
+        extra = [str(os.getpid())] if MULTIPROCESS else []
+        connections = GaugeMetricFamily("db_pool_connections", "Pool connections by state",
+                                        labels=labels + ["state"])
+        capacity = GaugeMetricFamily("db_pool_capacity", "Most connections the pool will open", labels=labels)
+        saturation = GaugeMetricFamily("db_pool_saturation", "Connections in use / capacity", labels=labels)
+        waits = CounterMetricFamily("db_pool_waits", "Checkouts that had to wait for a connection", labels=labels)
+        timeouts = CounterMetricFamily("db_pool_timeouts", "Checkouts that gave up waiting", labels=labels)
+
+        for db, stats in list(self.sources.items()):
+            try:
+                stats = stats()
+            except Exception:
+                continue  # pool not created yet (or closed): nothing to report
+            if stats is None:
+                continue
+            values = [db] + extra
+            limit = stats.get("capacity", stats.get("size", 0) + stats.get("max_overflow", 0))
+            connections.add_metric(values + ["in_use"], stats["in_use"])
+            connections.add_metric(values + ["idle"], stats["idle"])
+            capacity.add_metric(values, limit)
+            saturation.add_metric(values, stats["in_use"] / limit if limit else 0.0)
+            if "waits" in stats:
+                waits.add_metric(values, stats["waits"])
+            timeouts.add_metric(values, stats["timeouts"])
+        return [connections, capacity, saturation, waits, timeouts]
+
+
+_pools = _PoolCollector()
+if not MULTIPROCESS:
+    REGISTRY.register(_pools)
+
+
+def register_pool(db, stats):
+    """Report a connection pool's stats() dict (in_use, idle, timeouts, ...) as db_pool_*"""
+    _pools.sources[db] = stats
+
+
+def metrics_response():
+    """The /metrics response: every metric, merged over all workers under Gunicorn"""
+    from starlette.responses import Response
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_pools)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,336 @@
+"""
+Model service for heart attack risk
+Loads the trained model once and keeps it in memory so the APIs can score
+patients in-process instead of launching predict.py for every prediction
+"""
+
+import os
+import hashlib
+import threading
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from forest import CompiledForest, compile_forest, read_artifact_meta
+from prediction_cache import PredictionCache
+from metrics import observe_inference, count_cache
+from tracing import span
+
+# Model files live next to this module, not in the current working directory,
+# so the service works no matter which app (mongodb/ or mySQL/) imports it.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.getenv("MODEL_PATH", os.path.join(BASE_DIR, "heart_attack_model.pkl"))
+FEATURE_NAMES_PATH = os.getenv("FEATURE_NAMES_PATH", os.path.join(BASE_DIR, "feature_names.pkl"))
+# Memory-mappable copy of the compiled forest, written by export_model.py
+MODEL_ARTIFACT_PATH = os.getenv("MODEL_ARTIFACT_PATH", os.path.join(BASE_DIR, "heart_attack_model.forest"))
+
+# "compiled" scores small batches with the flat-array forest (see forest.py),
+# "sklearn" always calls the pickled model
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "compiled")
+# Above this many rows sklearn's Cython tree walk is faster than the NumPy one
+COMPILED_MAX_ROWS = int(os.getenv("COMPILED_MAX_ROWS", "256"))
+
+# Prediction cache (size 0 disables it) and how often to check the model file
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "300"))
+MODEL_CHECK_INTERVAL = float(os.getenv("MODEL_CHECK_INTERVAL", "5"))
+
+
+def extract_features(data):
+    """Build the model feature dictionary from a latest-entry style payload
+
+    The payload has the same shape as /api/latest-entry:
+    {'patient': {...}, 'medical_record': {...}, 'heart_attack_test': {...}}
+    """
+    patient = data['patient']
+    medical_record = data['medical_record']
+    test = data['heart_attack_test']
+
+    # Create feature dictionary matching training data
+    features = {
+        'Age': patient['age'],
+        'Gender': patient['gender'],
+        'Heart rate': medical_record['heart_rate'],
+        'Systolic blood pressure': medical_record['systolic_blood_pressure'],
+        'Diastolic blood pressure': medical_record['diastolic_blood_pressure'],
+        'Blood sugar': medical_record['blood_sugar'],
+        'CK-MB': test['ck_mb'],
+        'Troponin': test['troponin']
+    }
+
+    # Handle outliers (same as training)
+    if features['Heart rate'] > 200:
+        features['Heart rate'] = 80  # Use median value
+
+    return features
+
+
+def risk_level(positive_probability):
+    """Map the positive class probability (0-1) to a risk level label"""
+    risk_score = positive_probability * 100
+    if risk_score < 30:
+        return "LOW RISK"
+    elif risk_score < 70:
+        return "MODERATE RISK"
+    return "HIGH RISK"
+
+
+def build_feature_matrix(rows, feature_names):
+    """Assemble many rows into one contiguous float64 matrix
+
+    Each row is either a feature dictionary (keys from feature_names) or a
+    latest-entry style payload. Columns follow feature_names.
+    """
+    X = np.empty((len(rows), len(feature_names)), dtype=np.float64)
+    for i, row in enumerate(rows):
+        if 'patient' in row:
+            row = extract_features(row)
+        X[i] = [row[name] for name in feature_names]
+
+    # Handle outliers (same as training) for raw feature rows too
+    if 'Heart rate' in feature_names:
+        heart_rate = X[:, feature_names.index('Heart rate')]
+        heart_rate[heart_rate > 200] = 80  # Use median value
+
+    return X
+
+
+def file_fingerprint(path):
+    """Cheap change marker for a file: (modification time, size)"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def file_version(path):
+    """Short content hash of the model artifact, used as the model version"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def format_result(label, probabilities):
+    """Build the API result dict for one scored row"""
+    prediction = int(label)
+    return {
+        "prediction": prediction,
+        "predicted_result": 'positive' if prediction == 1 else 'negative',
+        "confidence": round(float(max(probabilities)) * 100, 1),
+        "probabilities": {
+            "negative": float(probabilities[0]),
+            "positive": float(probabilities[1])
+        },
+        "risk_level": risk_level(probabilities[1])
+    }
+
+
+def load_artifact(path, version):
+    """Memory-map the exported forest if it exists and was built from this model version
+
+    Returns None when there is no artifact or it is stale (exported from another
+    model file), so the caller falls back to the pickle.
+    """
+    if not os.path.isdir(path):
+        return None
+    try:
+        if read_artifact_meta(path).get("source_version") != version:
+            print(f"Model artifact {path} is stale (model file changed), run export_model.py")
+            return None
+        return CompiledForest.load(path, mmap_mode='r')
+    except Exception as e:
+        print(f"Could not load model artifact {path}: {e}")
+        return None
+
+
+class ModelService:
+    """Holds the trained model in memory and scores patients"""
+
+    def __init__(self, model_path=MODEL_PATH, feature_names_path=FEATURE_NAMES_PATH, backend=MODEL_BACKEND,
+                 artifact_path=MODEL_ARTIFACT_PATH):
+        self.model_path = model_path
+        self.feature_names_path = feature_names_path
+        self.backend = backend
+        self.artifact_path = artifact_path
+        self.model = None
+        self.compiled = None
+        self.feature_names = None
+        self.version = None
+        self.cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL) if PREDICTION_CACHE_SIZE > 0 else None
+        self._fingerprint = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._model_lock = threading.Lock()
+
+    def load(self):
+        """Load the model (called once at startup and when the file changes)
+
+        With the compiled backend and an up-to-date artifact from
+        export_model.py, the forest is memory-mapped instead of unpickled and
+        the sklearn model is only loaded if a large batch needs it.
+        """
+        fingerprint = file_fingerprint(self.model_path)
+        version = file_version(self.model_path)
+        feature_names = joblib.load(self.feature_names_path)
+
+        # Convert to list if it's a pandas Series
+        if hasattr(feature_names, 'tolist'):
+            feature_names = feature_names.tolist()
+
+        model = None
+        compiled = load_artifact(self.artifact_path, version) if self.backend == "compiled" else None
+        if compiled is None:
+            model = joblib.load(self.model_path)
+            compiled = compile_forest(model) if self.backend == "compiled" else None
+
+        # Score with the column order the model was trained on
+        trained = model if model is not None else compiled
+        if hasattr(trained, 'feature_names_in_'):
+            feature_names = list(trained.feature_names_in_)
+
+        self.model = model
+        self.compiled = compiled
+        self.feature_names = feature_names
+        self.version = version
+        self._fingerprint = fingerprint
+        self._next_check = time.monotonic() + MODEL_CHECK_INTERVAL
+
+        # Results of the previous model must never be served again
+        if self.cache is not None:
+            self.cache.clear()
+        return self
+
+    def sklearn_model(self):
+        """The pickled sklearn model, unpickled on first use when the artifact was mapped"""
+        if self.model is None:
+            with self._model_lock:
+                if self.model is None:
+                    self.model = joblib.load(self.model_path)
+        return self.model
+
+    def reload_if_changed(self):
+        """Reload the model (and drop cached results) if the artifact changed on disk
+
+        The file is stat'ed at most once every MODEL_CHECK_INTERVAL seconds.
+        """
+        if time.monotonic() < self._next_check:
+            return False
+
+        with self._reload_lock:
+            if time.monotonic() < self._next_check:
+                return False
+            self._next_check = time.monotonic() + MODEL_CHECK_INTERVAL
+            try:
+                if file_fingerprint(self.model_path) == self._fingerprint:
+                    return False
+                self.load()
+            except Exception as e:
+                # Keep serving the model already in memory (e.g. file mid-copy)
+                print(f"Could not reload model: {e}")
+                return False
+            print(f"Model reloaded: version {self.version}")
+            return True
+
+    @property
+    def loaded(self):
+        return self.model is not None or self.compiled is not None
+
+    def predict_proba_matrix(self, X):
+        """Run one predict_proba pass over a feature matrix
+
+        Labels are derived from the probabilities instead of calling
+        model.predict, which would walk every tree a second time.
+        """
+        if self.compiled is not None and len(X) <= COMPILED_MAX_ROWS:
+            # Same probabilities as sklearn without its per-call overhead
+            model, backend = self.compiled, "compiled"
+            with span("model.predict_proba", backend=backend, rows=len(X)):
+                start = time.perf_counter()
+                probabilities = model.predict_proba(X)
+        else:
+            # Wrap the matrix (no copy) so sklearn sees the training column names
+            model, backend = self.sklearn_model(), "sklearn"
+            with span("model.predict_proba", backend=backend, rows=len(X)):
+                start = time.perf_counter()
+                probabilities = model.predict_proba(pd.DataFrame(X, columns=self.feature_names, copy=False))
+        observe_inference(backend, len(X), time.perf_counter() - start)
+        labels = model.classes_[probabilities.argmax(axis=1)]
+        return labels, probabilities
+
+    def predict(self, features):
+        """Score a single feature dictionary
+
+        Returns a dict with the prediction, class probabilities and risk level.
+        """
+        return self.predict_batch([features])[0]
+
+    def predict_batch(self, rows):
+        """Score many feature dictionaries (or latest-entry payloads) at once
+
+        Rows already in the prediction cache skip the model; the rest are
+        scored together in one pass.
+        """
+        if not rows:
+            return []
+
+        self.reload_if_changed()
+        with span("prepare_features", rows=len(rows)):
+            X = build_feature_matrix(rows, self.feature_names)
+        if self.cache is None:
+            return self._score(X)
+
+        version = self.version
+        keys = [PredictionCache.make_key(version, row) for row in X]
+        results = [self.cache.get(key) for key in keys]
+        missed = [i for i, result in enumerate(results) if result is None]
+        count_cache("prediction", "model", len(keys) - len(missed), len(missed))
+        if missed:
+            for i, result in zip(missed, self._score(X[missed])):
+                results[i] = result
+                self.cache.put(keys[i], result)
+
+        # Callers add their own fields, so never hand out the cached dict itself
+        return [dict(result) for result in results]
+
+    def _score(self, X):
+        labels, probabilities = self.predict_proba_matrix(X)
+        return [format_result(label, proba) for label, proba in zip(labels, probabilities)]
+
+    def cache_stats(self):
+        """Prediction cache counters plus the model version they belong to"""
+        stats = self.cache.stats() if self.cache is not None else {"enabled": False}
+        stats["model_version"] = self.version
+        return stats
+
+    def predict_entry(self, data):
+        """Score a latest-entry style payload (patient + medical_record + heart_attack_test)"""
+        with span("prepare_features", rows=1):
+            features = extract_features(data)
+        result = self.predict(features)
+        result["patient_id"] = data['patient'].get('patient_id')
+        result["actual_result"] = data['heart_attack_test'].get('result')
+        result["features"] = features
+        return result
+
+
+# Global service shared by every request in this process
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_model_service():
+    """
+    Returns the process-wide model service
+    Loads the model on first use so later requests reuse the warm copy
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = ModelService().load()
+    return _service
+
+
+def predict_batch(rows):
+    """Score many feature dictionaries (or latest-entry payloads) with the shared model"""
+    return get_model_service().predict_batch(rows)
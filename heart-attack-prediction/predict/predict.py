@@ -3,12 +3,19 @@ Prediction script for heart attack risk
 Fetches latest patient data from API and makes heart attack prediction
 """
 
+import argparse
+import json
 import os
+import time
 import requests
 import joblib
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from model_service import extract_features, risk_level, load_artifact, file_version, MODEL_BACKEND
+from forest import compile_forest
+from prediction_log import PredictionLogger
+from tracing import span, traced, inject, current_trace_id, set_service_name
 
 # Configuration
 # Allow overriding the API endpoint via environment variable so the script can target
@@ -17,17 +24,57 @@ from datetime import datetime
 API_URL = os.getenv("API_URL", "http://127.0.0.1:8000/api/latest-entry")
 MODEL_PATH = "heart_attack_model.pkl"
 FEATURE_NAMES_PATH = "feature_names.pkl"
+MODEL_ARTIFACT_PATH = "heart_attack_model.forest"
 
+# Watch mode: new tests are read from /api/entries (same API as API_URL)
+ENTRIES_URL = os.getenv("ENTRIES_URL", API_URL.replace("latest-entry", "entries"))
+WATCH_STATE_PATH = os.getenv("WATCH_STATE_PATH", "watch_state.json")
+WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "5"))      # seconds between ticks
+WATCH_PAGE_SIZE = int(os.getenv("WATCH_PAGE_SIZE", "500"))   # entries per request
+
+# Last latest-entry response and its ETag: an unchanged entry is answered with 304
+LATEST_CACHE_PATH = os.getenv("LATEST_CACHE_PATH", "latest_entry_cache.json")
+
+# Spans of each run (TRACE_FILE to keep them); API calls carry the trace id
+set_service_name("predict")
+
+def load_latest_cache(path=LATEST_CACHE_PATH):
+    """Saved {"url", "etag", "data"} of the last latest-entry response, or None"""
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return cached if cached.get("url") == API_URL and cached.get("etag") else None
+
+def save_latest_cache(etag, data, path=LATEST_CACHE_PATH):
+    """Save the response with its ETag (write + rename, like the watch mark)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"url": API_URL, "etag": etag, "data": data}, f)
+    os.replace(tmp_path, path)
+
+@traced("fetch_latest_entry")
 def fetch_latest_patient_data():
     """Fetch latest patient data from API"""
     print("HEART ATTACK PREDICTION SYSTEM")
     print("\n Fetching latest patient data from API...")
     print(f" API Endpoint: {API_URL}")
+    if current_trace_id():
+        print(f" Trace ID: {current_trace_id()}  (GET /traces/<id> on the API for its spans)")
     
     try:
-        response = requests.get(API_URL, timeout=10)
+        # Conditional GET: the API answers 304 (no body) if the entry didn't change
+        cached = load_latest_cache()
+        headers = {"If-None-Match": cached["etag"]} if cached else {}
+        response = requests.get(API_URL, headers=inject(headers), timeout=10)
+        if response.status_code == 304 and cached:
+            print("Data unchanged since the last fetch (304), using the saved copy")
+            return cached["data"]
         response.raise_for_status()
         data = response.json()
+        if response.headers.get("ETag"):
+            save_latest_cache(response.headers["ETag"], data)
         print("Data fetched successfully!")
         return data
     except requests.exceptions.ConnectionError:
@@ -44,29 +91,12 @@ def fetch_latest_patient_data():
         print(f"Unexpected error: {e}")
         return None
 
+@traced("prepare_features")
 def prepare_features(data):
     """Extract and prepare features for prediction"""
     print("\nPreparing data for prediction...")
     
-    # Extract patient data
-    patient = data['patient']
-    medical_record = data['medical_record']
-    
-    # Create feature dictionary matching training data
-    features = {
-        'Age': patient['age'],
-        'Gender': patient['gender'],
-        'Heart rate': medical_record['heart_rate'],
-        'Systolic blood pressure': medical_record['systolic_blood_pressure'],
-        'Diastolic blood pressure': medical_record['diastolic_blood_pressure'],
-        'Blood sugar': medical_record['blood_sugar'],
-        'CK-MB': data['heart_attack_test']['ck_mb'],
-        'Troponin': data['heart_attack_test']['troponin']
-    }
-    
-    # Handle outliers (same as training)
-    if features['Heart rate'] > 200:
-        features['Heart rate'] = 80  # Use median value
+    features = extract_features(data)
     
     print("Data prepared!")
     return features
@@ -94,13 +124,23 @@ def display_patient_info(data, features):
     
     print(f"\n Actual Result: {test['result'].upper()}")
 
+@traced("load_model")
 def load_model():
     """Load trained machine learning model"""
     print("\n Loading prediction model...")
     
     try:
-        model = joblib.load(MODEL_PATH)
         feature_names = joblib.load(FEATURE_NAMES_PATH)
+
+        # Same predictions, without sklearn's per-call overhead; the exported
+        # artifact (export_model.py) is memory-mapped instead of unpickled
+        model = None
+        if MODEL_BACKEND == "compiled":
+            model = load_artifact(MODEL_ARTIFACT_PATH, file_version(MODEL_PATH))
+        if model is None:
+            model = joblib.load(MODEL_PATH)
+            if MODEL_BACKEND == "compiled":
+                model = compile_forest(model)
         
         # Convert to list if it's a pandas Series
         if hasattr(feature_names, 'tolist'):
@@ -123,6 +163,7 @@ def load_model():
         print(f"Error loading model: {e}")
         return None, None
     
+@traced("make_prediction")
 def make_prediction(model, feature_names, features):
     """Make prediction using the model"""
     print("Making prediction")
@@ -137,9 +178,9 @@ def make_prediction(model, feature_names, features):
             print(f"Reordering features to match model expectations")
             X = X[expected_features]  # Reorder columns to match training order
         
-        # Make prediction
-        prediction = model.predict(X)[0]
+        # Make prediction (one forest pass; label comes from the probabilities)
         probabilities = model.predict_proba(X)[0]
+        prediction = model.classes_[probabilities.argmax()]
         confidence = max(probabilities) * 100
         
         return prediction, confidence, probabilities
@@ -166,19 +207,12 @@ def display_prediction(prediction, confidence, probability):
     print(f" Positive (At risk): {probability[1]*100:.1f}%")
 
     # Risk interpretation
-    risk_score = probability[1] * 100
-    if risk_score < 30:
-        risk_level = "LOW RISK"
-        color = "(G)"
-    elif risk_score < 70:
-        risk_level = "MODERATE RISK"
-        color = "(Y)"
-    else:
-        risk_level = "HIGH RISK"
-        color = "(R)"
+    risk = risk_level(probability[1])
+    color = {"LOW RISK": "(G)", "MODERATE RISK": "(Y)", "HIGH RISK": "(R)"}[risk]
     
-    print(f"\n{color} Risk Level: {risk_level}")
+    print(f"\n{color} Risk Level: {risk}")
 
+@traced("predict")
 def main():
     """Main execution function"""
     
@@ -222,13 +256,183 @@ def main():
     print("PREDICTION COMPLETE")
    
     # Save prediction log
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"\n[{timestamp}] Patient: {data['patient']['patient_id']}, Predicted: {predicted_result}, Actual: {actual_result}, Confidence: {confidence:.1f}%"
-    
-    with open("prediction_log.txt", "a") as f:
-        f.write(log_entry)
-    
-    print(f"\nPrediction logged to prediction_log.txt")
+    logger = PredictionLogger()
+    logger.log(prediction_log_record(data, prediction, probability))
+    logger.close()
+
+    print(f"\nPrediction logged to {logger.directory}/")
+
+def load_mark(path=WATCH_STATE_PATH):
+    """Last scored test (high-water mark) saved by watch mode, or None"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_mark(mark, path=WATCH_STATE_PATH):
+    """Persist the high-water mark (write + rename so a crash never leaves half a file)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(mark, f)
+    os.replace(tmp_path, path)
+
+
+def mark_of(entry):
+    """High-water mark for an entry: its test_id and (MongoDB only) test_date"""
+    test = entry['heart_attack_test']
+    return {"test_id": test.get('test_id'), "test_date": test.get('test_date')}
+
+
+@traced("fetch_entries")
+def fetch_entries_after(session, mark, page_size=WATCH_PAGE_SIZE):
+    """One page of entries newer than the mark, oldest first"""
+    params = {"limit": page_size}
+    if mark:
+        if mark.get("test_id") is not None:
+            params["after_test_id"] = mark["test_id"]
+        if mark.get("test_date") is not None:
+            params["after_test_date"] = mark["test_date"]
+    response = session.get(ENTRIES_URL, params=params, headers=inject(), timeout=30)
+    response.raise_for_status()
+    return response.json()["entries"]
+
+
+def split_scorable(entries):
+    """Entries that can be scored, and the test_ids of those that can't
+
+    A test whose patient or medical record link is broken (None in
+    /api/entries) has no features; it is skipped like in /api/predict/batch.
+    """
+    scorable, skipped = [], []
+    for entry in entries:
+        try:
+            extract_features(entry)
+        except (KeyError, TypeError, ValueError):
+            skipped.append(entry['heart_attack_test'].get('test_id'))
+            continue
+        scorable.append(entry)
+    return scorable, skipped
+
+
+@traced("score_entries")
+def score_entries(model, feature_names, entries):
+    """Score many entries with one predict_proba call; returns (labels, probabilities)"""
+    X = pd.DataFrame([extract_features(entry) for entry in entries], columns=feature_names)
+    if hasattr(model, 'feature_names_in_'):
+        X = X[model.feature_names_in_]
+    probabilities = model.predict_proba(X)
+    labels = model.classes_[probabilities.argmax(axis=1)]
+    return labels, probabilities
+
+
+def prediction_log_record(entry, label, probabilities):
+    """Structured log record for one scored entry"""
+    test = entry['heart_attack_test']
+    return {
+        "patient_id": (entry.get('patient') or {}).get('patient_id'),
+        "test_id": test.get('test_id'),
+        "predicted": 'positive' if label == 1 else 'negative',
+        "actual": test.get('result'),
+        "probability": round(float(probabilities[1]), 4),
+        "confidence": round(float(max(probabilities)) * 100, 1),
+        "risk_level": risk_level(probabilities[1]),
+    }
+
+
+def log_predictions(logger, entries, labels, probabilities):
+    """Queue one log record per entry (written in batches by the logger)"""
+    logger.log_many([
+        prediction_log_record(entry, label, proba)
+        for entry, label, proba in zip(entries, labels, probabilities)
+    ])
+
+
+def watch(interval=WATCH_INTERVAL, page_size=WATCH_PAGE_SIZE, from_start=False):
+    """
+    Long-running mode: every `interval` seconds, score all tests newer than
+    the saved high-water mark. The model and HTTP session are reused across ticks.
+    """
+    print("HEART ATTACK PREDICTION SYSTEM - WATCH MODE")
+    print(f" API Endpoint: {ENTRIES_URL}")
+
+    model, feature_names = load_model()
+    if model is None:
+        print("\nCannot proceed without model")
+        return
+
+    session = requests.Session()
+    # Written only when a page is flushed, so a failed write is seen before the mark moves
+    logger = PredictionLogger(background=False)
+    # An empty mark (saved by older versions when the API was down) is no mark
+    mark = load_mark() or None
+    if mark is not None or from_start:
+        print(f" Starting after: {mark or 'the first test'}")
+
+    try:
+        while True:
+            if mark is None and not from_start:
+                # First run: start after the current latest test (--from-start scores everything).
+                # No latest entry (API down, empty database): save nothing and retry next tick
+                latest = fetch_latest_patient_data()
+                if latest is None:
+                    print(f" No latest entry yet, retrying in {interval:g}s")
+                    time.sleep(interval)
+                    continue
+                mark = mark_of(latest)
+                save_mark(mark)
+                print(f" Starting after: {mark}")
+
+            scored = 0
+            try:
+                while True:
+                    # One trace per page: fetch (and the API's queries), score, log
+                    with span("watch_page", page_size=page_size):
+                        entries = fetch_entries_after(session, mark, page_size)
+                        if not entries:
+                            break
+                        scorable, skipped = split_scorable(entries)
+                        if skipped:
+                            print(f"Skipped {len(skipped)} tests with a missing patient or medical record: {skipped}")
+                        if scorable:
+                            labels, probabilities = score_entries(model, feature_names, scorable)
+                            log_predictions(logger, scorable, labels, probabilities)
+                            logger.flush(raise_errors=True)
+
+                    # Advance the mark only once the page is written (past skipped tests too)
+                    mark = mark_of(entries[-1])
+                    save_mark(mark)
+                    scored += len(scorable)
+                    if len(entries) < page_size:
+                        break
+            except requests.exceptions.RequestException as e:
+                print(f"Error fetching new entries: {e}")
+            except OSError as e:
+                # Disk full, permissions...: the mark stays, the page is scored again next tick
+                print(f"Error writing the prediction log: {e}")
+
+            if scored:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Scored {scored} new tests"
+                      f" (last test_id: {mark['test_id']})")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nWatch mode stopped")
+    finally:
+        session.close()
+        logger.close()
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Heart attack risk prediction")
+    parser.add_argument("--watch", action="store_true", help="keep running and score every new test")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="seconds between watch ticks")
+    parser.add_argument("--page-size", type=int, default=WATCH_PAGE_SIZE, help="entries fetched per request")
+    parser.add_argument("--from-start", action="store_true",
+                        help="with no saved mark, score every existing test instead of starting after the latest")
+    args = parser.parse_args()
+
+    if args.watch:
+        watch(args.interval, args.page_size, args.from_start)
+    else:
+        main()
\ No newline at end of file
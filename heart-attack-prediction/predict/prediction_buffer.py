@@ -0,0 +1,171 @@
+"""
+Write buffer for stored predictions
+Collects prediction records in memory and hands them to a flush function
+in batches, so the API writes one bulk insert per batch instead of one
+round trip per prediction
+"""
+
+import os
+import threading
+import time
+
+PREDICTION_BUFFER_SIZE = int(os.getenv("PREDICTION_BUFFER_SIZE", "500"))          # records per flush
+PREDICTION_FLUSH_INTERVAL = float(os.getenv("PREDICTION_FLUSH_INTERVAL", "2"))     # max seconds a record waits
+PREDICTION_BUFFER_MAX_PENDING = int(os.getenv("PREDICTION_BUFFER_MAX_PENDING", "50000"))  # 0: unbounded
+PREDICTION_FLUSH_RETRIES = int(os.getenv("PREDICTION_FLUSH_RETRIES", "3"))        # retries of a failed batch
+
+
+class PredictionBuffer:
+    """Thread-safe batching buffer with a background flusher
+
+    - add() only appends to a list; requests never wait for the database
+    - a background thread flushes when max_size records are waiting or
+      every flush_interval seconds, whichever comes first
+    - close() flushes whatever is left (called at app shutdown)
+    - with background=False nothing is written until flush() or close()
+      (callers that must know a batch reached storage use flush(raise_errors=True))
+    - at most max_pending records wait (queued plus awaiting a retry); records
+      added beyond that are dropped and counted as overflowed, so a database
+      outage can't grow the buffer without limit
+    - a batch that fails to write is kept and tried again on the next flush,
+      up to max_retries times, then dropped. Stored predictions can always be
+      recomputed (predict/backfill.py), and the flush functions upsert, so a
+      retried batch never stores a prediction twice
+    """
+
+    def __init__(self, flush, max_size=PREDICTION_BUFFER_SIZE, flush_interval=PREDICTION_FLUSH_INTERVAL,
+                 background=True, max_pending=PREDICTION_BUFFER_MAX_PENDING, max_retries=PREDICTION_FLUSH_RETRIES):
+        self._flush = flush
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.background = background
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self._records = []
+        self._retries = []  # [(batch, failed attempts)], written before new records
+        self._retry_count = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+        # Statistics
+        self.added = 0
+        self.written = 0
+        self.dropped = 0
+        self.overflowed = 0
+        self.retried = 0
+        self.flushes = 0
+
+    def add(self, records):
+        """Queue records for the next flush"""
+        if not records:
+            return
+        with self._cond:
+            if self.max_pending > 0:
+                room = max(0, self.max_pending - len(self._records) - self._retry_count)
+                if len(records) > room:
+                    self.overflowed += len(records) - room
+                    records = records[:room]
+            self._records.extend(records)
+            self.added += len(records)
+            if len(self._records) >= self.max_size:
+                self._cond.notify()
+        self._ensure_thread()
+
+    def flush(self, raise_errors=False):
+        """Write everything queued so far (in batches of max_size)
+
+        Batches awaiting a retry are written first. A failed batch is kept for
+        the next flush (up to max_retries times) and the batches after it wait
+        too, rather than failing the same way.
+        With raise_errors, the first failed write is raised instead of printed;
+        the records not written are dropped, so the caller can produce them again.
+        """
+        with self._flush_lock:
+            with self._cond:
+                records, self._records = self._records, []
+                batches, self._retries = self._retries, []
+                self._retry_count = 0
+            batches += [(records[start:start + self.max_size], 0) for start in range(0, len(records), self.max_size)]
+
+            for i, (batch, failures) in enumerate(batches):
+                try:
+                    self._flush(batch)
+                    self.written += len(batch)
+                    self.flushes += 1
+                except Exception as e:
+                    if raise_errors:
+                        self.dropped += sum(len(waiting) for waiting, _ in batches[i:])
+                        raise
+                    failures += 1
+                    if failures > self.max_retries:
+                        self.dropped += len(batch)
+                        print(f"Could not store {len(batch)} predictions, dropped after {failures} attempts: {e}")
+                        retry = batches[i + 1:]
+                    else:
+                        self.retried += len(batch)
+                        print(f"Could not store {len(batch)} predictions (attempt {failures}), retrying: {e}")
+                        retry = [(batch, failures)] + batches[i + 1:]
+                    with self._cond:
+                        self._retries = retry
+                        self._retry_count = sum(len(waiting) for waiting, _ in retry)
+                    return
+
+    def _ensure_thread(self):
+        if self._thread is None and self.background and not self._closed:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="prediction-buffer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            deadline = time.monotonic() + self.flush_interval
+            with self._cond:
+                while not self._closed and len(self._records) < self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self):
+        """Stop the background thread and write the remaining records"""
+        with self._cond:
+            self._closed = True
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout=30)
+        self.flush()
+        # No later flush: batches still waiting for a retry are given up
+        with self._cond:
+            left, self._retries = self._retry_count, []
+            self._retry_count = 0
+        if left:
+            self.dropped += left
+            print(f"Could not store {left} predictions before shutdown")
+
+    def stats(self):
+        """Buffer counters"""
+        with self._cond:
+            pending = len(self._records) + self._retry_count
+            awaiting_retry = self._retry_count
+        return {
+            "pending": pending,
+            "awaiting_retry": awaiting_retry,
+            "added": self.added,
+            "written": self.written,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "overflowed": self.overflowed,
+            "flushes": self.flushes,
+            "max_size": self.max_size,
+            "max_pending": self.max_pending,
+            "max_retries": self.max_retries,
+            "flush_interval_seconds": self.flush_interval,
+        }
@@ -0,0 +1,88 @@
+"""
+Prediction cache for heart attack risk
+Bounded, thread-safe LRU cache with TTL that remembers results by
+(model version, feature vector) so repeated snapshots skip the model
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """LRU + TTL cache of prediction results
+
+    Keys are (model_version, feature row bytes): the row is the ordered
+    float64 feature vector built for the model, so the same snapshot always
+    maps to the same key and a new model version never reuses old results.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(model_version, feature_row):
+        """Canonical key for one ordered feature vector (NumPy float64 row)"""
+        return (model_version, feature_row.tobytes())
+
+    def get(self, key):
+        """Return the cached result or None (counts a hit or a miss)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a result, evicting the least recently used entries if full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        """Drop some entries (missing keys are ignored)"""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry (used when the model artifact changes)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
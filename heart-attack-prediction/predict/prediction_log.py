@@ -0,0 +1,187 @@
+"""
+Structured prediction log for heart attack risk
+Records are JSON Lines, buffered in memory and written in batches to
+size-rotated segment files; closed segments are gzip-compressed
+
+Every process writes its own segments (the pid is part of the file name),
+so several workers can log to the same directory without locking:
+
+    prediction_logs/predictions-20250101-<pid>-0001.jsonl      (open segment)
+    prediction_logs/predictions-20250101-<pid>-0000.jsonl.gz   (closed segment)
+
+Read a day back with:
+    python prediction_log.py --day 2025-01-01 [--summary]
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+from collections import Counter
+from datetime import datetime, date
+from prediction_buffer import PredictionBuffer
+
+PREDICTION_LOG_DIR = os.getenv("PREDICTION_LOG_DIR", "prediction_logs")
+PREDICTION_LOG_SEGMENT_BYTES = int(os.getenv("PREDICTION_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+PREDICTION_LOG_FLUSH_RECORDS = int(os.getenv("PREDICTION_LOG_FLUSH_RECORDS", "1000"))
+PREDICTION_LOG_FLUSH_INTERVAL = float(os.getenv("PREDICTION_LOG_FLUSH_INTERVAL", "1"))
+
+
+def encode_record(record):
+    """One compact JSON line"""
+    return json.dumps(record, separators=(",", ":"), default=str) + "\n"
+
+
+class PredictionLogger:
+    """Buffered, rotating JSON Lines writer
+
+    - log() only appends to an in-memory buffer
+    - the buffer is written with a single write() call when
+      flush_records records are waiting or every flush_interval seconds
+    - a segment is closed and compressed once it reaches segment_bytes,
+      and a new one is started every day
+    - background=False writes only on flush() / close(), so a caller that
+      checks flush(raise_errors=True) knows exactly what reached the disk
+    """
+
+    def __init__(self, directory=PREDICTION_LOG_DIR, segment_bytes=PREDICTION_LOG_SEGMENT_BYTES,
+                 flush_records=PREDICTION_LOG_FLUSH_RECORDS, flush_interval=PREDICTION_LOG_FLUSH_INTERVAL,
+                 background=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._file = None
+        self._path = None
+        self._day = None
+        self._size = 0
+        self._write_lock = threading.Lock()
+        self._buffer = PredictionBuffer(self._write, max_size=flush_records, flush_interval=flush_interval,
+                                        background=background)
+
+    def log(self, record):
+        """Queue one record (a dict); a timestamp is added if missing"""
+        self.log_many([record])
+
+    def log_many(self, records):
+        """Queue many records at once"""
+        now = datetime.now().isoformat(timespec="milliseconds")
+        for record in records:
+            record.setdefault("ts", now)
+        self._buffer.add(records)
+
+    def flush(self, raise_errors=False):
+        """Write everything buffered so far (raise_errors: raise OSError etc. instead of printing)"""
+        self._buffer.flush(raise_errors)
+
+    def close(self):
+        """Flush, then close and compress the open segment"""
+        self._buffer.close()
+        with self._write_lock:
+            self._close_segment()
+
+    def _segment_path(self, day):
+        # Next free sequence number for this process and day
+        pattern = os.path.join(self.directory, f"predictions-{day}-{os.getpid()}-*.jsonl*")
+        seq = len(glob.glob(pattern))
+        return os.path.join(self.directory, f"predictions-{day}-{os.getpid()}-{seq:04d}.jsonl")
+
+    def _open_segment(self, day):
+        self._path = self._segment_path(day)
+        self._file = open(self._path, "a", encoding="utf-8")
+        self._day = day
+        self._size = 0
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        if self._size:
+            compress_segment(self._path)
+        else:
+            os.remove(self._path)
+
+    def _write(self, records):
+        """Write one batch with a single write() call (runs in the flush thread)"""
+        data = "".join(encode_record(record) for record in records)
+        day = date.today().strftime("%Y%m%d")
+        with self._write_lock:
+            if self._file is not None and (day != self._day or self._size >= self.segment_bytes):
+                self._close_segment()
+            if self._file is None:
+                self._open_segment(day)
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+
+
+def compress_segment(path):
+    """Gzip a closed segment and remove the plain file"""
+    with open(path, "rb") as src, gzip.open(f"{path}.gz", "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    os.remove(path)
+
+
+def day_segments(day, directory=PREDICTION_LOG_DIR):
+    """All segment files of one day (YYYY-MM-DD or YYYYMMDD), oldest first per writer"""
+    day = str(day).replace("-", "")
+    return sorted(glob.glob(os.path.join(directory, f"predictions-{day}-*.jsonl*")))
+
+
+def read_segment(path):
+    """Yield the records of one segment (plain or gzip)"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            # The open segment of a running writer may end mid-line
+            if line.endswith("\n"):
+                yield json.loads(line)
+
+
+def read_day(day, directory=PREDICTION_LOG_DIR):
+    """Yield every record logged on one day"""
+    for path in day_segments(day, directory):
+        yield from read_segment(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read the structured prediction log")
+    parser.add_argument("--day", default=date.today().isoformat(), help="day to read (YYYY-MM-DD)")
+    parser.add_argument("--dir", default=PREDICTION_LOG_DIR, help="log directory")
+    parser.add_argument("--summary", action="store_true", help="print counts instead of the records")
+    args = parser.parse_args()
+
+    records = read_day(args.day, args.dir)
+    if not args.summary:
+        for record in records:
+            print(json.dumps(record))
+        return
+
+    total = 0
+    predicted = Counter()
+    risk = Counter()
+    matches = 0
+    for record in records:
+        total += 1
+        predicted[record.get("predicted")] += 1
+        risk[record.get("risk_level")] += 1
+        if record.get("actual") is not None and record.get("actual") == record.get("predicted"):
+            matches += 1
+
+    print(f"PREDICTION LOG {args.day}")
+    print(f" Segments: {len(day_segments(args.day, args.dir))}")
+    print(f" Records: {total:,}")
+    for label, count in sorted(predicted.items(), key=lambda item: str(item[0])):
+        print(f" Predicted {label}: {count:,}")
+    for level, count in sorted(risk.items(), key=lambda item: str(item[0])):
+        print(f" {level}: {count:,}")
+    if total:
+        print(f" Matches actual result: {matches / total * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
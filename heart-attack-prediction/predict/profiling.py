@@ -0,0 +1,258 @@
+"""
+On-demand request profiling for both APIs
+A stack sampler (a thread reading sys._current_frames() every PROFILE_INTERVAL
+seconds) records what the request-serving threads are doing while a request
+runs. Profiles are written in the folded format ("frame;frame;frame count",
+one stack per line) read by flamegraph.pl, speedscope and inferno.
+
+Two modes, both off by default:
+
+- on demand: a request sent with `X-Profile: <PROFILE_SECRET>` (or
+  `?profile=<PROFILE_SECRET>`) runs under the sampler. The response body is
+  replaced by the folded stacks (the real status is in X-Profile-Status) and a
+  copy is saved in PROFILE_DIR.
+- background: with PROFILE_SAMPLE_RATE=N one request in N is sampled. Its stacks
+  are added to PROFILE_DIR/sampled-<pid>.folded, which is rewritten at most
+  every PROFILE_FLUSH_INTERVAL seconds.
+
+Every stack starts with the request ("GET /patients") and the thread (event
+loop or worker thread). Sampling is wall-clock: time spent waiting for the
+database or the connection pool shows up, idle threads don't. Requests running
+at the same time are sampled too, so profile a quiet worker when you can.
+"""
+
+import hmac
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+from urllib.parse import parse_qs
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")                    # empty: on-demand profiling disabled
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))    # 0: background sampling disabled
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))    # seconds between stack samples
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_FLUSH_INTERVAL = float(os.getenv("PROFILE_FLUSH_INTERVAL", "30"))
+
+# Threads Starlette runs sync endpoints and dependencies in
+WORKER_THREAD_NAME = "AnyIO worker thread"
+
+# A thread whose innermost frames include one of these is waiting for work:
+# the event loop in select() (or inside uvloop, which has no Python frames)
+# and pool threads waiting on their job queue
+IDLE_FRAMES = {"EpollSelector.select", "_PollLikeSelector.select", "SelectSelector.select",
+               "KqueueSelector.select", "Runner.run", "Queue.get"}
+
+
+@lru_cache(maxsize=4096)
+def _label(code):
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame):
+    """Frame labels of a thread, outermost first; None when the thread is idle"""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    if any(code.co_qualname in IDLE_FRAMES for code in codes[:2]):
+        return None
+    return tuple(_label(code) for code in reversed(codes))
+
+
+class StackSampler:
+    """Samples the stacks of the event loop and worker threads until stop()"""
+
+    def __init__(self, interval=PROFILE_INTERVAL, loop_thread=None):
+        self.interval = interval
+        self.loop_thread = loop_thread or threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling; returns the stacks (thread, frame, ...) -> samples"""
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        # The first sample is one interval in, after start() has returned
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self.loop_thread:
+                thread = "event loop"
+            elif names.get(ident, "").startswith(WORKER_THREAD_NAME):
+                thread = "worker thread"
+            else:
+                continue
+            stack = _stack(frame)
+            if stack is not None:
+                self.stacks[(thread,) + stack] += 1
+        self.samples += 1
+
+
+def folded(stacks):
+    """Folded-stack text of {(frame, ...): samples}"""
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def save_profile(stacks, name, directory=PROFILE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(folded(stacks))
+    return path
+
+
+class SampledProfiles:
+    """Stacks of the 1-in-N sampled requests, merged over the life of the worker"""
+
+    def __init__(self, directory=PROFILE_DIR, flush_interval=PROFILE_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.stacks = Counter()
+        self.requests = 0
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.busy = threading.Lock()  # one sampled request at a time keeps the overhead bounded
+
+    def add(self, stacks):
+        with self._lock:
+            self.stacks.update(stacks)
+            self.requests += 1
+            self._dirty = True
+
+    def flush_due(self):
+        return self._dirty and time.monotonic() - self._last_flush >= self.flush_interval
+
+    def flush(self):
+        """Rewrite sampled-<pid>.folded (written to a temp file, then renamed)"""
+        with self._lock:
+            if not self._dirty:
+                return None
+            text = folded(self.stacks)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"sampled-{os.getpid()}.folded")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+        return path
+
+
+_sampled = SampledProfiles()
+
+
+def flush_profiles():
+    """Write the background samples still in memory (call at shutdown)"""
+    try:
+        _sampled.flush()
+    except OSError as e:
+        print(f"Could not write sampled profiles: {e}")
+
+
+def _request_frame(scope):
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', 'unmatched')}"
+
+
+class ProfilingMiddleware:
+    """Profiles requests on demand (PROFILE_SECRET) or 1 in PROFILE_SAMPLE_RATE"""
+
+    def __init__(self, app, secret=PROFILE_SECRET, sample_rate=PROFILE_SAMPLE_RATE, interval=PROFILE_INTERVAL):
+        self.app = app
+        self.secret = secret.encode()
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self._requests = itertools.count(1)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.secret and self._requested(scope):
+            await self._profile(scope, receive, send)
+            return
+        if self.sample_rate and next(self._requests) % self.sample_rate == 0:
+            if _sampled.busy.acquire(blocking=False):
+                try:
+                    await self._sample(scope, receive, send)
+                finally:
+                    _sampled.busy.release()
+                return
+        await self.app(scope, receive, send)
+
+    def _requested(self, scope):
+        token = Headers(scope=scope).get("x-profile")
+        if token is None:
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            token = query.get("profile", [None])[0]
+        return token is not None and hmac.compare_digest(token.encode(), self.secret)
+
+    async def _profile(self, scope, receive, send):
+        """Run the request under the sampler and answer with its profile"""
+        status = 500
+
+        async def capture(message):
+            # The real response is dropped: the profile is sent instead
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        sampler = StackSampler(self.interval).start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            request = _request_frame(scope)
+            stacks = Counter({(request,) + stack: count for stack, count in sampler.stop().items()})
+            name = (f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-"
+                    f"{re.sub(r'[^A-Za-z0-9]+', '_', request).strip('_')}.folded")
+            path = await run_in_threadpool(save_profile, stacks, name)
+            print(f"Profile of {request} ({elapsed_ms:.1f} ms, {sampler.samples} samples) saved to {path}")
+
+        body = folded(stacks).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-status", str(status).encode()),
+                (b"x-profile-duration-ms", f"{elapsed_ms:.1f}".encode()),
+                (b"x-profile-samples", str(sampler.samples).encode()),
+                (b"x-profile-file", name.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _sample(self, scope, receive, send):
+        """Run the request under the sampler; its stacks go to the background profile"""
+        sampler = StackSampler(self.interval).start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request = _request_frame(scope)
+            _sampled.add({(request,) + stack: count for stack, count in sampler.stop().items()})
+        if _sampled.flush_due():
+            await run_in_threadpool(flush_profiles)
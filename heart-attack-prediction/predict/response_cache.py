@@ -0,0 +1,252 @@
+"""
+Response cache for the read endpoints of both APIs
+Read-through: a GET handler asks the cache first and only queries the
+database on a miss; write handlers invalidate the keys they change
+
+Backend is picked by RESPONSE_CACHE_URL:
+- empty: in-process LRU with TTL (one cache per worker process)
+- redis://host:6379/0: shared by every worker and instance (needs `pip install redis`)
+- memory://: in-process stand-in for the shared backend, values go through
+  the same JSON encoding (local runs and checks without a Redis server)
+
+Keys are "<namespace>:<id>" (e.g. "patient:42") or just "<namespace>"
+(e.g. "latest-entry"); hit/miss counters are kept per namespace.
+Concurrent misses on the same key are coalesced (single_flight.py): one
+request queries the database, the others wait for its result. Only the
+payload query is shared; the version read behind the ETag is not.
+
+Handlers that send an ETag pass it as the version of the value: it is stored
+with the value, and an entry loaded under another version is a miss. A body
+cached before a write is then never served under the ETag of the write, even
+by a worker whose local cache the write couldn't invalidate.
+"""
+
+import os
+import threading
+import time
+from fast_json import dumps, loads
+from prediction_cache import PredictionCache
+from single_flight import SingleFlight
+from metrics import count_cache
+
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_PREFIX = os.getenv("RESPONSE_CACHE_PREFIX", "heart-api:")
+
+# Key of /api/latest-entry, invalidated by every write to tests and patients
+LATEST_ENTRY_KEY = "latest-entry"
+
+
+class LocalBackend:
+    """In-process LRU + TTL; values are kept as Python objects"""
+
+    name = "local"
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL):
+        self._cache = PredictionCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value):
+        self._cache.put(key, value)
+
+    def delete(self, keys):
+        self._cache.delete(*keys)
+
+    def stats(self):
+        stats = self._cache.stats()
+        return {name: stats[name] for name in ("size", "maxsize", "ttl_seconds", "evictions", "expirations")}
+
+
+class MemoryStore:
+    """Stand-in for Redis: the get / set(ex=) / delete subset used by SharedBackend"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at < time.monotonic():
+                del self._data[name]
+                return None
+            return data
+
+    def set(self, name, value, ex=None):
+        expires_at = time.monotonic() + ex if ex else float("inf")
+        with self._lock:
+            self._data[name] = (expires_at, value)
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+
+class SharedBackend:
+    """Values stored as JSON in a key-value store shared by all workers"""
+
+    def __init__(self, store, name, ttl=RESPONSE_CACHE_TTL, prefix=RESPONSE_CACHE_PREFIX):
+        self.store = store
+        self.name = name
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        data = self.store.get(self.prefix + key)
+        return None if data is None else loads(data)
+
+    def set(self, key, value):
+        # Same JSON the response would carry (ObjectId, DECIMAL, DATETIME included)
+        self.store.set(self.prefix + key, dumps(value), ex=max(1, int(self.ttl)))
+
+    def delete(self, keys):
+        self.store.delete(*[self.prefix + key for key in keys])
+
+    def stats(self):
+        return {"ttl_seconds": self.ttl, "prefix": self.prefix}
+
+
+def create_backend(url=RESPONSE_CACHE_URL, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL):
+    """Backend for a RESPONSE_CACHE_URL; None when caching is disabled"""
+    if url.startswith("memory://"):
+        return SharedBackend(MemoryStore(), "memory", ttl)
+    if url.startswith(("redis://", "rediss://")):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_URL is a Redis URL but the redis package is not installed")
+        return SharedBackend(redis.Redis.from_url(url), "redis", ttl)
+    if url:
+        raise ValueError(f"Unsupported RESPONSE_CACHE_URL: {url}")
+    return LocalBackend(maxsize, ttl) if maxsize > 0 else None
+
+
+class ResponseCache:
+    """Read-through cache in front of a backend, with per-namespace hit counters
+
+    A backend error never fails a request: the value is loaded from the
+    database instead and the error is counted.
+    """
+
+    def __init__(self, backend, flight=None):
+        self.backend = backend
+        self.flight = flight or SingleFlight()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._invalidations = 0
+        self.errors = 0
+
+    def get_or_load(self, key, loader, version=None):
+        """Cached value for key, or loader() (stored under key) on a miss
+
+        loader() may raise (e.g. HTTPException 404); nothing is cached then.
+        Concurrent misses share one loader() call (see SINGLE_FLIGHT_TIMEOUT).
+        version (the ETag of the response) must match the one the value was
+        loaded under, otherwise the value is loaded again.
+        """
+        # Requests for another version never share a load
+        flight_key = key if version is None else f"{key}@{version}"
+        if self.backend is None:
+            return self.flight.do(flight_key, loader)
+
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            self._error("read", key, e)
+            entry = None
+        hit = isinstance(entry, dict) and "value" in entry and entry.get("version") == version
+        self._count(key, hit)
+        if hit:
+            return entry["value"]
+        return self.flight.do(flight_key, lambda: self._load(key, loader, version))
+
+    def _load(self, key, loader, version):
+        """loader() stored under key with its version (runs once per burst of misses)"""
+        generation = self._invalidations
+        value = loader()
+        # A write that invalidated keys while we were loading may have made value stale
+        if generation == self._invalidations:
+            try:
+                self.backend.set(key, {"version": version, "value": value})
+            except Exception as e:
+                self._error("write", key, e)
+        return value
+
+    def invalidate(self, *keys):
+        """Drop keys after a write (call once the write is committed)"""
+        keys = [key for key in keys if key]
+        if not keys:
+            return
+        # Requests arriving from now on must not join a load that started before the write
+        self.flight.forget(*keys)
+        if self.backend is None:
+            return
+        with self._lock:
+            self._invalidations += 1
+        try:
+            self.backend.delete(keys)
+        except Exception as e:
+            self._error("invalidate", keys, e)
+
+    def _count(self, key, hit):
+        namespace = key.split(":", 1)[0]
+        with self._lock:
+            counters = self._counters.setdefault(namespace, [0, 0])
+            counters[0 if hit else 1] += 1
+        count_cache("response", namespace, int(hit), int(not hit))
+
+    def _error(self, action, key, error):
+        with self._lock:
+            self.errors += 1
+        print(f"Response cache {action} failed for {key}: {error}")
+
+    def stats(self):
+        """Hit/miss counters per namespace and overall, plus backend details"""
+        if self.backend is None:
+            return {"enabled": False, "single_flight": self.flight.stats()}
+
+        with self._lock:
+            counters = {namespace: list(counts) for namespace, counts in self._counters.items()}
+            invalidations = self._invalidations
+            errors = self.errors
+
+        def ratio(hits, misses):
+            return round(hits / (hits + misses), 4) if hits + misses else 0.0
+
+        hits = sum(counts[0] for counts in counters.values())
+        misses = sum(counts[1] for counts in counters.values())
+        return {
+            "enabled": True,
+            "backend": self.backend.name,
+            **self.backend.stats(),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": ratio(hits, misses),
+            "invalidations": invalidations,
+            "errors": errors,
+            "namespaces": {
+                namespace: {"hits": h, "misses": m, "hit_ratio": ratio(h, m)}
+                for namespace, (h, m) in sorted(counters.items())
+            },
+            "single_flight": self.flight.stats(),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Returns the response cache of this process (created on first use, after any fork)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(create_backend())
+    return _cache
@@ -0,0 +1,136 @@
+"""
+Single-flight request coalescing
+When several threads ask for the same key at once, only the first one (the
+leader) runs the loader; the others wait for it and get the same result (or
+the same exception). Used by the response cache so that a burst of identical
+reads after a write (every dashboard refreshing /api/latest-entry) costs one
+database query instead of one per request.
+
+A waiter gives up after SINGLE_FLIGHT_TIMEOUT seconds and runs the loader
+itself, so a stuck query never holds every request hostage.
+
+Only the loader (the payload query) is coalesced: each request still reads
+the version counters for its ETag first. That read is a primary-key lookup on
+a tiny table, and it must see the latest write, so it is not shared.
+"""
+
+import os
+import threading
+
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "5"))
+
+
+class _Call:
+    """One in-flight load and its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution
+
+    Counters are kept per key namespace ("patient:42" -> "patient"):
+    calls, executions (loaders actually run), shared (calls served by
+    another thread's load), timeouts (waiters that gave up) and errors.
+    """
+
+    def __init__(self, timeout=SINGLE_FLIGHT_TIMEOUT):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def do(self, key, loader):
+        """loader() run once for all concurrent callers of key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if leader:
+            return self._lead(key, call, loader)
+
+        if not call.done.wait(self.timeout):
+            # The leader is too slow: load on our own rather than keep waiting
+            self._count(key, "timeouts")
+            return self._run(key, loader)
+
+        self._count(key, "shared")
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def forget(self, *keys):
+        """Detach in-flight loads of keys (after a write)
+
+        Callers arriving afterwards start a fresh load instead of joining one
+        that may have read the data before the write. Loads of a version of
+        a key ("<key>@<version>") are detached too.
+        """
+        prefixes = tuple(f"{key}@" for key in keys)
+        with self._lock:
+            for key in [key for key in self._calls if key in keys or key.startswith(prefixes)]:
+                del self._calls[key]
+
+    def _lead(self, key, call, loader):
+        try:
+            call.value = self._run(key, loader)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def _run(self, key, loader):
+        self._count(key, "executions")
+        try:
+            return loader()
+        except BaseException:
+            self._count(key, "errors")
+            raise
+
+    def _count(self, key, counter):
+        # "patient:42@<version>" and "latest-entry@<version>" count under their namespace
+        namespace = key.split(":", 1)[0].split("@", 1)[0]
+        with self._lock:
+            counters = self._counters.setdefault(
+                namespace, {"executions": 0, "shared": 0, "timeouts": 0, "errors": 0}
+            )
+            counters[counter] += 1
+
+    def stats(self):
+        """Counters and collapse ratio (share of calls that didn't run a loader)"""
+        with self._lock:
+            counters = {namespace: dict(counts) for namespace, counts in self._counters.items()}
+            in_flight = len(self._calls)
+
+        def summary(counts):
+            # Every call either ran a loader (leader or timed-out waiter) or shared one
+            calls = counts["executions"] + counts["shared"]
+            return {
+                "calls": calls,
+                **counts,
+                "collapse_ratio": round(counts["shared"] / calls, 4) if calls else 0.0,
+            }
+
+        total = {"executions": 0, "shared": 0, "timeouts": 0, "errors": 0}
+        for counts in counters.values():
+            for name, count in counts.items():
+                total[name] += count
+        return {
+            "timeout_seconds": self.timeout,
+            "in_flight": in_flight,
+            **summary(total),
+            "namespaces": {namespace: summary(counts) for namespace, counts in sorted(counters.items())},
+        }
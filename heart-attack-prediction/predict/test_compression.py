@@ -0,0 +1,130 @@
+# Tests for compression.py
+
+import asyncio
+import gzip
+import zlib
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+import compression
+from compression import CompressionMiddleware, choose_encoding
+
+brotli = pytest.importorskip("brotli")
+
+LINES = [f'{{"patient_id": {i}, "age": {40 + i % 30}, "tests": []}}\n'.encode() for i in range(200)]
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("*", "br"),
+    ("*;q=0", None),
+    ("identity", None),
+    ("", None),
+    ("gzip;q=bad", None),
+])
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding) == expected
+
+
+def test_gzip_only_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("br, gzip") == "gzip"
+    assert choose_encoding("br") is None
+
+
+def make_client(minimum_size=100):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+
+    @app.get("/json")
+    def big_json():
+        return JSONResponse({"data": [{"patient_id": i} for i in range(100)]}, headers={"ETag": '"v1"'})
+
+    @app.get("/small")
+    def small_json():
+        return {"ok": True}
+
+    @app.get("/text-file")
+    def not_compressible():
+        return PlainTextResponse("x" * 1000, media_type="application/octet-stream")
+
+    @app.get("/stream")
+    def stream():
+        def lines():
+            for line in LINES:
+                yield line
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return TestClient(app)
+
+
+def decode(encoding, data):
+    return brotli.decompress(data) if encoding == "br" else gzip.decompress(data)
+
+
+@pytest.mark.parametrize("encoding", ["br", "gzip"])
+def test_large_json_is_compressed(encoding):
+    client = make_client()
+    response = client.get("/json", headers={"Accept-Encoding": encoding})
+    plain = client.get("/json", headers={"Accept-Encoding": "identity"})
+
+    assert response.headers["content-encoding"] == encoding
+    assert "accept-encoding" in response.headers["vary"].lower()
+    # The compressed representation differs from the identity one: the ETag becomes weak
+    assert response.headers["etag"] == 'W/"v1"'
+    assert plain.headers["etag"] == '"v1"'
+    assert response.content == plain.content
+    assert "content-encoding" not in plain.headers
+
+
+def test_small_and_binary_responses_are_not_compressed():
+    client = make_client(minimum_size=1024)
+    for path in ("/small", "/text-file"):
+        response = client.get(path, headers={"Accept-Encoding": "br, gzip"})
+        assert "content-encoding" not in response.headers
+
+
+@pytest.mark.parametrize("encoding", ["br", "gzip"])
+def test_streamed_ndjson_is_compressed_chunk_by_chunk(encoding):
+    client = make_client()
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": encoding}) as response:
+        assert response.headers["content-encoding"] == encoding
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    assert decode(encoding, raw) == b"".join(LINES)
+
+
+@pytest.mark.parametrize("encoding", ["br", "gzip"])
+def test_each_chunk_is_flushed(encoding):
+    """Every compressed chunk decodes on its own, so NDJSON clients get lines as they are sent"""
+    messages = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/x-ndjson")]})
+        for line in LINES[:3]:
+            await send({"type": "http.response.body", "body": line, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        messages.append(message)
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app)(scope, receive, send))
+
+    bodies = [m["body"] for m in messages if m["type"] == "http.response.body"]
+    assert len(bodies) == 4
+    if encoding == "br":
+        decoder = brotli.Decompressor()
+        decoded = [decoder.process(body) for body in bodies[:3]]
+    else:
+        decoder = zlib.decompressobj(31)
+        decoded = [decoder.decompress(body) for body in bodies[:3]]
+    assert decoded == LINES[:3]
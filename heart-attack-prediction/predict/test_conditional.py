@@ -0,0 +1,58 @@
+# Tests for conditional.py
+
+from datetime import datetime
+from starlette.requests import Request
+from conditional import validators, is_fresh, not_modified
+
+MODIFIED = datetime(2025, 11, 9, 12, 30, 15, 250000)
+
+
+def request_with(if_none_match=None):
+    headers = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_etag_is_weak_and_follows_the_versions():
+    headers = validators([("patients", 3, MODIFIED), ("tests", 7, MODIFIED)])
+    assert headers["ETag"].startswith('W/"') and headers["ETag"].endswith('"')
+    # Order of the versions doesn't matter, any bump changes the tag
+    assert validators([("tests", 7, MODIFIED), ("patients", 3, MODIFIED)]) == headers
+    assert validators([("patients", 3, MODIFIED), ("tests", 8, MODIFIED)])["ETag"] != headers["ETag"]
+
+
+def test_last_modified_is_the_newest_stamp_in_utc():
+    older = datetime(2024, 1, 1)
+    headers = validators([("patients", 1, older), ("tests", 1, MODIFIED), ("predictions", 0, None)])
+    assert headers["Last-Modified"] == "Sun, 09 Nov 2025 12:30:15 GMT"
+
+
+def test_unknown_version_sends_no_validators():
+    assert validators([("patients", None, None)]) == {}
+    assert validators([]) == {}
+    assert not is_fresh(request_with("*"), {})
+
+
+def test_weak_comparison_matches_strong_and_weak_tags():
+    headers = validators([("heart_attack_tests", 2, MODIFIED)])
+    tag = headers["ETag"]
+    assert is_fresh(request_with(tag), headers)
+    assert is_fresh(request_with(tag.removeprefix("W/")), headers)
+    assert is_fresh(request_with(f'"other", {tag}'), headers)
+    assert is_fresh(request_with("*"), headers)
+
+
+def test_changed_or_missing_tag_is_not_fresh():
+    headers = validators([("heart_attack_tests", 2, MODIFIED)])
+    stale = validators([("heart_attack_tests", 1, MODIFIED)])["ETag"]
+    assert not is_fresh(request_with(stale), headers)
+    assert not is_fresh(request_with(), headers)
+    assert not is_fresh(request_with(""), headers)
+
+
+def test_not_modified_has_no_body_and_keeps_the_validators():
+    headers = validators([("patients", 5, MODIFIED)])
+    response = not_modified(headers)
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == headers["ETag"]
+    assert response.headers["last-modified"] == headers["Last-Modified"]
@@ -0,0 +1,68 @@
+# Tests for forest.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from forest import CHUNK_ROWS, CompiledForest, compile_forest
+
+FEATURES = ["age", "gender", "heart_rate", "systolic_bp", "diastolic_bp", "blood_sugar", "ck_mb", "troponin"]
+
+
+@pytest.fixture(scope="module")
+def model():
+    X, y = make_classification(n_samples=600, n_features=len(FEATURES), n_informative=5, random_state=0)
+    forest = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0)
+    forest.fit(pd.DataFrame(X, columns=FEATURES), y)
+    return forest
+
+
+@pytest.fixture(scope="module")
+def rows():
+    # More rows than one chunk, so the chunked traversal is covered
+    X, _ = make_classification(n_samples=CHUNK_ROWS * 2 + 37, n_features=len(FEATURES), random_state=1)
+    return pd.DataFrame(X, columns=FEATURES)
+
+
+def test_probabilities_match_sklearn(model, rows):
+    compiled = compile_forest(model)
+    np.testing.assert_allclose(compiled.predict_proba(rows), model.predict_proba(rows), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(compiled.predict(rows), model.predict(rows))
+
+
+def test_leaves_match_sklearn(model, rows):
+    compiled = compile_forest(model)
+    leaves = compiled.apply(rows)
+    offsets = compiled.roots[None, :]
+    np.testing.assert_array_equal(leaves - offsets, model.apply(rows))
+
+
+def test_columns_are_reordered_by_name(model, rows):
+    compiled = compile_forest(model)
+    shuffled = rows[FEATURES[::-1]]
+    np.testing.assert_allclose(compiled.predict_proba(shuffled), model.predict_proba(rows), rtol=0, atol=1e-12)
+
+
+def test_saved_artifact_loads_memory_mapped(model, rows, tmp_path):
+    directory = tmp_path / "forest"
+    compile_forest(model).save(str(directory), source_version="test")
+    # Saving again replaces the artifact in place
+    compile_forest(model).save(str(directory), source_version="test-2")
+
+    loaded = CompiledForest.load(str(directory))
+    assert isinstance(loaded.value, np.memmap)
+    assert loaded.meta["source_version"] == "test-2"
+    assert list(loaded.feature_names_in_) == FEATURES
+    np.testing.assert_allclose(loaded.predict_proba(rows), model.predict_proba(rows), rtol=0, atol=1e-12)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["forest"]
+
+
+def test_invalid_input_is_rejected(model):
+    compiled = compile_forest(model)
+    with pytest.raises(ValueError):
+        compiled.predict_proba(np.zeros((2, len(FEATURES) - 1)))
+    bad = np.zeros((1, len(FEATURES)))
+    bad[0, 3] = np.nan
+    with pytest.raises(ValueError):
+        compiled.predict_proba(bad)
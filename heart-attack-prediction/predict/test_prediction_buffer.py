@@ -0,0 +1,88 @@
+# Tests for prediction_buffer.py
+
+import pytest
+from prediction_buffer import PredictionBuffer
+
+
+class FlakyStore:
+    """Flush function that fails the next `failures` writes"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    def __call__(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("database unavailable")
+        self.batches.append(list(batch))
+
+
+def test_records_are_written_in_batches():
+    store = FlakyStore()
+    buffer = PredictionBuffer(store, max_size=3, background=False)
+    buffer.add(list(range(7)))
+    buffer.flush()
+    assert store.batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert buffer.stats()["written"] == 7
+
+
+def test_records_beyond_max_pending_are_counted_as_overflow():
+    buffer = PredictionBuffer(FlakyStore(), max_size=3, background=False, max_pending=5)
+    buffer.add(list(range(4)))
+    buffer.add(list(range(4)))
+    stats = buffer.stats()
+    assert (stats["pending"], stats["added"], stats["overflowed"]) == (5, 5, 3)
+
+
+def test_failed_batch_is_retried_on_the_next_flush():
+    store = FlakyStore(failures=2)
+    buffer = PredictionBuffer(store, max_size=2, background=False, max_retries=3)
+    buffer.add([1, 2, 3])
+    buffer.flush()
+    buffer.flush()
+    # The batches after the failed one wait for it, in order
+    assert buffer.stats()["awaiting_retry"] == 3
+    buffer.add([4])
+    buffer.flush()
+    assert store.batches == [[1, 2], [3], [4]]
+    stats = buffer.stats()
+    assert (stats["written"], stats["dropped"], stats["pending"]) == (4, 0, 0)
+
+
+def test_batch_is_dropped_after_max_retries():
+    store = FlakyStore(failures=3)
+    buffer = PredictionBuffer(store, max_size=10, background=False, max_retries=2)
+    buffer.add([1, 2])
+    for _ in range(3):
+        buffer.flush()
+    stats = buffer.stats()
+    assert (stats["dropped"], stats["pending"], stats["written"]) == (2, 0, 0)
+    buffer.add([3])
+    buffer.flush()
+    assert store.batches == [[3]]
+
+
+def test_batches_awaiting_retry_count_against_max_pending():
+    buffer = PredictionBuffer(FlakyStore(failures=1), max_size=10, background=False, max_pending=3)
+    buffer.add([1, 2])
+    buffer.flush()
+    buffer.add([3, 4])
+    assert buffer.stats()["overflowed"] == 1
+
+
+def test_raise_errors_drops_what_was_not_written():
+    buffer = PredictionBuffer(FlakyStore(failures=1), max_size=2, background=False)
+    buffer.add([1, 2, 3])
+    with pytest.raises(OSError):
+        buffer.flush(raise_errors=True)
+    stats = buffer.stats()
+    assert (stats["dropped"], stats["pending"]) == (3, 0)
+
+
+def test_close_gives_up_on_batches_still_failing():
+    buffer = PredictionBuffer(FlakyStore(failures=5), max_size=10, background=False)
+    buffer.add([1, 2])
+    buffer.close()
+    stats = buffer.stats()
+    assert (stats["dropped"], stats["pending"]) == (2, 0)
@@ -0,0 +1,128 @@
+# Tests for single_flight.py
+
+import threading
+import pytest
+from single_flight import SingleFlight
+
+
+def start_waiter(flight, key, loader, results):
+    """Call flight.do in a thread; its result (or exception) goes to results"""
+    def run():
+        try:
+            results.append(flight.do(key, loader))
+        except Exception as e:
+            results.append(e)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_for_waiters(flight, key, count):
+    """Block until count callers have joined the in-flight load of key"""
+    for _ in range(500):
+        with flight._lock:
+            call = flight._calls.get(key)
+            if call is not None and call.waiters >= count:
+                return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"{count} waiters never joined {key}")
+
+
+def blocking_loader(release, value="value", calls=None):
+    def loader():
+        if calls is not None:
+            calls.append(1)
+        release.wait(5)
+        return value
+    return loader
+
+
+def test_leader_result_is_shared_with_waiters():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    leader = start_waiter(flight, "patient:1", blocking_loader(release, "row", calls), results)
+    wait_for_waiters(flight, "patient:1", 0)
+    waiters = [start_waiter(flight, "patient:1", blocking_loader(release, "other", calls), results)
+               for _ in range(3)]
+    wait_for_waiters(flight, "patient:1", 3)
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join(5)
+
+    assert results == ["row"] * 4
+    assert len(calls) == 1
+    stats = flight.stats()["namespaces"]["patient"]
+    assert (stats["calls"], stats["executions"], stats["shared"]) == (4, 1, 3)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_leader_error_is_raised_in_waiters():
+    flight = SingleFlight()
+    release = threading.Event()
+    results = []
+
+    def failing():
+        release.wait(5)
+        raise KeyError("missing")
+
+    leader = start_waiter(flight, "latest-entry", failing, results)
+    wait_for_waiters(flight, "latest-entry", 0)
+    waiter = start_waiter(flight, "latest-entry", lambda: "unused", results)
+    wait_for_waiters(flight, "latest-entry", 1)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    assert len(results) == 2 and all(isinstance(r, KeyError) for r in results)
+    assert flight.stats()["errors"] == 1
+    # Nothing is remembered: the next call runs the loader again
+    assert flight.do("latest-entry", lambda: "fresh") == "fresh"
+
+
+def test_waiter_loads_on_its_own_after_timeout():
+    flight = SingleFlight(timeout=0.05)
+    release = threading.Event()
+    results = []
+
+    leader = start_waiter(flight, "patient:2", blocking_loader(release, "slow"), results)
+    wait_for_waiters(flight, "patient:2", 0)
+    assert flight.do("patient:2", lambda: "own") == "own"
+    release.set()
+    leader.join(5)
+
+    assert results == ["slow"]
+    stats = flight.stats()
+    assert (stats["executions"], stats["shared"], stats["timeouts"]) == (2, 0, 1)
+
+
+def test_forget_detaches_in_flight_loads():
+    flight = SingleFlight()
+    release = threading.Event()
+    results = []
+
+    old = start_waiter(flight, "patient:3", blocking_loader(release, "before write"), results)
+    versioned = start_waiter(flight, 'patient:3@W/"1"', blocking_loader(release, "before write"), results)
+    wait_for_waiters(flight, "patient:3", 0)
+    wait_for_waiters(flight, 'patient:3@W/"1"', 0)
+
+    flight.forget("patient:3")
+    assert flight.stats()["in_flight"] == 0
+    # A caller arriving after the write starts a new load instead of joining the old one
+    assert flight.do("patient:3", lambda: "after write") == "after write"
+    assert flight.do('patient:3@W/"1"', lambda: "after write") == "after write"
+
+    release.set()
+    old.join(5)
+    versioned.join(5)
+    assert results == ["before write", "before write"]
+    assert list(flight.stats()["namespaces"]) == ["patient"]
+
+
+def test_leader_exception_propagates():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("patient:4", lambda: int("x"))
+    assert flight.stats()["in_flight"] == 0
@@ -0,0 +1,398 @@
+"""
+Request tracing for both APIs and predict.py
+Spans (trace id, parent, start, duration, attributes) follow the current
+context, so the spans of one request nest without being passed around:
+
+- TracingMiddleware: one span per request. It continues the trace of an
+  incoming W3C `traceparent` header and returns the trace id in X-Trace-Id.
+- TracingCommandListener / trace_connection: one span per MongoDB command or
+  MySQL statement, with the query shape or SQL (values left out)
+- model_service: feature preparation and model inference
+- predict.py: fetch / prepare / predict stages; its HTTP calls send
+  `traceparent`, so the API's spans join the script's trace
+
+Finished spans stay in the process, so no collector is needed. The last
+TRACE_BUFFER_SIZE spans are kept in memory (GET /traces, GET /traces/{trace_id}).
+With TRACE_FILE set, they are also appended to that file as JSON lines.
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from pymongo import monitoring
+from fast_json import dumps, dumps_line
+
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "10000"))  # spans kept in memory (0: none)
+TRACE_FILE = os.getenv("TRACE_FILE", "")                           # JSON lines file (empty: no file)
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "")
+TRACING_ENABLED = TRACE_BUFFER_SIZE > 0 or bool(TRACE_FILE)
+
+# Longest statement / query shape stored on a database span
+MAX_STATEMENT_LENGTH = 1000
+
+# Scrapes, health checks and trace lookups would only push real requests out of the buffer
+UNTRACED_PATHS = ("/metrics", "/health", "/traces")
+
+_current = ContextVar("current_span", default=None)
+_service_name = TRACE_SERVICE_NAME
+
+
+def set_service_name(name):
+    """Service recorded on every span (TRACE_SERVICE_NAME takes precedence)"""
+    global _service_name
+    _service_name = TRACE_SERVICE_NAME or name
+
+
+class Span:
+    """One timed operation of a trace"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "start_ns", "duration_ns",
+                 "error", "root", "_start")
+
+    def __init__(self, name, parent=None, trace_id=None, parent_id=None, **attributes):
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.error = None
+        # First span of the trace in this process (a request, or a script stage)
+        self.root = parent is None
+        self.start_ns = time.time_ns()
+        self.duration_ns = None
+        self._start = time.perf_counter_ns()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, duration_ns=None):
+        self.duration_ns = time.perf_counter_ns() - self._start if duration_ns is None else duration_ns
+        _exporter.export(self)
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": _service_name,
+            "start": datetime.fromtimestamp(self.start_ns / 1e9, timezone.utc).isoformat(),
+            "duration_ms": round(self.duration_ns / 1e6, 3),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoSpan:
+    """What span() yields when tracing is off"""
+
+    trace_id = None
+
+    def set(self, **attributes):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def current_trace_id():
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the block as a child of the current span (a new trace if there is none)"""
+    if not TRACING_ENABLED:
+        yield _NO_SPAN
+        return
+    current = Span(name, _current.get(), **attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        current.finish()
+
+
+def traced(name):
+    """Decorator: run the function inside span(name)"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inject(headers=None):
+    """headers plus the current span's traceparent, for outgoing HTTP calls"""
+    headers = dict(headers or {})
+    current = _current.get()
+    if current is not None:
+        headers["traceparent"] = current.traceparent
+    return headers
+
+
+def parse_traceparent(value):
+    """(trace id, parent span id) of a W3C traceparent header, or (None, None)"""
+    parts = value.strip().split("-") if value else []
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        if int(parts[1], 16) == 0 or int(parts[2], 16) == 0:
+            return None, None
+    except ValueError:
+        return None, None
+    return parts[1].lower(), parts[2].lower()
+
+
+# ---------------------------------------------------------------------------
+# Exporters: in-memory ring of recent spans and an optional JSON lines file
+# ---------------------------------------------------------------------------
+
+class _Exporter:
+    """Keeps finished spans in memory and appends them to TRACE_FILE
+
+    File lines are buffered and written when a root span ends (one write per
+    request), so workers appending to the same file never split a line.
+    """
+
+    def __init__(self, buffer_size=TRACE_BUFFER_SIZE, path=TRACE_FILE):
+        self.recent = deque(maxlen=buffer_size) if buffer_size > 0 else None
+        self.path = path
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        if self.recent is not None:
+            self.recent.append(span)
+        if self.path:
+            line = dumps_line(span.to_dict())
+            with self._lock:
+                self._pending.append(line)
+                if span.root or len(self._pending) >= 1000:
+                    self._write()
+
+    def flush(self):
+        with self._lock:
+            self._write()
+
+    def _write(self):
+        if not self._pending:
+            return
+        data = b"".join(self._pending)
+        self._pending = []
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"Could not write spans to {self.path}: {e}")
+
+
+_exporter = _Exporter()
+atexit.register(_exporter.flush)
+
+
+def get_trace(trace_id):
+    """Spans of a trace still in memory, in start order"""
+    spans = [s for s in list(_exporter.recent or ()) if s.trace_id == trace_id]
+    return [s.to_dict() for s in sorted(spans, key=lambda s: s.start_ns)]
+
+
+def slowest_traces(limit=20):
+    """Slowest root spans (requests) still in memory"""
+    roots = sorted((s for s in list(_exporter.recent or ()) if s.root), key=lambda s: s.duration_ns, reverse=True)
+    return [
+        {"trace_id": s.trace_id, "name": s.name, "start": s.to_dict()["start"],
+         "duration_ms": round(s.duration_ns / 1e6, 3), "status": "error" if s.error else "ok"}
+        for s in roots[:limit]
+    ]
+
+
+# ---------------------------------------------------------------------------
+# HTTP: one span per request
+# ---------------------------------------------------------------------------
+
+class TracingMiddleware:
+    """Opens the request span and returns its trace id in X-Trace-Id"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED or scope["path"].startswith(UNTRACED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"traceparent"), None)
+        trace_id, parent_id = parse_traceparent(traceparent)
+        request = Span(f"{scope['method']} {scope['path']}", trace_id=trace_id, parent_id=parent_id,
+                       method=scope["method"], path=scope["path"])
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", [])) + [(b"x-trace-id", request.trace_id.encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _current.set(request)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            request.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            # Named after the route template once the router has matched it
+            route = getattr(scope.get("route"), "path", "unmatched")
+            request.name = f"{scope['method']} {route}"
+            request.set(route=route, status_code=status)
+            if status >= 500 and request.error is None:
+                request.error = f"HTTP {status}"
+            request.finish()
+
+
+# ---------------------------------------------------------------------------
+# MongoDB: one span per command (pymongo command monitoring)
+# ---------------------------------------------------------------------------
+
+# Parts of a command that describe the query; values are replaced by "?"
+_COMMAND_FIELDS = ("filter", "projection", "sort", "pipeline", "query", "updates", "deletes", "limit", "skip")
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {key: _redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_redact(item) for item in value]
+    if isinstance(value, (bool, int, float)):
+        return value  # limits, sort directions, projections
+    return "?"
+
+
+def mongo_statement(command):
+    """Shape of a MongoDB command without its string / date values"""
+    shape = {name: _redact(command[name]) for name in _COMMAND_FIELDS if name in command}
+    if "documents" in command:
+        shape["documents"] = len(command["documents"])
+    return dumps(shape).decode()[:MAX_STATEMENT_LENGTH]
+
+
+class TracingCommandListener(monitoring.CommandListener):
+    """Records each command as a span of the trace that issued it"""
+
+    def __init__(self):
+        self._spans = {}
+
+    def started(self, event):
+        parent = _current.get()
+        if parent is None:
+            return  # not issued by a traced request (index builds, health checks)
+        command = event.command
+        collection = command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        collection = collection if isinstance(collection, str) else ""
+        self._spans[(event.connection_id, event.request_id)] = Span(
+            f"mongodb {event.command_name} {collection}".rstrip(), parent,
+            db="mongodb", collection=collection, operation=event.command_name,
+            statement=mongo_statement(command),
+        )
+
+    def _finish(self, event, error=None):
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.error = error
+            span.finish(event.duration_micros * 1000)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure))
+
+
+def trace_mongodb():
+    """Register the MongoDB command listener (call before the MongoClient is created)"""
+    if TRACING_ENABLED:
+        monitoring.register(TracingCommandListener())
+
+
+# ---------------------------------------------------------------------------
+# MySQL: connections handed out by the pool trace every execute()
+# ---------------------------------------------------------------------------
+
+class _TracedCursor:
+    """Cursor proxy: execute() / executemany() run inside a span"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _traced(self, method, operation, *args, **kwargs):
+        if _current.get() is None:
+            return method(operation, *args, **kwargs)  # not part of a traced request (buffer flushes)
+        verb = operation.split(None, 1)[0].upper() if operation.strip() else ""
+        with span(f"mysql {verb}".rstrip(), db="mysql", statement=operation[:MAX_STATEMENT_LENGTH]) as current:
+            result = method(operation, *args, **kwargs)
+            current.set(rows=self._cursor.rowcount)
+            return result
+
+    def execute(self, operation, *args, **kwargs):
+        return self._traced(self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._traced(self._cursor.executemany, operation, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _TracedConnection:
+    """Connection proxy whose cursors are traced"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return _TracedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def trace_connection(conn):
+    """Wrap a mysql.connector connection so every statement gets a span"""
+    return _TracedConnection(conn) if TRACING_ENABLED else conn
@@ -1,21 +1,27 @@
 # FastAPI and MySQL Connection Setup 
-from fastapi import FastAPI, HTTPException, Request, Body
-import mysql.connector
+from fastapi import FastAPI, HTTPException, Request, Body, Depends
 from dotenv import load_dotenv
 import os
+import sys
 load_dotenv()
 
+# The MySQL connection pool lives in heart-attack-prediction/mySQL/database.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "heart-attack-prediction", "mySQL"))
+from database import get_db, get_pool, init_pool, close_pool
+
 # Create the FastAPI app
 app = FastAPI(title="Heart Attack API", version="1.0")
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST","localhost"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASS"),
-        database=os.getenv("DB_NAME")
-    )
 
-    return connection
+
+# Open the connection pool once at startup; endpoints borrow from it via get_db
+@app.on_event("startup")
+def open_connection_pool():
+    init_pool()
+
+
+@app.on_event("shutdown")
+def close_connection_pool():
+    close_pool()
 
 
 # --- A simple test endpoint ---
@@ -24,6 +30,12 @@ def read_root():
     return {"message": "FastAPI is running and connected to MySQL database heart_attack_db!"}
 
 
+# Connection pool statistics (in use, idle, wait times)
+@app.get("/pool-stats")
+def pool_stats():
+    return get_pool().stats()
+
+
 # UPDATE (PUT) endpoint
 @app.put("/patients/{patient_id}")
 def update_patient(
@@ -35,10 +47,10 @@ def update_patient(
     fasting_bs: int,
     max_heart_rate: int,
     exercise_angina: int,
-    target: int
+    target: int,
+    conn=Depends(get_db)
 ):
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         update_query = """
@@ -69,15 +81,13 @@ def update_patient(
 
     finally:
         cursor.close()
-        conn.close()
 
 
 #  Delete (DELETE) endpoint for removing patients
 
 @app.delete("/patients/{patient_id}")
-def delete_patient(patient_id: int):
+def delete_patient(patient_id: int, conn=Depends(get_db)):
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         delete_query = "DELETE FROM Patients WHERE patient_id = %s"
@@ -94,7 +104,6 @@ def delete_patient(patient_id: int):
 
     finally:
         cursor.close()
-        conn.close()
 
 # CREATE (POST) endpoint 
 @app.post("/patients/")
@@ -106,10 +115,10 @@ def create_patient(
     fasting_bs: int = Body(...),
     max_heart_rate: int = Body(...),
     exercise_angina: int = Body(...),
-    target: int = Body(...)
+    target: int = Body(...),
+    conn=Depends(get_db)
 ):
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         insert_query = """
@@ -138,13 +147,11 @@ def create_patient(
 
     finally:
         cursor.close()
-        conn.close()
 
 
 @app.get("/patients/{patient_id}")
-def read_patient(patient_id: int):
+def read_patient(patient_id: int, conn=Depends(get_db)):
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
         query = """
@@ -166,12 +173,10 @@ def read_patient(patient_id: int):
 
     finally:
         cursor.close()
-        conn.close()
 
 @app.get("/patients")
-def get_all_patients():
+def get_all_patients(conn=Depends(get_db)):
     try:
-        conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
         # Retrieve all patients, optionally joined with test info
@@ -199,15 +204,14 @@ def get_all_patients():
 
     finally:
         cursor.close()
-        conn.close()
 
 # UPDATE (PUT) 
 @app.put("/tests/{test_id}")
 def update_test(test_id: int,
                 heart_rate: int, systolic_bp: int, diastolic_bp: int,
-                blood_sugar: int, ck_mb: float, troponin: float):
+                blood_sugar: int, ck_mb: float, troponin: float,
+                conn=Depends(get_db)):
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
 
         update_query = """
@@ -232,4 +236,3 @@ def update_test(test_id: int,
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         cursor.close()
-        conn.close()